@@ -1,17 +1,31 @@
-from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, Body
-from app.services.audio_recorder import audio_recorder, cleanup_audio_file
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, Body, Header
+from fastapi.responses import FileResponse, PlainTextResponse, Response
+from app.services.audio_recorder import audio_recorder, cleanup_audio_file, DEFAULT_SESSION_ID
 from app.services.speech_to_text import speech_to_text_service, AudioInput
 from app.api.websockets import story_ws
 from app.services.conversation_manager import conversation_manager
+from app.services.story_archive import get_story_archive
+from app.services.story_audio import STORY_AUDIO_FORMATS, story_audio_path, story_audio_media_type
 from app.core.config import settings
+from app.core import tracing
+from app.core.profiling import ProfilerBusyError, stack_sampler, torch_capture
 from app.services.tts_factory import tts_factory
+from app.services.phoneme_cache import phoneme_cache
+from app.services.session_scheduler import session_scheduler
 import soundfile as sf
 import librosa
+import asyncio
+import logging
+import secrets
+import sqlite3
 import uuid
 from datetime import datetime
+from typing import Literal, Optional
 from app.core.languages import LANGUAGE_TO_BCP47, DEFAULT_LANGUAGE
 from app.core.language_manager import language_manager
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 def validate_input_method(method: str):
@@ -23,32 +37,69 @@ def validate_input_method(method: str):
 
 @router.websocket("/ws/story/{client_id}")
 async def websocket_story_endpoint(websocket: WebSocket, client_id: str):
-    await story_ws.connect(websocket, client_id)
+    if not await story_ws.connect(websocket, client_id):
+        return
+    # The story streams in its own task so this loop keeps reading interaction
+    # responses and audio acks while audio is being sent
+    story_task: Optional[asyncio.Task] = None
     try:
         while True:
             data = await websocket.receive_json()
             
             if data["type"] == "transcription":
-                await story_ws.stream_story(
+                if story_task is not None and not story_task.done():
+                    await story_ws.send_to_client(client_id, {
+                        "type": "error",
+                        "message": "A story is already being generated on this connection"
+                    })
+                    continue
+                retry_after = session_scheduler.check_rate_limit(websocket.client.host if websocket.client else client_id)
+                if retry_after:
+                    await story_ws.send_to_client(client_id, {
+                        "type": "error",
+                        "message": f"Too many stories requested, please wait {retry_after:.0f} seconds",
+                        "retry_after": round(retry_after, 1)
+                    })
+                    continue
+                story_task = asyncio.create_task(story_ws.stream_story(
                     websocket,
                     transcription=data["text"],
-                    language=data.get("language", "french"),
-                    client_id=client_id
-                )
-            elif data["type"] == "interaction_response" and story_ws.story_states.get(client_id, {}).get("awaiting_interaction"):
-                # Handle user interaction response
-                continue  # The _request_user_interaction method will handle this
+                    language=data.get("language") or await language_manager.get_language(client_id),
+                    client_id=client_id,
+                    audio_format=data.get("audio"),
+                    framing=data.get("framing"),
+                    max_ahead_ms=data.get("max_ahead_ms"),
+                    resume=bool(data.get("resume"))
+                ))
+            else:
+                story_ws.handle_client_message(client_id, data)
     except WebSocketDisconnect:
-        story_ws.disconnect(client_id)
+        pass
     except Exception as e:
-        print(f"Error in WebSocket connection: {str(e)}")
+        logger.error("Error in WebSocket connection: %s", e)
+    finally:
+        # Stop generating and synthesizing for a client that is gone
+        if story_task is not None:
+            story_task.cancel()  # No-op if it already finished; awaiting also collects its exception
+            try:
+                await story_task
+            except (asyncio.CancelledError, Exception):
+                pass
         story_ws.disconnect(client_id)
 
 @router.get("/stories")
-async def get_story_history(limit: int = Query(default=5, ge=1, le=20)):
-    """Get recent story history"""
-    stories = conversation_manager.get_recent_stories(limit)
+async def get_story_history(
+    limit: int = Query(default=5, ge=1, le=100),
+    before_id: Optional[int] = Query(default=None, description="Return stories older than this id (the last id of the previous page)"),
+    client_id: Optional[str] = Query(default=None),
+    language: Optional[str] = Query(default=None)
+):
+    """Get recent story history, newest first"""
+    stories = conversation_manager.get_recent_stories(limit, client_id, language, before_id)
     return [{
+        "id": story.id,
+        "story_id": story.story_id,
+        "client_id": story.client_id,
         "transcription": story.transcription,
         "story": story.story,
         "language": story.language,
@@ -57,32 +108,104 @@ async def get_story_history(limit: int = Query(default=5, ge=1, le=20)):
 
 @router.post("/stories/clear")
 async def clear_story_history():
-    """Clear story history"""
+    """Clear story history (the archive keeps its stories)"""
     conversation_manager.clear_history()
     return {"message": "Story history cleared"}
 
+@router.get("/stories/{story_id}/audio")
+async def get_story_audio(story_id: str):
+    """Replay a story's audio as it was streamed, without running the LLM or TTS again.
+
+    Supports Range requests (206 Partial Content), so players can seek and resume.
+    """
+    for audio_format in STORY_AUDIO_FORMATS:
+        path = story_audio_path(story_id, audio_format)
+        if path is not None and path.is_file():
+            return FileResponse(
+                path,
+                media_type=story_audio_media_type(audio_format),
+                # A story's audio never changes once written
+                headers={"Cache-Control": "public, max-age=31536000, immutable"},
+                content_disposition_type="inline",
+                filename=path.name
+            )
+    raise HTTPException(status_code=404, detail=f"No audio stored for story {story_id}")
+
+def get_archive():
+    archive = get_story_archive()
+    if archive is None:
+        raise HTTPException(status_code=404, detail="The story archive is disabled (ARCHIVE_ENABLED=false)")
+    return archive
+
+@router.get("/archive/stories")
+async def list_archived_stories(
+    limit: int = Query(default=20, ge=1, le=100),
+    before_id: Optional[int] = Query(default=None, description="Return stories older than this id (next_before_id of the previous page)"),
+    language: Optional[str] = Query(default=None)
+):
+    """Page through every archived story, newest first"""
+    stories = await asyncio.to_thread(get_archive().recent, limit, before_id, language)
+    return {
+        "stories": stories,
+        "next_before_id": stories[-1]["id"] if len(stories) == limit else None
+    }
+
+@router.get("/archive/search")
+async def search_archived_stories(
+    q: str = Query(..., min_length=1, description='FTS5 query: words, "phrases", OR, NOT, prefix*'),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    language: Optional[str] = Query(default=None)
+):
+    """Full-text search over archived transcriptions and stories, best matches first"""
+    archive = get_archive()
+    try:
+        return await asyncio.to_thread(archive.search, q, limit, offset, language)
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid search query: {str(e)}")
+
+@router.get("/archive/stats")
+async def get_archive_stats():
+    """Get the number of archived stories, their compressed size and the write queue"""
+    return await asyncio.to_thread(get_archive().get_stats)
+
+@router.get("/archive/stories/{story_id}")
+async def get_archived_story(story_id: str):
+    """Get one archived story by the story_id sent when it started"""
+    story = await asyncio.to_thread(get_archive().get, story_id)
+    if story is None:
+        raise HTTPException(status_code=404, detail=f"Story {story_id} not found")
+    return story
+
 @router.post("/start-recording")
-async def start_recording_post(language: str = Query(default=None)):
+async def start_recording_post(
+    language: str = Query(default=None),
+    session_id: str = Query(default=DEFAULT_SESSION_ID)
+):
     validate_input_method("voice")
     try:
-        language = language or language_manager.current_language
-        audio_recorder.start_recording(language)
-        return {"status": "recording_started"}
+        language = language or await language_manager.get_language()
+        audio_recorder.start_recording(language, session_id)
+        return {"status": "recording_started", "session_id": session_id}
     except Exception as e:
-        print(f"Error in start_recording: {str(e)}")
+        logger.error("Error in start_recording: %s", e)
         raise
 
 @router.post("/stop-recording")
-async def stop_recording_post(request: Request, language: str = Query(default="french")):
+async def stop_recording_post(
+    request: Request,
+    language: str = Query(default="french"),
+    session_id: str = Query(default=DEFAULT_SESSION_ID)
+):
     audio_file = None
     try:
-        audio_file, language = audio_recorder.stop_recording()
+        audio_file, language, vad_stats = audio_recorder.stop_recording(session_id)
         
         audio_data, sample_rate = sf.read(audio_file)
         if len(audio_data) == 0:
             raise HTTPException(status_code=400, detail="Recorded audio file is empty")
             
-        print(f"USER INPUT: Audio length: {len(audio_data)} samples, Sample rate: {sample_rate}")
+        logger.debug("Recorded audio: %d samples at %d Hz", len(audio_data), sample_rate)
         
         resampled_audio = librosa.resample(audio_data, orig_sr=sample_rate, target_sr=16000)
         
@@ -92,26 +215,35 @@ async def stop_recording_post(request: Request, language: str = Query(default="f
             language=language
         )
         
-        transcription = await speech_to_text_service.transcribe(audio_input)
+        # The story websocket for this client id continues the same trace
+        client_id = str(uuid.uuid4())
+        with tracing.span("stt", trace_key=client_id, language=language, audio_seconds=round(len(audio_data) / sample_rate, 2)):
+            transcription = await speech_to_text_service.transcribe(audio_input)
         if not transcription or transcription.isspace():
             raise HTTPException(status_code=400, detail="Failed to transcribe audio - no text detected")
             
-        print(f"TRANSCRIPTION: {transcription}")
+        if settings.DEBUG_PRINT_USER_INPUT:
+            logger.debug("Transcription: %s", transcription)
         
-        client_id = str(uuid.uuid4())
         return {
             "transcription": transcription,
             "client_id": client_id,
-            "websocket_url": f"/api/v1/ws/story/{client_id}"
+            "websocket_url": f"/api/v1/ws/story/{client_id}",
+            "vad_stats": vad_stats
         }
 
     except Exception as e:
-        print(f"Error in stop_recording: {str(e)}")
+        logger.error("Error in stop_recording: %s", e)
         raise
     finally:
         if audio_file:
             await cleanup_audio_file(audio_file)
 
+@router.get("/recording-status")
+async def recording_status(session_id: str = Query(default=None)):
+    """Report whether recordings are running or were stopped by voice activity detection"""
+    return audio_recorder.get_status(session_id)
+
 @router.post("/text-input")
 async def text_input(
     text: str = Body(..., embed=True),
@@ -121,7 +253,7 @@ async def text_input(
     if not text or text.isspace():
         raise HTTPException(status_code=400, detail="Text input cannot be empty")
         
-    language = language or language_manager.current_language
+    language = language or await language_manager.get_language()
     client_id = str(uuid.uuid4())
     return {
         "transcription": text,
@@ -138,15 +270,94 @@ async def get_languages():
     }
 
 @router.post("/language")
-async def set_language(language: str = Body(..., embed=True)):
-    """Set the current language"""
+async def set_language(
+    language: str = Body(..., embed=True),
+    client_id: Optional[str] = Body(default=None, embed=True)
+):
+    """Set a client's language, or the default language when no client_id is given"""
     if language not in LANGUAGE_TO_BCP47:
         raise HTTPException(
             status_code=400, 
             detail=f"Unsupported language. Available languages: {list(LANGUAGE_TO_BCP47.keys())}"
         )
-    language_manager.set_language(language)
-    return {"language": language}
+    await language_manager.set_language(language, client_id)
+    return {"language": language, "client_id": client_id}
+
+@router.get("/language")
+async def get_language(client_id: Optional[str] = Query(default=None)):
+    """Get a client's language, falling back to the default language"""
+    return {"language": await language_manager.get_language(client_id), "client_id": client_id}
+
+@router.get("/health/ready")
+async def readiness():
+    """Report whether the configured TTS service is loaded and can synthesize immediately"""
+    ready = tts_factory.is_ready()
+    return {"ready": ready, "tts_service": settings.TTS_SERVICE}
+
+@router.get("/admin/sessions")
+async def get_live_sessions():
+    """List live story sessions with their age, phase and approximate memory footprint"""
+    return await story_ws.sessions.get_stats()
+
+def check_profiling_access(token: Optional[str]):
+    if not settings.ENABLE_PROFILING_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Profiling endpoints are disabled (ENABLE_PROFILING_ENDPOINTS=false)")
+    if settings.PROFILING_TOKEN and not secrets.compare_digest(token or "", settings.PROFILING_TOKEN):
+        raise HTTPException(status_code=403, detail="Missing or wrong X-Profiling-Token header")
+
+@router.get("/admin/profile/stacks")
+async def profile_stacks(
+    seconds: float = Query(default=10, gt=0),
+    interval_ms: float = Query(default=10, ge=1, le=1000),
+    x_profiling_token: Optional[str] = Header(default=None)
+):
+    """Sample the stacks of the event loop and worker threads, returned as folded stacks for a flamegraph"""
+    check_profiling_access(x_profiling_token)
+    seconds = min(seconds, settings.PROFILING_MAX_SECONDS)
+    try:
+        folded = await asyncio.to_thread(stack_sampler.sample, seconds, interval_ms / 1000)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(folded)
+
+@router.post("/admin/profile/torch")
+async def profile_torch(
+    count: int = Query(default=3, ge=1, le=20),
+    target: Optional[Literal["kokoro", "whisper", "llm"]] = Query(default=None, description="Only profile this model"),
+    timeout: float = Query(default=60, gt=0),
+    x_profiling_token: Optional[str] = Header(default=None)
+):
+    """Run the next count inferences under torch.profiler and return their Chrome traces as a zip"""
+    check_profiling_access(x_profiling_token)
+    if target == "kokoro" and settings.KOKORO_EXECUTION_MODE == "process":
+        # Worker processes have their own torch_capture, which this process can't arm
+        raise HTTPException(
+            status_code=409,
+            detail="Kokoro runs in worker processes (KOKORO_EXECUTION_MODE=process) and can't be torch-profiled; "
+                   "use KOKORO_EXECUTION_MODE=thread to profile it"
+        )
+    try:
+        torch_capture.arm(count, target)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    traces = await asyncio.to_thread(torch_capture.collect, min(timeout, settings.PROFILING_MAX_SECONDS))
+    if not traces:
+        raise HTTPException(status_code=504, detail=f"No {target or 'model'} inference ran within the timeout")
+    return Response(
+        traces,
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="torch-profile.zip"'}
+    )
+
+@router.get("/scheduler/status")
+async def get_scheduler_status():
+    """Get active and queued story sessions and generation/synthesis slot usage"""
+    return session_scheduler.get_stats()
+
+@router.get("/tts/phoneme-cache")
+async def get_phoneme_cache_stats():
+    """Get phoneme cache size and hit rates"""
+    return phoneme_cache.get_stats()
 
 @router.post("/reload-config")
 async def reload_config():
@@ -1,46 +1,228 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, Optional
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
 import json
+import logging
+import math
+import uuid
 from app.services.llm_service import llm_service
 from app.services.tts_factory import tts_factory
+from app.services.audio_output import AudioOutputStage, negotiate_audio_format
+from app.services.story_audio import StoryAudioWriter
+from app.services.session_store import SessionStore, SessionStoreFullError, StorySession
+from app.services.session_scheduler import session_scheduler, SchedulerBusyError, PRIORITY_PLAYING, PRIORITY_NEW
+from app.services.audio_framing import (
+    AudioFramer, FlowController, FlowStalledError,
+    FLAG_SENTENCE_START, FLAG_SENTENCE_END, FLAG_STREAM_END
+)
 from app.services.conversation_manager import conversation_manager
 from app.core.language_manager import language_manager
 from app.core.config import settings
+from app.core import metrics, tracing
+from app.utils.text_cleanup import split_into_sentences
+import time
 import re
 
+logger = logging.getLogger(__name__)
+
+class SpeechQueue:
+    """Complete sentences waiting for TTS, spoken in order by one task per story.
+
+    The LLM loop only queues sentences, so its generation slot is released as
+    soon as the LLM stream ends instead of being held while synthesis waits
+    for a synthesis slot or for the client to play back its audio.
+    """
+
+    def __init__(self, speak: Callable[[str, Optional[str]], Awaitable[None]]):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(speak))
+
+    async def _run(self, speak: Callable[[str, Optional[str]], Awaitable[None]]) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                if item is None:
+                    return
+                await speak(*item)
+            finally:
+                self._queue.task_done()
+
+    def check(self) -> None:
+        """Raise the error that stopped synthesis, if any"""
+        if self._task.done():
+            self._task.result()
+
+    def put(self, sentence: str, phase: Optional[str]) -> None:
+        self.check()
+        self._queue.put_nowait((sentence, phase))
+
+    async def drain(self) -> None:
+        """Wait until every queued sentence has been sent"""
+        joined = asyncio.ensure_future(self._queue.join())
+        try:
+            await asyncio.wait([joined, self._task], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            joined.cancel()
+        self.check()
+
+    async def close(self) -> None:
+        """Speak the remaining sentences and stop"""
+        self._queue.put_nowait(None)
+        await self._task
+
+    async def cancel(self) -> None:
+        if not self._task.done():
+            self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+
 class StoryStreamingWebSocket:
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.story_states: Dict[str, Dict] = {}
+        self.sessions = SessionStore()
         
-    async def connect(self, websocket: WebSocket, client_id: str):
+    async def connect(self, websocket: WebSocket, client_id: str) -> bool:
+        """Accept the client and create its session; returns False, after closing it, if the server is full"""
         await websocket.accept()
-        self.active_connections[client_id] = websocket
-        self.story_states[client_id] = {
-            "complete_story": "",
-            "current_phase": None,
-            "awaiting_interaction": False
-        }
+        try:
+            session = await self.sessions.create(client_id, websocket)
+        except SessionStoreFullError as e:
+            logger.warning("Rejected client %s: %s", client_id, e)
+            await websocket.send_json({"type": "error", "message": str(e)})
+            await websocket.close(code=1013, reason="Server full")  # Try again later
+            return False
+        next_phase = self._resume_phase(session)
+        if next_phase is not None:
+            # Ask again what the client left unanswered; a transcription message with "resume": true answers it
+            message = self._interaction_request(session, next_phase)
+            message["resume"] = True
+            await self._send_message(session, message)
+        return True
+    
+    def _resume_phase(self, session: StorySession) -> Optional[str]:
+        """The phase a restored story continues with, or None if it can't be resumed"""
+        if not (session.resumable and settings.ENABLE_PHASED_GENERATION and settings.ENABLE_INTERACTIVE_PHASES):
+            return None
+        phases = list(settings.STORY_PHASES.keys())
+        if session.current_phase not in phases[:-1]:
+            return None
+        return phases[phases.index(session.current_phase) + 1]
+    
+    def _priority(self, session: StorySession) -> int:
+        return PRIORITY_PLAYING if session.playing else PRIORITY_NEW
+        
+    def handle_client_message(self, client_id: str, data: Dict) -> None:
+        """Dispatch a message received while a story is streaming"""
+        session = self.sessions.get(client_id)
+        if session is None:
+            return
+        if data.get("type") == "interaction_response":
+            if session.awaiting_interaction:
+                session.interaction_responses.put_nowait(data.get("content", ""))
+        elif data.get("type") == "audio_ack":
+            if session.flow is None:
+                return
+            played_ms, seq = data.get("played_ms", 0), data.get("seq")
+            # A malformed ack is ignored rather than allowed to tear down the connection
+            if isinstance(played_ms, bool) or not isinstance(played_ms, (int, float)) or not math.isfinite(played_ms):
+                logger.debug("Ignoring audio_ack with invalid played_ms %r", played_ms)
+                return
+            if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int)):
+                seq = None
+            session.flow.ack(float(played_ms), seq)
         
     def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            self.active_connections.pop(client_id)
-        if client_id in self.story_states:
-            self.story_states.pop(client_id)
+        self.sessions.remove(client_id)
         
     def _split_into_sentences(self, text: str) -> list[str]:
         """Split text into sentences using regex to handle various punctuation"""
-        text = text.strip()
-        sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!)\s', text)
-        return [s.strip() for s in sentences if s.strip()]
+        return split_into_sentences(text)
+
+    async def send_to_client(self, client_id: str, message: Dict):
+        """Send a JSON message from outside the story task, e.g. the connection's reader loop"""
+        session = self.sessions.get(client_id)
+        if session is not None:
+            await self._send_message(session, message)
+
+    async def _send_message(self, session: StorySession, message: Dict):
+        """Send a JSON message after any text still being coalesced, so the client sees them in order"""
+        await session.text.flush()
+        await session.write_json(message)
+
+    async def _send_audio(self, websocket: WebSocket, session: StorySession, data: bytes, phase: Optional[str], flags: int = 0) -> int:
+        """Send audio, framed if the client asked for it; returns the bytes sent"""
+        if session.framer is not None:
+            data = session.framer.frame(data, phase, flags)
+        if data:
+            await session.text.flush()
+            start = time.perf_counter()
+            async with session.send_lock:
+                await websocket.send_bytes(data)
+            now = time.perf_counter()
+            metrics.websocket_send_seconds.observe(now - start, kind="audio")
+            metrics.websocket_sent_bytes.inc(len(data), kind="audio")
+            if not session.playing and session.story_started_at is not None:
+                metrics.time_to_first_audio.observe(now - session.story_started_at)
+            session.playing = True
+        return len(data)
+
+    async def _send_speech(self, websocket: WebSocket, text: str, language: str, client_id: str, phase: Optional[str]):
+        """Synthesize text and send it through the session's output stage"""
+        session = self.sessions.get(client_id)
+        output_stage, framer, flow = session.output_stage, session.framer, session.flow
+        if flow is not None:
+            # Don't synthesize more while the client already holds enough unplayed audio
+            await flow.wait_for_credit()
+        if framer is not None:
+            framer.start_sentence()
+        
+        flags = FLAG_SENTENCE_START
+        tts_service = tts_factory.get_service()
+        with tracing.span("tts.sentence", provider=settings.TTS_SERVICE, phase=phase or "none", chars=len(text)) as span:
+            start_ms = output_stage.duration_ms
+            sends = sent_bytes = 0
+            chunks: asyncio.Queue = asyncio.Queue()
+            
+            async def synthesize():
+                # Only synthesis holds the slot; sends run outside it, so a slow client can't hold up other sessions
+                try:
+                    async with session_scheduler.synthesis_slot(self._priority(session), client_id):
+                        async for audio_chunk in metrics.observe_tts_stream(
+                            tts_service.convert_text_to_speech(text=text, story_id=client_id, language=language),
+                            settings.TTS_SERVICE,
+                            tts_service.sample_rate
+                        ):
+                            chunks.put_nowait(audio_chunk)
+                finally:
+                    chunks.put_nowait(None)
+            
+            synthesis = asyncio.ensure_future(synthesize())
+            try:
+                while (audio_chunk := await chunks.get()) is not None:
+                    sent_ms = output_stage.duration_ms
+                    data = output_stage.process(audio_chunk, tts_service.sample_rate)
+                    if data:
+                        sent_bytes += await self._send_audio(websocket, session, data, phase, flags)
+                        sends += 1
+                        flags = 0
+                        if flow is not None:
+                            flow.on_sent(output_stage.duration_ms - sent_ms)
+                await synthesis  # Raises the TTS error, if any
+            finally:
+                synthesis.cancel()  # No-op once it finished
+                await asyncio.gather(synthesis, return_exceptions=True)
+            span.set_attribute("audio_ms", round(output_stage.duration_ms - start_ms))
+            # Sends are counted here rather than traced one by one
+            span.set_attribute("sends", sends)
+            span.set_attribute("sent_bytes", sent_bytes)
+        if framer is not None:
+            await self._send_audio(websocket, session, b"", phase, flags | FLAG_SENTENCE_END)
 
-    async def _process_story_chunk(self, websocket: WebSocket, chunk: str, phase: Optional[str], language: str, sentence_buffer: str, client_id: str) -> str:
+    async def _process_story_chunk(self, speech: SpeechQueue, chunk: str, phase: Optional[str], sentence_buffer: str, client_id: str) -> str:
         """Process a chunk of story text, handling both text and audio streaming"""
-        await websocket.send_json({
-            "type": "text",
-            "content": chunk,
-            "phase": phase
-        })
+        # Token-sized chunks are batched into fewer text messages
+        await self.sessions.get(client_id).text.add(chunk, phase)
         
         sentence_buffer += chunk
         sentences = self._split_into_sentences(sentence_buffer)
@@ -51,149 +233,322 @@ class StoryStreamingWebSocket:
             
             # Process complete sentences
             for sentence in sentences[:-1]:
-                async for audio_chunk in tts_factory.get_service().convert_text_to_speech(
-                    text=sentence,
-                    story_id=client_id,
-                    language=language
-                ):
-                    await websocket.send_bytes(audio_chunk)
+                speech.put(sentence, phase)
             
             return new_buffer
         return sentence_buffer
 
-    async def _request_user_interaction(self, websocket: WebSocket, client_id: str, next_phase: str) -> str:
-        """Request and wait for user interaction between phases"""
-        state = self.story_states[client_id]
+    def _interaction_request(self, session: StorySession, next_phase: str) -> Dict:
         prompt = settings.INTERACTIVE_PHASE_PROMPT.format(
-            previous_content=state["complete_story"],
+            previous_content=session.complete_story,
             next_phase=next_phase
         )
-        
-        # Send interaction request
-        await websocket.send_json({
+        return {
             "type": "interaction_request",
             "message": prompt,
             "phase_prompt": settings.STORY_PHASES[next_phase]["interactive_prompt"]
-        })
+        }
+
+    async def _request_user_interaction(self, websocket: WebSocket, client_id: str, next_phase: str) -> str:
+        """Request and wait for user interaction between phases"""
+        session = self.sessions.get(client_id)
+        await self._send_message(session, self._interaction_request(session, next_phase))
+        
+        # Wait for the user's response, delivered by the connection's reader through handle_client_message
+        session.awaiting_interaction = True
+        await self.sessions.save(session)  # The user may come back through another worker
+        response = await session.interaction_responses.get()
+        # Left set if the wait is cancelled, so the story ends with its saved record intact
+        session.awaiting_interaction = False
+        return response
         
-        # Wait for user response
-        state["awaiting_interaction"] = True
-        while state["awaiting_interaction"]:
+    async def stream_story(
+        self,
+        websocket: WebSocket,
+        transcription: str,
+        language: str = None,
+        client_id: str = None,
+        audio_format: Optional[dict] = None,
+        framing: Optional[int] = None,
+        max_ahead_ms: Optional[int] = None,
+        resume: bool = False
+    ):
+        """Stream a story once the session scheduler admits it.
+        
+        While waiting for a free slot the client gets "queued" status messages
+        with its position in line; if the line is full it gets an error instead.
+        With resume, transcription answers the interaction request of a story
+        restored on reconnect, which then continues after its saved phase.
+        """
+        session = self.sessions.get(client_id)
+        if session is None:
+            # Evicted while idle since it connected
             try:
-                response = await websocket.receive_json()
-                if response["type"] == "interaction_response":
-                    state["awaiting_interaction"] = False
-                    return response["content"]
-            except WebSocketDisconnect:
-                raise
+                session = await self.sessions.create(client_id, websocket)
+            except SessionStoreFullError as e:
+                metrics.stories.inc(outcome="rejected")
+                await websocket.send_json({"type": "error", "message": str(e)})
+                return
+        session.story_started_at = time.perf_counter()  # Time to first audio includes queueing
         
-        return ""  # Fallback in case of issues
+        async def on_position(position: int):
+            try:
+                await self._send_message(session, {
+                    "type": "status",
+                    "status": "queued",
+                    "position": position,
+                    "message": f"Waiting for a free storyteller, you are number {position} in line"
+                })
+            except Exception:
+                pass  # The reader loop notices a closed connection and cancels this story
         
-    async def stream_story(self, websocket: WebSocket, transcription: str, language: str = None, client_id: str = None):
-        """Stream story generation and audio through WebSocket"""
+        session.queued = True
         try:
-            language = language or language_manager.current_language
-            state = self.story_states.get(client_id, {
-                "complete_story": "",
-                "current_phase": None,
-                "awaiting_interaction": False
+            # Keyed by client id, so it shares a trace with the request that transcribed the input
+            with tracing.span("story", trace_key=client_id, client_id=client_id):
+                async with session_scheduler.session(client_id, on_position):
+                    session.queued = False
+                    if self.sessions.get(client_id) is not session:
+                        # Removed while it waited, e.g. replaced by a reconnect of the same client id
+                        metrics.stories.inc(outcome="rejected")
+                        try:
+                            await self._send_message(session, {
+                                "type": "error",
+                                "message": "The session ended while waiting for a storyteller, please reconnect"
+                            })
+                        except Exception:
+                            pass
+                        return
+                    await self._stream_admitted_story(
+                        websocket, transcription, language, client_id, audio_format, framing, max_ahead_ms, resume
+                    )
+        except SchedulerBusyError as e:
+            metrics.stories.inc(outcome="rejected")
+            await self._send_message(session, {
+                "type": "error",
+                "message": str(e)
             })
+        finally:
+            session.queued = False
+    
+    async def _stream_admitted_story(
+        self,
+        websocket: WebSocket,
+        transcription: str,
+        language: str = None,
+        client_id: str = None,
+        audio_format: Optional[dict] = None,
+        framing: Optional[int] = None,
+        max_ahead_ms: Optional[int] = None,
+        resume: bool = False
+    ):
+        """Stream story generation and audio through WebSocket.
+        
+        audio_format is the client's optional {"codec", "sample_rate"} request; the
+        format actually used is announced in an audio_format message before any audio.
+        Clients that send framing=1 get every audio message wrapped in an
+        audio_framing frame, and TTS is held back to max_ahead_ms ahead of the
+        playback position they report with audio_ack messages.
+        """
+        audio_writer: Optional[StoryAudioWriter] = None
+        speech: Optional[SpeechQueue] = None
+        completed = False
+        try:
+            language = language or await language_manager.get_language(client_id)
+            session = self.sessions.get(client_id)
+            session.playing = False
+            resume_phase = self._resume_phase(session) if resume else None
+            if resume_phase is not None:
+                # Continue the restored story, with this input as the answer it was waiting for
+                transcription = f"{session.transcription}\n\nFor the {resume_phase} phase: {transcription}"
+                session.resumable = False
+            else:
+                session.reset_story()
+                session.story_id = uuid.uuid4().hex
+            session.transcription = transcription
+            story_span = tracing.current_span()
+            story_span.set_attribute("story_id", session.story_id)
+            story_span.set_attribute("language", language)
+            if settings.DEBUG_PRINT_USER_INPUT:
+                story_span.set_attribute("input", transcription)
             sentence_buffer = ""
+            output_format = negotiate_audio_format(audio_format)
+            output_stage = AudioOutputStage(output_format)
+            if settings.STORY_AUDIO_ENABLED:
+                # Keep a copy of exactly what the client hears, for replays
+                audio_writer = StoryAudioWriter(
+                    session.story_id, output_format.sample_rate, resume=resume_phase is not None
+                )
+                output_stage.tee = audio_writer.write
+            session.output_stage = output_stage
+            session.framer = AudioFramer(output_format) if framing else None
+            session.flow = FlowController(max_ahead_ms=max_ahead_ms) if framing else None
+            
+            # Wait for a TTS model still loading in the background, without blocking other sessions
+            await tts_factory.ensure_ready()
+            speech = SpeechQueue(
+                lambda sentence, phase: self._send_speech(websocket, sentence, language, client_id, phase)
+            )
             
-            # Debug: Print initial user input
-            print("\n=== Story Generation Start ===")
-            print(f"Initial User Input: {transcription}")
-            print(f"Language: {language}")
+            logger.info("Story %s started (language=%s)", session.story_id, language)
+            if settings.DEBUG_PRINT_USER_INPUT:
+                logger.debug("Story input: %s", transcription)
             
             # Send initial message with language
-            await websocket.send_json({
+            await self._send_message(session, {
                 "type": "status",
                 "status": "started",
                 "message": "Starting story generation",
-                "language": language
+                "language": language,
+                "story_id": session.story_id,
+                **({"resumed_phase": resume_phase} if resume_phase is not None else {})
             })
+            format_message = output_format.describe()
+            if session.framer is not None:
+                format_message["frame_version"] = 1
+                format_message["max_ahead_ms"] = session.flow.max_ahead_ms
+            await self._send_message(session, format_message)
             
             if settings.ENABLE_PHASED_GENERATION:
                 phases = list(settings.STORY_PHASES.keys())
-                for i, phase in enumerate(phases):
-                    state["current_phase"] = phase
-                    print(f"\n=== Phase {i+1}: {phase} ===")
+                first = phases.index(resume_phase) if resume_phase is not None else 0
+                for i, phase in enumerate(phases[first:], start=first):
+                    session.current_phase = phase
+                    if settings.DEBUG_PRINT_PHASES:
+                        logger.debug("Phase %d: %s", i + 1, phase)
                     
                     # Process story chunks for this phase
-                    generator = llm_service.generate_story_phase(
+                    generator = metrics.observe_llm_stream(llm_service.generate_story_phase(
                         transcription, 
                         phase=phase,
                         language=language,
-                        previous_content=state["complete_story"] if state["complete_story"] else None
-                    )
+                        previous_content=session.complete_story if session.complete_story else None
+                    ), settings.LLM_SERVICE, phase)
                     
                     phase_output = ""
-                    async for chunk in generator:
-                        sentence_buffer = await self._process_story_chunk(
-                            websocket, chunk, phase, language, sentence_buffer, client_id
-                        )
-                        state["complete_story"] += chunk
-                        phase_output += chunk
+                    with tracing.span("llm.phase", provider=settings.LLM_SERVICE, phase=phase) as span:
+                        async with session_scheduler.generation_slot(self._priority(session), client_id):
+                            async for chunk in generator:
+                                sentence_buffer = await self._process_story_chunk(
+                                    speech, chunk, phase, sentence_buffer, client_id
+                                )
+                                session.append_story(chunk)
+                                phase_output += chunk
+                        span.set_attribute("chars", len(phase_output))
                     
-                    print(f"\nLLM Output ({phase}):")
-                    print(f"{phase_output}")
-                    print(f"=== End of {phase} ===\n")
+                    if settings.DEBUG_PRINT_LLM_OUTPUT:
+                        logger.debug("LLM output (%s): %s", phase, phase_output)
+                    if settings.DEBUG_PRINT_PHASES:
+                        logger.debug("End of %s", phase)
 
                     # Request user interaction after Exposition, Rising Action, and Climax
                     if settings.ENABLE_INTERACTIVE_PHASES and i < 3:  # All phases except Resolution
                         next_phase = phases[i + 1]  # Get the name of the next phase
+                        # Let the phase finish playing before asking what happens next
+                        await speech.drain()
                         user_input = await self._request_user_interaction(websocket, client_id, next_phase)
                         if user_input:
-                            print(f"\nUser Interaction Input (before {next_phase}):")
-                            print(f"{user_input}")
+                            if settings.DEBUG_PRINT_USER_INPUT:
+                                logger.debug("Interaction input before %s: %s", next_phase, user_input)
                             transcription = f"{transcription}\n\nFor the {next_phase} phase: {user_input}"
+                            session.transcription = transcription
             else:
                 # Process story chunks without phases
                 story_output = ""
-                async for chunk in llm_service.generate_story(transcription, language):
-                    sentence_buffer = await self._process_story_chunk(
-                        websocket, chunk, None, language, sentence_buffer, client_id
-                    )
-                    state["complete_story"] += chunk
-                    story_output += chunk
+                with tracing.span("llm.phase", provider=settings.LLM_SERVICE, phase="none") as span:
+                    async with session_scheduler.generation_slot(self._priority(session), client_id):
+                        async for chunk in metrics.observe_llm_stream(llm_service.generate_story(transcription, language), settings.LLM_SERVICE, None):
+                            sentence_buffer = await self._process_story_chunk(
+                                speech, chunk, None, sentence_buffer, client_id
+                            )
+                            session.append_story(chunk)
+                            story_output += chunk
+                    span.set_attribute("chars", len(story_output))
                 
-                print("\nLLM Output (No Phases):")
-                print(f"{story_output}")
+                if settings.DEBUG_PRINT_LLM_OUTPUT:
+                    logger.debug("LLM output: %s", story_output)
             
             # Process remaining text
             if sentence_buffer:
                 if not re.search(r'[.!?]$', sentence_buffer):
                     sentence_buffer += "."
-                    state["complete_story"] += "."
+                    session.append_story(".")
                     
-                async for audio_chunk in tts_factory.get_service().convert_text_to_speech(
-                    text=sentence_buffer,
-                    story_id=client_id,
-                    language=language
-                ):
-                    await websocket.send_bytes(audio_chunk)
+                speech.put(sentence_buffer, session.current_phase)
+            await speech.close()
+            
+            remaining_audio = output_stage.flush()
+            if remaining_audio or session.framer is not None:
+                await self._send_audio(websocket, session, remaining_audio, session.current_phase, FLAG_STREAM_END)
+            logger.debug(
+                "Audio sent: %d bytes (%s @ %d Hz) from %d bytes of TTS PCM",
+                output_stage.bytes_out, output_format.codec, output_format.sample_rate, output_stage.bytes_in
+            )
                     
+            if audio_writer is not None:
+                try:
+                    await audio_writer.finish()
+                except Exception as e:
+                    logger.error("Failed to save audio of story %s: %s", session.story_id, e)
+            
             # Store the complete story in history
-            conversation_manager.add_story(transcription, state["complete_story"], language)
+            await conversation_manager.add_story(transcription, session.complete_story, language, client_id, session.story_id)
             
-            print("\n=== Story Generation Complete ===")
-            print(f"Final story length: {len(state['complete_story'])} characters")
+            logger.info("Story %s complete: %d characters", session.story_id, session.story_length)
                     
             # Send completion message
-            await websocket.send_json({
+            await self._send_message(session, {
                 "type": "status",
                 "status": "completed",
                 "message": "Story generation completed"
             })
+            metrics.stories.inc(outcome="completed")
+            completed = True
+            metrics.story_seconds.observe(time.perf_counter() - session.story_started_at)
+            logger.debug("Text sent: %d LLM chunks in %d messages", session.text.deltas_in, session.text.messages_out)
             
         except WebSocketDisconnect:
-            print(f"Client disconnected during story streaming")
+            metrics.stories.inc(outcome="disconnected")
+            logger.info("Client %s disconnected during story streaming", client_id)
             raise
+        except FlowStalledError as e:
+            metrics.stories.inc(outcome="stalled")
+            # The client stopped listening; stop synthesizing for it and free the session
+            logger.warning("Aborting story for %s: %s", client_id, e)
+            tracing.record_error(e)
+            await websocket.close(code=1001, reason="Audio acknowledgements stopped")
         except Exception as e:
-            print(f"Error in story streaming: {str(e)}")
-            await websocket.send_json({
+            metrics.stories.inc(outcome="failed")
+            logger.error("Error in story streaming: %s", e)
+            tracing.record_error(e)
+            await self.send_to_client(client_id, {
                 "type": "error",
                 "message": str(e)
             })
+        finally:
+            if speech is not None:
+                await speech.cancel()
+            session = self.sessions.get(client_id)
+            # Cancelled while waiting for the user: the story can resume after a reconnect
+            interrupted = session is not None and session.awaiting_interaction
+            if audio_writer is not None and not audio_writer.finished:
+                try:
+                    if interrupted:
+                        await audio_writer.suspend()  # Its audio opens the resumed run's file
+                    else:
+                        await audio_writer.abort()
+                except Exception as e:
+                    logger.error("Failed to close the audio file of %s's story: %s", client_id, e)
+            # Release the per-story streaming objects however the story ended
+            if session is not None:
+                # Keep the record saved when the wait started, so a reconnect can resume
+                session.end_story()
+                if completed:
+                    await self.sessions.forget(session)
+                elif not interrupted:
+                    await self.sessions.save(session)
             
-story_ws = StoryStreamingWebSocket()
\ No newline at end of file
+story_ws = StoryStreamingWebSocket()
+
+metrics.registry.gauge(
+    "storyteller_sessions", "Live story sessions held in this worker", function=lambda: len(story_ws.sessions))
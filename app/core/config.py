@@ -1,20 +1,34 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
 from typing import Optional, Literal, Dict, Any
+import logging
 import os
 import torch
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Story Teller API"
     VERSION: str = "0.1.0"
     API_V1_STR: str = "/api/v1"
     
     # Debug Configuration
-    DEBUG_MODE: bool = True
-    DEBUG_PRINT_USER_INPUT: bool = True
-    DEBUG_PRINT_LLM_OUTPUT: bool = True
-    DEBUG_PRINT_PHASES: bool = True
+    DEBUG_MODE: bool = True  # Log at DEBUG level unless LOG_LEVEL says otherwise
+    DEBUG_PRINT_USER_INPUT: bool = True  # Log story requests and interaction input, and keep them on traces
+    DEBUG_PRINT_LLM_OUTPUT: bool = True  # Log the text generated for each phase
+    DEBUG_PRINT_PHASES: bool = True  # Log the start and end of each phase
+    
+    # Logging and Tracing Configuration
+    LOG_LEVEL: Optional[Literal["DEBUG", "INFO", "WARNING", "ERROR"]] = None
+    TRACE_SAMPLE_RATE: float = 1.0  # Share of sessions that are traced and logged at DEBUG level
+    TRACE_ENABLED: bool = False  # Export spans of sampled sessions to TRACE_FILE
+    TRACE_FILE: Path = Path("data/traces.jsonl")  # OTLP/JSON, one batch of spans per line
+    
+    # Profiling Configuration
+    ENABLE_PROFILING_ENDPOINTS: bool = False  # /admin/profile/stacks and /admin/profile/torch
+    PROFILING_TOKEN: Optional[str] = None  # When set, required in the X-Profiling-Token header
+    PROFILING_MAX_SECONDS: float = 60  # Upper bound on a stack profile or a wait for inferences
     
     # Story Generation Configuration
     ENABLE_PHASED_GENERATION: bool = True
@@ -63,7 +77,7 @@ class Settings(BaseSettings):
     ENABLED_INPUT_METHODS: list[Literal["voice", "text"]] = ["voice", "text"]
     
     # LLM Service Configuration
-    LLM_SERVICE: Literal["gemini", "local", "openrouter"] = os.getenv("LLM_SERVICE", "gemini")
+    LLM_SERVICE: Literal["gemini", "local", "openrouter", "fake"] = os.getenv("LLM_SERVICE", "gemini")
     
     # Hugging Face Configuration
     HUGGINGFACE_TOKEN: str = os.getenv("HUGGINGFACE_TOKEN", "")
@@ -89,19 +103,144 @@ class Settings(BaseSettings):
     GEMINI_TOP_P: float = 0.8
     GEMINI_TOP_K: int = 40
     
+    # Fake Services Configuration
+    # LLM_SERVICE=fake and TTS_SERVICE=fake stand in for the real providers when benchmarking
+    # without network or GPU. Output and timing are deterministic for a given FAKE_SEED;
+    # jitter varies each delay by up to that fraction, error rates fail that share of requests
+    FAKE_SEED: int = 0
+    FAKE_LLM_TTFT_MS: int = 400
+    FAKE_LLM_TOKENS_PER_SECOND: float = 40.0
+    FAKE_LLM_STORY_WORDS: int = 300  # Without phased generation
+    FAKE_LLM_JITTER: float = 0.2
+    FAKE_LLM_ERROR_RATE: float = 0.0
+    FAKE_TTS_SAMPLE_RATE: int = 24000
+    FAKE_TTS_FIRST_CHUNK_MS: int = 150
+    FAKE_TTS_REAL_TIME_FACTOR: float = 0.1  # Seconds of synthesis per second of audio
+    FAKE_TTS_JITTER: float = 0.2
+    FAKE_TTS_ERROR_RATE: float = 0.0
+    
+    # Cassette Configuration
+    # "record" saves every Gemini/OpenRouter stream and Google TTS response with its timing
+    # under CASSETTE_DIR; "replay" serves them back instead of calling the APIs, at
+    # CASSETTE_SPEED times the original pace (0 replays without any delay)
+    CASSETTE_MODE: Literal["off", "record", "replay"] = "off"
+    CASSETTE_DIR: Path = Path("data/cassettes")
+    CASSETTE_SPEED: float = 1.0
+    
     # Audio Configuration
     AUDIO_DEVICE_INDEX: Optional[int] = 7
     TTS_SAMPLE_RATE: int = 16000
     
+    # Voice Activity Detection Configuration
+    # Trims leading/trailing silence from recordings and can stop them automatically
+    VAD_ENABLED: bool = True
+    VAD_ENERGY_THRESHOLD_DB: float = -45.0  # Blocks louder than this (dBFS) count as speech
+    VAD_MIN_SPEECH_MS: int = 150  # Continuous speech required before an utterance starts
+    VAD_PADDING_MS: int = 250  # Audio kept on each side of the detected speech
+    VAD_AUTO_STOP_SILENCE_MS: int = 1500  # Silence after speech that ends the recording (0 disables)
+    
+    # Recorder Session Configuration
+    RECORDER_MAX_SESSIONS: int = 8  # Concurrent recordings sharing the input device
+    RECORDER_MAX_SECONDS: int = 60  # Ring buffer length per session; older audio is overwritten
+    RECORDER_QUEUE_BLOCKS: int = 256  # Captured blocks buffered per session before dropping
+    RECORDER_SESSION_TIMEOUT_SECONDS: int = 300  # Finished recordings not collected in time are discarded
+    
     # TTS Configuration
-    TTS_SERVICE: Literal["google", "kokoro"] = Field(default="google", env="TTS_SERVICE")
+    TTS_SERVICE: Literal["google", "kokoro", "fake"] = Field(default="google", env="TTS_SERVICE")
     TTS_DEVICE: str = "cuda" if torch.cuda.is_available() else "cpu"
     TTS_MODEL_PATH: Path = Path("app/models/kokoro")
     TTS_MODEL_WEIGHTS: str = "kokoro-v0_19.pth"
     TTS_VOICE: str = "af"
     TTS_CHUNK_SIZE: int = 1000
+    # Where synthesized audio goes: "network" streams to clients only (headless servers),
+    # "local" plays on the server's speakers only, "both" does both
+    TTS_OUTPUT_SINK: Literal["network", "local", "both"] = "network"
+    # What clients receive unless they ask for something else in their transcription message.
+    # Every TTS service's output is resampled to AUDIO_OUTPUT_SAMPLE_RATE and encoded as
+    # "pcm16" (raw int16), "wav" (one WAV file per message) or "opus" (needs opuslib)
+    AUDIO_OUTPUT_SAMPLE_RATE: int = 16000
+    AUDIO_OUTPUT_CODEC: Literal["pcm16", "wav", "opus"] = "pcm16"
+    AUDIO_OPUS_BITRATE: int = 24000  # bits/s; speech at 16 kHz stays clear well below this
+    AUDIO_OPUS_FRAME_MS: Literal[10, 20, 40, 60] = 20
+    # Flow control for clients using framed audio: synthesis pauses once this much sent audio
+    # is unplayed according to the client's audio_ack messages, and a client that stays
+    # silent for the stall timeout while synthesis is paused gets disconnected
+    AUDIO_FLOW_MAX_AHEAD_MS: int = 30000
+    AUDIO_FLOW_STALL_TIMEOUT_SECONDS: float = 60.0
+    # Kokoro batching: sentences from one or more stories share a forward pass.
+    # A batch runs once KOKORO_BATCH_MAX_SIZE sentences are queued or the first one waited KOKORO_BATCH_MAX_WAIT_MS
+    KOKORO_BATCH_MAX_SIZE: int = 8
+    KOKORO_BATCH_MAX_WAIT_MS: int = 20
+    # "thread" synthesizes in the API process; "process" runs KOKORO_NUM_WORKERS worker
+    # processes, each with its own model and KOKORO_WORKER_TORCH_THREADS torch threads
+    KOKORO_EXECUTION_MODE: Literal["thread", "process"] = "thread"
+    KOKORO_NUM_WORKERS: int = 2
+    KOKORO_WORKER_TORCH_THREADS: int = 1
+    KOKORO_WORKER_MAX_AUDIO_SECONDS: int = 60  # Size of each worker's shared-memory PCM buffer; longer sentences fail
+    KOKORO_WORKER_REQUEST_TIMEOUT_SECONDS: float = 120  # A sentence not synthesized by then fails instead of waiting forever
+    # Cold start: the checkpoint is converted once into a ready-to-load state dict that is
+    # memory-mapped on later starts; listed voices are loaded in the background
+    KOKORO_CONVERTED_WEIGHTS_PATH: Optional[Path] = None  # Defaults to <weights>.converted.pt next to the checkpoint
+    KOKORO_PRELOAD_VOICES: list[str] = ["af_bella", "bf"]
+    TTS_PRELOAD_ON_STARTUP: bool = True  # Load the TTS service in the background when the API starts
+    # Accelerated inference: submodules are compiled (torch.compile) or traced (TorchScript)
+    # and checked against eager output; any that fail or drift past the tolerances stay eager
+    KOKORO_ENGINE: Literal["eager", "compile", "torchscript"] = "eager"
+    KOKORO_ENGINE_RTOL: float = 1e-3
+    KOKORO_ENGINE_ATOL: float = 1e-3
+    # Phoneme cache in front of Kokoro's phonemizer
+    PHONEME_CACHE_MAX_SENTENCES: int = 5000
+    PHONEME_CACHE_MAX_WORDS: int = 20000
+    # Build uncached sentences from per-word phonemes. Faster on new sentences, but words
+    # lose sentence context (e.g. reduced articles), so it is off by default
+    PHONEME_CACHE_WORD_LEVEL: bool = False
+    PHONEME_CACHE_PATH: Optional[Path] = None  # JSON file to persist the cache across restarts
+    PHONEME_CACHE_SAVE_EVERY: int = 500  # New entries between automatic saves
     AUDIO_DEBUG_DIR: Path = Path("debug/audio")
     AUDIO_OUTPUT_DIR: Path = Path("output/audio")
+    # Keep each story's audio, as sent to clients, in AUDIO_OUTPUT_DIR/<story_id>.<format>
+    # so replays are served from disk instead of regenerated
+    STORY_AUDIO_ENABLED: bool = False
+    STORY_AUDIO_FORMAT: Literal["ogg", "flac"] = "ogg"  # Ogg Vorbis is far smaller; FLAC is lossless
+    
+    # WebSocket Configuration
+    # LLM text deltas are batched into one message per window, or sooner once the buffer reaches the byte limit
+    WS_TEXT_COALESCE_MS: int = 50  # 0 sends every delta as it arrives
+    WS_TEXT_COALESCE_MAX_BYTES: int = 1024
+    WS_PER_MESSAGE_DEFLATE: bool = False  # Offer permessage-deflate; saves bandwidth on text, costs CPU per message
+    
+    # Session Scheduler Configuration
+    # Stories beyond the active limit wait in a queue (and are told their position);
+    # beyond the queue limit they are refused. LLM generations and TTS synthesis have
+    # their own limits, where sessions already playing audio go before new ones
+    SCHEDULER_MAX_ACTIVE_SESSIONS: int = 16
+    SCHEDULER_MAX_QUEUED_SESSIONS: int = 64
+    SCHEDULER_MAX_CONCURRENT_GENERATIONS: int = 8
+    SCHEDULER_MAX_CONCURRENT_SYNTHESIS: int = 4
+    SCHEDULER_RATE_LIMIT_STORIES_PER_MINUTE: float = 6.0  # Per client address, 0 disables
+    SCHEDULER_RATE_LIMIT_BURST: int = 3
+    
+    # Session Store Configuration
+    # Websocket sessions idle longer than the TTL are dropped (never while streaming);
+    # past the size limit the least recently used idle session is evicted
+    SESSION_STORE_MAX_SESSIONS: int = 1000
+    SESSION_STORE_TTL_SECONDS: float = 1800.0
+    SESSION_STORE_SWEEP_INTERVAL_SECONDS: float = 30.0
+    
+    # State Backend Configuration
+    # Story history, per-client language and session records. "memory" keeps them in the
+    # process (one worker); "sqlite" shares them between workers through a WAL-mode database
+    STATE_BACKEND: Literal["memory", "sqlite"] = "memory"
+    STATE_SQLITE_PATH: Path = Path("data/state.sqlite3")
+    HISTORY_MAX_STORIES: int = 10000  # Oldest stories are dropped past this
+    
+    # Story Archive Configuration
+    # Every finished story kept across restarts, compressed and full-text searchable
+    ARCHIVE_ENABLED: bool = True
+    ARCHIVE_PATH: Path = Path("data/archive.sqlite3")
+    ARCHIVE_BATCH_SIZE: int = 50  # Stories written per transaction at most
+    ARCHIVE_FLUSH_INTERVAL_MS: int = 500  # How long the writer gathers stories before committing
+    ARCHIVE_COMPRESSION_LEVEL: int = 6  # zlib level for story text
     
     # Google Cloud Configuration
     google_application_credentials: str
@@ -210,7 +349,7 @@ class Settings(BaseSettings):
     ) -> str:
         """Format the story prompt with the given parameters."""
         try:
-            print(f"DEBUG - Settings.get_story_prompt called with language={language}")
+            logger.debug("Formatting story prompt for language=%s", language)
             
             if phase_prompt and "Exposition" in phase_prompt:
                 previous_story_section = "This is a new story request. Create an original story based on the child's input."
@@ -242,7 +381,6 @@ class Settings(BaseSettings):
                 continuation_instruction = "with a fresh narrative"
                 story_start_instruction = "Start with a strong hook"
             
-            print("DEBUG - About to format prompt template")
             formatted_prompt = self.STORY_PROMPT.format(
                 language=language,
                 user_input=user_input,
@@ -251,11 +389,9 @@ class Settings(BaseSettings):
                 story_start_instruction=story_start_instruction,
                 phase_prompt=phase_prompt or ""
             )
-            print("DEBUG - Successfully formatted prompt")
             return formatted_prompt
         except Exception as e:
-            print(f"DEBUG - Error in Settings.get_story_prompt: {str(e)}")
-            print(f"DEBUG - Error type: {type(e)}")
+            logger.error("Failed to format story prompt: %s: %s", type(e).__name__, e)
             raise
 
     # Llama Configuration
@@ -1,18 +1,32 @@
+from typing import Optional
 from app.core.languages import DEFAULT_LANGUAGE
+from app.services.state_backend import StateBackend, state_backend
 
 class LanguageManager:
-    def __init__(self):
-        self._current_language = DEFAULT_LANGUAGE
+    """Story language per client, falling back to a shared default.
+    
+    Both live in the state backend, so a change made through one worker
+    applies to all of them. The methods are async because a SQLite backend is
+    queried from a worker thread.
+    """
+    
+    def __init__(self, backend: StateBackend = state_backend):
+        self.backend = backend
         
-    @property
-    def current_language(self) -> str:
-        return self._current_language
+    async def set_language(self, language: str, client_id: Optional[str] = None):
+        """Set a client's language, or the default for everyone without one when client_id is None"""
+        await self.backend.run(self.backend.set_language, language, client_id)
         
-    def set_language(self, language: str):
-        self._current_language = language
+    async def get_language(self, client_id: Optional[str] = None) -> str:
+        """The client's language, else the default; the default alone when client_id is None"""
+        return await self.backend.run(self._lookup, client_id)
         
-    def get_language(self) -> str:
-        return self._current_language
+    def _lookup(self, client_id: Optional[str]) -> str:
+        if client_id:
+            language = self.backend.get_language(client_id)
+            if language:
+                return language
+        return self.backend.get_language() or DEFAULT_LANGUAGE
 
 # Global instance
-language_manager = LanguageManager() 
\ No newline at end of file
+language_manager = LanguageManager()
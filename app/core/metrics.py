@@ -0,0 +1,234 @@
+"""Pipeline metrics in Prometheus text format, served at /metrics.
+
+A small self-contained registry (counters, gauges and histograms with
+labels) so the API needs no metrics dependency; observing a value is a dict
+lookup and a bisect. Everything here runs on the event loop or under the
+GIL, and a lost increment from a worker thread is acceptable for metrics.
+"""
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; covers sub-millisecond sends up to multi-minute stories
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 300, 500, 1000)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def collect(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in self._values.items()]
+
+class Gauge(_Metric):
+    """A value that is set directly, or read from a function at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function = function
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                return [f"{self.name} {_format_value(self._function())}"]
+            except Exception:
+                return []
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in self._values.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket counts (last slot is +Inf), sum
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# LLM
+llm_time_to_first_token = registry.histogram(
+    "storyteller_llm_time_to_first_token_seconds", "Time from starting an LLM request to its first text chunk", ["provider", "phase"])
+llm_tokens_per_second = registry.histogram(
+    "storyteller_llm_tokens_per_second", "LLM output rate after the first chunk, in tokens estimated as characters / 4",
+    ["provider", "phase"], RATE_BUCKETS)
+llm_generation_seconds = registry.histogram(
+    "storyteller_llm_generation_seconds", "Duration of one LLM request, first byte to last", ["provider", "phase"])
+llm_errors = registry.counter("storyteller_llm_errors_total", "LLM requests that failed", ["provider"])
+
+# TTS
+tts_first_chunk = registry.histogram(
+    "storyteller_tts_first_chunk_seconds", "Time from requesting a sentence to its first audio chunk", ["provider"])
+tts_synthesis_seconds = registry.histogram(
+    "storyteller_tts_synthesis_seconds", "Time spent synthesizing one sentence", ["provider"])
+tts_real_time_factor = registry.histogram(
+    "storyteller_tts_real_time_factor", "Synthesis time divided by the duration of the audio produced", ["provider"], RATIO_BUCKETS)
+tts_errors = registry.counter("storyteller_tts_errors_total", "Sentences that failed to synthesize", ["provider"])
+
+# STT
+stt_real_time_factor = registry.histogram(
+    "storyteller_stt_real_time_factor", "Transcription time divided by the duration of the audio", (), RATIO_BUCKETS)
+stt_seconds = registry.histogram("storyteller_stt_seconds", "Time to transcribe one batch of recordings")
+
+# Story sessions and websocket
+time_to_first_audio = registry.histogram(
+    "storyteller_time_to_first_audio_seconds", "Time from a story request to its first audio message, including queueing")
+story_seconds = registry.histogram("storyteller_story_seconds", "Time from a story request to its completion", (), LATENCY_BUCKETS)
+stories = registry.counter("storyteller_stories_total", "Stories by outcome", ["outcome"])
+websocket_send_seconds = registry.histogram(
+    "storyteller_websocket_send_seconds", "Time to hand one message to the websocket, including waiting for the send lock", ["kind"])
+websocket_sent_bytes = registry.counter("storyteller_websocket_sent_bytes_total", "Bytes sent to websocket clients", ["kind"])
+
+# Event loop
+event_loop_lag = registry.histogram(
+    "storyteller_event_loop_lag_seconds", "How late the event loop woke a sleeping task; high values mean blocking work on the loop")
+
+def estimate_tokens(text: str) -> float:
+    return len(text) / 4
+
+async def observe_llm_stream(stream: AsyncIterator[str], provider: str, phase: Optional[str]) -> AsyncGenerator[str, None]:
+    """Pass an LLM stream through, recording time to first token, output rate and duration"""
+    phase = phase or "none"
+    start = time.perf_counter()
+    first: Optional[float] = None
+    tokens = 0.0
+    try:
+        async for chunk in stream:
+            if first is None:
+                first = time.perf_counter()
+                llm_time_to_first_token.observe(first - start, provider=provider, phase=phase)
+            else:
+                tokens += estimate_tokens(chunk)  # The first chunk's tokens arrived with the TTFT
+            yield chunk
+    except Exception:
+        llm_errors.inc(provider=provider)
+        raise
+    end = time.perf_counter()
+    llm_generation_seconds.observe(end - start, provider=provider, phase=phase)
+    if first is not None and end > first and tokens:
+        llm_tokens_per_second.observe(tokens / (end - first), provider=provider, phase=phase)
+
+async def observe_tts_stream(stream: AsyncIterator[bytes], provider: str, sample_rate: int) -> AsyncGenerator[bytes, None]:
+    """Pass a TTS stream of int16 PCM through, counting only time spent waiting on the service"""
+    synthesis = 0.0
+    audio_bytes = 0
+    first = True
+    iterator = stream.__aiter__()
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = await iterator.__anext__()
+        except StopAsyncIteration:
+            synthesis += time.perf_counter() - start
+            break
+        except Exception:
+            tts_errors.inc(provider=provider)
+            raise
+        waited = time.perf_counter() - start
+        synthesis += waited
+        if first:
+            tts_first_chunk.observe(waited, provider=provider)
+            first = False
+        audio_bytes += len(chunk)
+        yield chunk
+    tts_synthesis_seconds.observe(synthesis, provider=provider)
+    audio_seconds = audio_bytes / 2 / sample_rate
+    if audio_seconds > 0:
+        tts_real_time_factor.observe(synthesis / audio_seconds, provider=provider)
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """Measure how late sleeps wake up, for as long as the app runs"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(0.0, loop.time() - start - interval))
@@ -0,0 +1,166 @@
+"""On-demand profilers behind the /admin/profile endpoints.
+
+StackSampler snapshots the stack of every thread (the event loop and the
+TTS/STT/LLM workers) with sys._current_frames() from its own thread, so a
+blocked event loop is sampled too. It returns folded stacks, one
+"thread;outer;...;inner count" line per distinct stack, which flamegraph.pl,
+speedscope and inferno read directly.
+
+TorchCapture profiles the next N model inferences with torch.profiler. The
+inference sites wrap their model call in torch_capture.capture(name), which
+costs one attribute check while nothing is armed. Each captured inference is
+exported as a Chrome trace (chrome://tracing, Perfetto) into a temporary
+directory, and the endpoint returns them together as a zip. torch.profiler
+can't run twice at once, so an inference that starts while another is being
+profiled runs unprofiled and the capture waits for the next one.
+
+Only one profile of each kind runs at a time.
+"""
+import io
+import logging
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+class ProfilerBusyError(Exception):
+    pass
+
+class StackSampler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels: Dict[object, str] = {}
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            # co_qualname is new in Python 3.11
+            label = f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+            self._labels[code] = label
+        return label
+
+    def sample(self, seconds: float, interval: float) -> str:
+        """Sample all threads for a number of seconds; blocks, so run it in a worker thread"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A stack profile is already running")
+        try:
+            me = threading.get_ident()
+            stacks: Counter = Counter()
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._label(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, f"thread-{ident}"))
+                    stacks[";".join(reversed(stack))] += 1
+                time.sleep(interval)
+        finally:
+            self._lock.release()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+class TorchCapture:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._active = False  # An inference is being profiled
+        self._target: Optional[str] = None
+        self._count = 0
+        self._directory: Optional[Path] = None
+        self._traces: List[Path] = []
+        self._finished = 0  # Profiled inferences that ended, exported or not
+        self._done = threading.Event()
+
+    def arm(self, count: int, target: Optional[str] = None) -> None:
+        """Profile the next count inferences, of one target ("kokoro", "whisper", "llm") or any"""
+        with self._lock:
+            if self._directory is not None:
+                raise ProfilerBusyError("A torch profile is already running")
+            self._directory = Path(tempfile.mkdtemp(prefix="torch-profile-"))
+            self._traces = []
+            self._finished = 0
+            self._count = count
+            self._target = target
+            self._done.clear()
+            self._remaining = count
+
+    def _claim(self, name: str) -> Optional[Tuple[int, Path]]:
+        """Take one of the armed slots, returning its index and the directory it exports into"""
+        with self._lock:
+            if self._active or self._remaining <= 0 or self._target not in (None, name):
+                return None
+            self._active = True
+            self._remaining -= 1
+            return self._count - self._remaining, self._directory
+
+    @contextmanager
+    def capture(self, name: str) -> Iterator[None]:
+        """Run an inference, under torch.profiler if a profile is armed for it"""
+        claim = self._claim(name) if self._remaining else None
+        if claim is None:
+            yield
+            return
+        index, directory = claim
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        profiler = None
+        try:
+            profiler = torch.profiler.profile(activities=activities, record_shapes=True)
+            with profiler:
+                yield
+        finally:
+            with self._lock:
+                self._active = False
+                # A capture that outlived collect() must not write into the next profile's directory
+                if directory is self._directory:
+                    self._finished += 1
+                    if profiler is not None:
+                        path = directory / f"{index:02d}-{name}.json"
+                        try:
+                            profiler.export_chrome_trace(str(path))
+                            self._traces.append(path)
+                        except Exception as e:
+                            # Never let the profiler replace the inference's own result or exception
+                            logger.error("Failed to export the %s torch profile: %s", name, e)
+                    if self._finished >= self._count:
+                        self._done.set()
+
+    def profiled(self, name: str, fn: Callable, *args, **kwargs):
+        """Call fn under capture(name), for inferences started as thread or executor targets"""
+        with self.capture(name):
+            return fn(*args, **kwargs)
+
+    def collect(self, timeout: float) -> bytes:
+        """Wait for the armed inferences (or the timeout) and return their traces as a zip; blocks"""
+        self._done.wait(timeout)
+        with self._lock:
+            self._remaining = 0
+            directory, traces = self._directory, sorted(self._traces)
+            self._directory = None
+        try:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                for path in traces:
+                    archive.write(path, path.name)
+            return buffer.getvalue() if traces else b""
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+stack_sampler = StackSampler()
+torch_capture = TorchCapture()
@@ -0,0 +1,261 @@
+"""Non-blocking logging and lightweight tracing spans.
+
+Log records from the app's modules go to a QueueHandler, so logging on the
+event loop only appends to a queue; a listener thread formats and writes
+them. DEBUG_MODE picks the default level and LOG_LEVEL overrides it.
+
+Spans time one step of a session (STT, an LLM phase, a TTS sentence) and
+nest through a context variable, which asyncio copies into every task. All
+spans of a session share a trace id derived from its client id, so the
+transcription request and the story websocket land in the same trace.
+TRACE_SAMPLE_RATE keeps a share of sessions: DEBUG logs from sessions that
+aren't sampled are dropped along with their spans. With TRACE_ENABLED,
+finished spans of sampled sessions are appended to TRACE_FILE as OTLP/JSON
+lines, the format of the OpenTelemetry file exporter, which the Collector's
+otlpjsonfile receiver can import.
+
+Spans that wouldn't be exported (tracing off, or the session isn't sampled)
+are no-op spans that only carry the trace for log records; their children
+reuse them, so the hot path allocates and times nothing.
+"""
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_listener: Optional[logging.handlers.QueueListener] = None
+_exporter: Optional["SpanFileExporter"] = None
+
+def trace_id_for(key: str) -> str:
+    """The trace id of every span started for key, e.g. a client id"""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+def _is_sampled(trace_id: str) -> bool:
+    # Decided from the trace id, so every request and worker agrees about a session
+    return int(trace_id[:8], 16) / 0x100000000 < settings.TRACE_SAMPLE_RATE
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "sampled", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool, attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.record_error(error)
+        if self.sampled and _exporter is not None:
+            _exporter.export(self)
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+class _NoopSpan(Span):
+    """Stands in for a span that won't be exported: keeps its trace for log records and records nothing"""
+    __slots__ = ()
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.span_id = None
+        self.parent_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+# Shared by every untraced block that isn't part of a session
+_UNTRACED = _NoopSpan("-", True)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def record_error(error: BaseException) -> None:
+    """Mark the current span as failed, for errors that are handled rather than raised through it"""
+    current = _current_span.get()
+    if current is not None:
+        current.record_error(error)
+
+def start_span(name: str, trace_key: Optional[str] = None, **attributes) -> Span:
+    """Start a child of the current span, or a new trace (keyed by trace_key when given) if there is none"""
+    parent = _current_span.get()
+    if parent is not None:
+        if isinstance(parent, _NoopSpan):
+            return parent
+        return Span(name, parent.trace_id, parent.span_id, parent.sampled, attributes)
+    if trace_key is None and _exporter is None:
+        return _UNTRACED
+    trace_id = trace_id_for(trace_key) if trace_key else os.urandom(16).hex()
+    sampled = _is_sampled(trace_id)
+    if not sampled or _exporter is None:
+        return _NoopSpan(trace_id, sampled)
+    return Span(name, trace_id, None, sampled, attributes)
+
+@contextmanager
+def span(name: str, trace_key: Optional[str] = None, **attributes) -> Iterator[Span]:
+    """Run a block as the current span, ending it (with any exception as its error) afterwards"""
+    current = start_span(name, trace_key, **attributes)
+    if current is _current_span.get():
+        # A no-op span stands in for its children too
+        yield current
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+class SpanFileExporter:
+    """Appends finished spans to a file from a background thread, one line per FLUSH_INTERVAL"""
+
+    MAX_BATCH = 512
+    FLUSH_INTERVAL = 1.0  # Seconds of spans gathered into each write
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._queue: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._resource = {"attributes": _otlp_attributes({
+            "service.name": "storyteller",
+            "service.version": settings.VERSION,
+            "process.pid": os.getpid()
+        })}
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def _line(self, spans: List[Span]) -> str:
+        return json.dumps({"resourceSpans": [{
+            "resource": self._resource,
+            "scopeSpans": [{"scope": {"name": "app"}, "spans": [s.to_otlp() for s in spans]}]
+        }]})
+
+    def _run(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            stopping = False
+            while not stopping:
+                batch = []
+                item = self._queue.get()
+                deadline = time.monotonic() + self.FLUSH_INTERVAL
+                while item is not None:
+                    batch.append(item)
+                    remaining = deadline - time.monotonic()
+                    if len(batch) >= self.MAX_BATCH or remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                stopping = item is None
+                if batch:
+                    f.write(self._line(batch) + "\n")
+                    f.flush()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+class _TraceContextFilter(logging.Filter):
+    """Tags records with the current trace, dropping DEBUG records of sessions that aren't sampled"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = _current_span.get()
+        if current is None:
+            record.trace_id = "-"
+            return True
+        if record.levelno <= logging.DEBUG and not current.sampled:
+            return False
+        record.trace_id = current.trace_id
+        return True
+
+def configure() -> None:
+    """Send the app's logs through a background thread and start exporting spans; later calls do nothing"""
+    global _listener, _exporter
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s [%(trace_id).8s] %(message)s"))
+    queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(_TraceContextFilter())
+
+    logger = logging.getLogger("app")
+    logger.setLevel(settings.LOG_LEVEL or ("DEBUG" if settings.DEBUG_MODE else "INFO"))
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(queue_handler.queue, handler)
+    _listener.start()
+    if settings.TRACE_ENABLED:
+        _exporter = SpanFileExporter(settings.TRACE_FILE)
+
+def shutdown() -> None:
+    """Write out queued log records and spans"""
+    global _listener, _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,125 @@
+import asyncio
+import struct
+import time
+from typing import Optional
+
+from app.core.config import settings
+from app.services.audio_output import AudioFormat
+
+# Binary audio frame, version 1 (network byte order, 16 bytes):
+#   u8  version
+#   u8  codec         CODEC_IDS
+#   u8  phase         0 = no phase, then STORY_PHASES in order from 1
+#   u8  flags         FLAG_*
+#   u32 seq           frame counter for the story, starting at 0
+#   u32 sentence_id   sentence counter for the story, starting at 0
+#   u32 sample_rate
+# followed by the payload in the announced codec (may be empty for marker frames)
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("!BBBBIII")
+
+CODEC_IDS = {"pcm16": 0, "wav": 1, "opus": 2}
+
+FLAG_SENTENCE_START = 0x01
+FLAG_SENTENCE_END = 0x02
+FLAG_STREAM_END = 0x04
+
+def phase_id(phase: Optional[str]) -> int:
+    if phase is None:
+        return 0
+    return list(settings.STORY_PHASES.keys()).index(phase) + 1
+
+def pack_frame(payload: bytes, codec: str, phase: Optional[str], flags: int, seq: int, sentence_id: int, sample_rate: int) -> bytes:
+    return FRAME_HEADER.pack(FRAME_VERSION, CODEC_IDS[codec], phase_id(phase), flags, seq, sentence_id, sample_rate) + payload
+
+def unpack_frame(frame: bytes) -> dict:
+    """Parse a frame back into its fields, for tests and Python clients"""
+    version, codec, phase, flags, seq, sentence_id, sample_rate = FRAME_HEADER.unpack_from(frame)
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported audio frame version {version}")
+    return {
+        "codec": next(name for name, value in CODEC_IDS.items() if value == codec),
+        "phase": phase,
+        "flags": flags,
+        "seq": seq,
+        "sentence_id": sentence_id,
+        "sample_rate": sample_rate,
+        "payload": frame[FRAME_HEADER.size:],
+    }
+
+class AudioFramer:
+    """Wraps a story's audio payloads in versioned frames, numbering frames and sentences"""
+
+    def __init__(self, audio_format: AudioFormat):
+        self.format = audio_format
+        self.seq = 0
+        self.sentence_id = -1
+
+    def start_sentence(self) -> int:
+        self.sentence_id += 1
+        return self.sentence_id
+
+    def frame(self, payload: bytes, phase: Optional[str], flags: int = 0) -> bytes:
+        frame = pack_frame(
+            payload, self.format.codec, phase, flags, self.seq,
+            max(self.sentence_id, 0), self.format.sample_rate
+        )
+        self.seq += 1
+        return frame
+
+class FlowStalledError(Exception):
+    """The client stopped acknowledging audio while the server was waiting on it"""
+    pass
+
+class FlowController:
+    """Keeps synthesis at most max_ahead_ms ahead of what the client reports as played.
+
+    The server counts the milliseconds of audio it sent; the client sends
+    audio_ack messages with the milliseconds it has played. When the difference
+    exceeds the limit, wait_for_credit() blocks until an ack makes room, so no
+    more text is synthesized or buffered for a client that isn't listening.
+    A client that doesn't ack for stall_timeout seconds is treated as gone.
+    """
+
+    def __init__(self, max_ahead_ms: Optional[int] = None, stall_timeout: Optional[float] = None):
+        self.max_ahead_ms = max_ahead_ms or settings.AUDIO_FLOW_MAX_AHEAD_MS
+        self.stall_timeout = stall_timeout or settings.AUDIO_FLOW_STALL_TIMEOUT_SECONDS
+        self.sent_ms = 0.0
+        self.played_ms = 0.0
+        self.last_ack_seq: Optional[int] = None
+        self._last_progress = time.monotonic()
+        self._credit = asyncio.Event()
+
+    @property
+    def ahead_ms(self) -> float:
+        return self.sent_ms - self.played_ms
+
+    def on_sent(self, duration_ms: float) -> None:
+        self.sent_ms += duration_ms
+
+    def ack(self, played_ms: float, seq: Optional[int] = None) -> None:
+        if played_ms > self.played_ms:
+            self.played_ms = min(float(played_ms), self.sent_ms)
+        if seq is not None:
+            self.last_ack_seq = seq
+        self._last_progress = time.monotonic()
+        self._credit.set()
+
+    async def wait_for_credit(self) -> None:
+        if self.ahead_ms <= self.max_ahead_ms:
+            return
+        # The stall clock starts when we begin waiting, not at the last ack: time
+        # spent synthesizing shouldn't count against the client
+        self._last_progress = time.monotonic()
+        while self.ahead_ms > self.max_ahead_ms:
+            remaining = self.stall_timeout - (time.monotonic() - self._last_progress)
+            if remaining <= 0:
+                raise FlowStalledError(
+                    f"No audio acknowledgement for {self.stall_timeout:g}s "
+                    f"with {self.ahead_ms:.0f}ms unplayed"
+                )
+            self._credit.clear()
+            try:
+                await asyncio.wait_for(self._credit.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                continue
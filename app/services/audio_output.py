@@ -0,0 +1,235 @@
+import io
+import logging
+import struct
+import wave
+import numpy as np
+from dataclasses import dataclass
+from math import gcd
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rates clients may ask for; all of them are valid Opus rates
+SUPPORTED_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+SUPPORTED_CODECS = ("pcm16", "wav", "opus")
+
+@dataclass(frozen=True)
+class AudioFormat:
+    """What a client receives: codec, sample rate and (always mono) channel count"""
+    codec: str
+    sample_rate: int
+    channels: int = 1
+
+    def describe(self) -> dict:
+        """The audio_format message sent to the client before any audio"""
+        message = {
+            "type": "audio_format",
+            "codec": self.codec,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+        }
+        if self.codec == "opus":
+            message["framing"] = "u16be_length_prefixed"
+            message["frame_ms"] = settings.AUDIO_OPUS_FRAME_MS
+        return message
+
+def opus_available() -> bool:
+    try:
+        import opuslib  # noqa: F401
+        return True
+    except Exception:  # ImportError, or OSError when libopus itself is missing
+        return False
+
+def negotiate_audio_format(requested: Optional[dict] = None) -> AudioFormat:
+    """Pick the output format from what the client asked for, falling back to the server defaults"""
+    requested = requested or {}
+    codec = str(requested.get("codec", settings.AUDIO_OUTPUT_CODEC)).lower()
+    if codec not in SUPPORTED_CODECS:
+        logger.warning("Unsupported audio codec '%s' requested, using %s", codec, settings.AUDIO_OUTPUT_CODEC)
+        codec = settings.AUDIO_OUTPUT_CODEC
+    if codec == "opus" and not opus_available():
+        logger.warning("Opus requested but opuslib/libopus is not installed, sending pcm16")
+        codec = "pcm16"
+
+    sample_rate = requested.get("sample_rate", settings.AUDIO_OUTPUT_SAMPLE_RATE)
+    try:
+        sample_rate = int(sample_rate)
+    except (TypeError, ValueError):
+        sample_rate = settings.AUDIO_OUTPUT_SAMPLE_RATE
+    if sample_rate not in SUPPORTED_SAMPLE_RATES:
+        # Nearest supported rate rather than an error, clients usually just want "about this"
+        sample_rate = min(SUPPORTED_SAMPLE_RATES, key=lambda rate: abs(rate - sample_rate))
+    return AudioFormat(codec=codec, sample_rate=sample_rate)
+
+class StreamingResampler:
+    """Polyphase FIR resampler that keeps its filter state between chunks.
+
+    Resampling each chunk on its own treats the chunk edges as silence, which
+    clicks at every boundary; here the last input samples are carried over so
+    the output is the same as resampling the whole stream at once.
+    """
+
+    def __init__(self, source_rate: int, target_rate: int, half_taps_per_phase: int = 10):
+        divisor = gcd(source_rate, target_rate)
+        self.up = target_rate // divisor
+        self.down = source_rate // divisor
+        self.passthrough = self.up == self.down
+        if self.passthrough:
+            return
+
+        from scipy.signal import firwin
+
+        # Same anti-aliasing filter design as scipy.signal.resample_poly
+        max_rate = max(self.up, self.down)
+        num_taps = 2 * half_taps_per_phase * max_rate + 1
+        taps = firwin(num_taps, 1.0 / max_rate, window=("kaiser", 5.0)) * self.up
+        self.taps_per_phase = -(-num_taps // self.up)
+        taps = np.pad(taps, (0, self.taps_per_phase * self.up - num_taps))
+        # phases[p, j] = taps[p + j * up], the taps that touch input sample k - j for output phase p
+        self.phases = taps.reshape(self.taps_per_phase, self.up).T.astype(np.float32)
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        self._consumed = 0  # Input samples seen so far
+        self._next_output = 0  # Index of the next output sample
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Resample float32 samples, returning every output sample the input so far determines"""
+        if self.passthrough:
+            return samples
+        buffer = np.concatenate([self._history, samples.astype(np.float32, copy=False)])
+        base = self._consumed - self._history.size  # Stream index of buffer[0]
+        total = self._consumed + samples.size
+
+        end = -(-total * self.up // self.down)
+        outputs = np.arange(self._next_output, end, dtype=np.int64)
+        positions = outputs * self.down
+        newest = positions // self.up - base
+        index = newest[:, None] - np.arange(self.taps_per_phase)[None, :]
+        resampled = np.einsum("ij,ij->i", buffer[index], self.phases[positions % self.up])
+
+        if self._history.size:
+            self._history = buffer[-self._history.size:].copy()
+        self._consumed = total
+        self._next_output = end
+        return resampled
+
+class _PCM16Encoder:
+    def encode(self, pcm: np.ndarray) -> bytes:
+        return pcm.tobytes()
+
+    def flush(self) -> bytes:
+        return b""
+
+class _WavEncoder:
+    """Every message is a standalone WAV file, for clients that play each one with a media element"""
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+
+    def encode(self, pcm: np.ndarray) -> bytes:
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(pcm.tobytes())
+        return buffer.getvalue()
+
+    def flush(self) -> bytes:
+        return b""
+
+class _OpusEncoder:
+    """Opus packets, each prefixed with its length as a big-endian u16.
+
+    Opus only takes whole frames, so samples left over from one call wait for
+    the next; flush() pads the final partial frame with silence.
+    """
+
+    def __init__(self, sample_rate: int):
+        import opuslib
+
+        self.frame_samples = sample_rate * settings.AUDIO_OPUS_FRAME_MS // 1000
+        self.encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_AUDIO)
+        self.encoder.bitrate = settings.AUDIO_OPUS_BITRATE
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    def _encode_frames(self, pcm: np.ndarray) -> bytes:
+        packets = []
+        for start in range(0, pcm.size, self.frame_samples):
+            packet = self.encoder.encode(pcm[start:start + self.frame_samples].tobytes(), self.frame_samples)
+            packets.append(struct.pack("!H", len(packet)) + packet)
+        return b"".join(packets)
+
+    def encode(self, pcm: np.ndarray) -> bytes:
+        pcm = np.concatenate([self._pending, pcm])
+        whole = pcm.size - pcm.size % self.frame_samples
+        self._pending = pcm[whole:]
+        return self._encode_frames(pcm[:whole])
+
+    def flush(self) -> bytes:
+        if not self._pending.size:
+            return b""
+        pcm = np.pad(self._pending, (0, self.frame_samples - self._pending.size))
+        self._pending = np.zeros(0, dtype=np.int16)
+        return self._encode_frames(pcm)
+
+class AudioOutputStage:
+    """Sits between a TTSService and the client: resamples to the negotiated rate and encodes.
+
+    TTS services yield raw int16 mono PCM at their own `sample_rate`; one stage
+    lives for a whole story so resampler and encoder state carry across sentences.
+    """
+
+    def __init__(self, audio_format: AudioFormat):
+        self.format = audio_format
+        self._resampler: Optional[StreamingResampler] = None
+        self._source_rate: Optional[int] = None
+        self._leftover = b""  # Odd byte left by a chunk that split a sample
+        if audio_format.codec == "opus":
+            self.encoder = _OpusEncoder(audio_format.sample_rate)
+        elif audio_format.codec == "wav":
+            self.encoder = _WavEncoder(audio_format.sample_rate)
+        else:
+            self.encoder = _PCM16Encoder()
+        self.tee = None  # Called with every chunk of resampled PCM before it is encoded
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.samples_out = 0
+
+    def process(self, chunk: bytes, source_rate: int) -> bytes:
+        """Convert one chunk of raw PCM from a TTS service, returning what should be sent (maybe nothing)"""
+        if source_rate != self._source_rate:
+            self._resampler = StreamingResampler(source_rate, self.format.sample_rate)
+            self._source_rate = source_rate
+
+        self.bytes_in += len(chunk)
+        data = self._leftover + chunk
+        usable = len(data) - len(data) % 2
+        self._leftover = data[usable:]
+        pcm = np.frombuffer(data[:usable], dtype=np.int16)
+        if not pcm.size:
+            return b""
+
+        if not self._resampler.passthrough:
+            resampled = self._resampler.process(pcm.astype(np.float32))
+            pcm = np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+        if not pcm.size:
+            return b""
+        self.samples_out += pcm.size
+        if self.tee is not None:
+            self.tee(pcm)
+        encoded = self.encoder.encode(pcm)
+        self.bytes_out += len(encoded)
+        return encoded
+
+    @property
+    def duration_ms(self) -> float:
+        """Milliseconds of audio produced so far"""
+        return self.samples_out * 1000 / self.format.sample_rate
+
+    def flush(self) -> bytes:
+        """Encode whatever the codec is still holding, at the end of a story"""
+        encoded = self.encoder.flush()
+        self.bytes_out += len(encoded)
+        return encoded
@@ -1,34 +1,302 @@
+import logging
 import pyaudio
 import wave
 import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import numpy as np
 from typing import Optional, Dict, List
 from fastapi import HTTPException
 from app.core.config import settings
-import threading
+from app.services.voice_activity import EnergyVAD
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_ID = "default"
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+class AudioRingBuffer:
+    """Preallocated int16 ring buffer addressed by absolute sample index.
+
+    Once full, new samples overwrite the oldest ones, so a session's memory stays
+    fixed no matter how long it records.
+    """
+
+    def __init__(self, capacity: int):
+        self._buffer = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.total_written = 0
+
+    @property
+    def oldest(self) -> int:
+        """Absolute index of the oldest sample still held."""
+        return max(0, self.total_written - self.capacity)
+
+    @property
+    def nbytes(self) -> int:
+        return self._buffer.nbytes
+
+    def write(self, samples: np.ndarray) -> None:
+        n = samples.size
+        if n > self.capacity:
+            self.total_written += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+        
+        pos = self.total_written % self.capacity
+        first = min(n, self.capacity - pos)
+        self._buffer[pos:pos + first] = samples[:first]
+        if first < n:
+            self._buffer[:n - first] = samples[first:]
+        self.total_written += n
+
+    def read(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """Copy out samples in [start, end), clamped to what is still held."""
+        start = self.oldest if start is None else max(start, self.oldest)
+        end = self.total_written if end is None else min(end, self.total_written)
+        if end <= start:
+            return np.zeros(0, dtype=np.int16)
+        
+        pos = start % self.capacity
+        n = end - start
+        if pos + n <= self.capacity:
+            return self._buffer[pos:pos + n].copy()
+        return np.concatenate((self._buffer[pos:], self._buffer[:n - (self.capacity - pos)]))
+
+class SharedInputDevice:
+    """One input stream on the selected device, fanned out to every subscribed session.
+
+    The stream is opened when the first session subscribes and closed when the
+    last one leaves, so concurrent recordings never fight over the device.
+    """
+
+    def __init__(self, audio: pyaudio.PyAudio, device_index: int, sample_rate: int, frames_per_buffer: int):
+        self.audio = audio
+        self.device_index = device_index
+        self.sample_rate = sample_rate
+        self.frames_per_buffer = frames_per_buffer
+        self._subscribers: Dict[str, queue.Queue] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event: Optional[threading.Event] = None
+        self.dropped_blocks = 0
+
+    def subscribe(self, session_id: str, blocks: queue.Queue) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._open()
+            self._subscribers[session_id] = blocks
+
+    def unsubscribe(self, session_id: str) -> None:
+        thread = None
+        with self._lock:
+            self._subscribers.pop(session_id, None)
+            if not self._subscribers and self._thread is not None:
+                self._stop_event.set()
+                thread = self._thread
+                self._thread = None
+                self._stop_event = None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2)
+
+    def _open(self) -> None:
+        try:
+            stream = self.audio.open(
+                format=pyaudio.paInt16,
+                channels=1,
+                rate=self.sample_rate,
+                input=True,
+                input_device_index=self.device_index,
+                frames_per_buffer=self.frames_per_buffer
+            )
+        except IOError as e:
+            raise HTTPException(status_code=500, detail=f"Failed to start recording: {str(e)}")
+        
+        logger.info("Opened shared input stream on device %s", self.device_index)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._capture,
+            args=(stream, self._stop_event),
+            name="audio-capture",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _capture(self, stream, stop_event: threading.Event):
+        error_count = 0
+        max_errors = 5  # Maximum number of consecutive errors before stopping
+        
+        try:
+            while not stop_event.is_set():
+                try:
+                    data = stream.read(self.frames_per_buffer, exception_on_overflow=False)
+                    if data:
+                        error_count = 0  # Reset error count on successful read
+                        with self._lock:
+                            subscribers = list(self._subscribers.values())
+                        for blocks in subscribers:
+                            try:
+                                blocks.put_nowait(data)
+                            except queue.Full:
+                                self.dropped_blocks += 1
+                    else:
+                        error_count += 1
+                        logger.warning("Empty data received from microphone")
+                except IOError as e:
+                    logger.warning("Recording error occurred: %s", e)
+                    error_count += 1
+                
+                # Stop recording if we hit too many errors
+                if error_count >= max_errors:
+                    logger.error("Too many recording errors, stopping recording")
+                    with self._lock:
+                        subscribers = list(self._subscribers.values())
+                    for blocks in subscribers:
+                        try:
+                            blocks.put_nowait(None)  # Tell sessions the device failed
+                        except queue.Full:
+                            pass
+                    break
+        finally:
+            with self._lock:
+                # Let the next subscriber reopen the device if this thread gave up on its own
+                if self._stop_event is stop_event:
+                    self._thread = None
+                    self._stop_event = None
+            try:
+                stream.stop_stream()
+                stream.close()
+            except IOError:
+                pass  # Ignore errors during cleanup
+            logger.info("Closed shared input stream on device %s", self.device_index)
+
+class RecordingSession:
+    """A single recording with its own ring buffer, VAD and processing thread."""
+
+    def __init__(self, session_id: str, language: str, sample_rate: int, on_auto_stop=None):
+        self.session_id = session_id
+        self.language = language
+        self.sample_rate = sample_rate
+        self.buffer = AudioRingBuffer(sample_rate * settings.RECORDER_MAX_SECONDS)
+        self.blocks: queue.Queue = queue.Queue(maxsize=settings.RECORDER_QUEUE_BLOCKS)
+        self.vad = EnergyVAD(sample_rate) if settings.VAD_ENABLED else None
+        self.vad_stats: Optional[Dict] = None
+        self.is_recording = False
+        self.auto_stopped = False
+        self.device_failed = False
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self._on_auto_stop = on_auto_stop
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.is_recording = True
+        self._thread = threading.Thread(target=self._process, name=f"recorder-{self.session_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop processing once the already queued blocks are consumed."""
+        self.is_recording = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        if self.finished_at is None:
+            self.finished_at = time.monotonic()
+
+    def _process(self):
+        logger.info("Recording session %s started", self.session_id)
+        while True:
+            try:
+                data = self.blocks.get(timeout=0.1)
+            except queue.Empty:
+                if not self.is_recording:
+                    break
+                continue
+            
+            if data is None:
+                self.device_failed = True
+                self.is_recording = False
+                break
+            
+            self.buffer.write(np.frombuffer(data, dtype=np.int16))
+            
+            if self.vad and self.is_recording:
+                self.vad.process(data)
+                if self.vad.should_stop:
+                    logger.info("Silence detected after speech, stopping recording %s automatically", self.session_id)
+                    self.auto_stopped = True
+                    self.is_recording = False
+                    self.finished_at = time.monotonic()
+                    if self._on_auto_stop:
+                        self._on_auto_stop(self.session_id)
+                    break
+        
+        logger.info("Recording session %s stopped. Total samples: %d", self.session_id, self.buffer.total_written)
+
+    def get_audio(self) -> np.ndarray:
+        """Return the recorded utterance, trimmed to the detected speech when VAD is enabled."""
+        if self.buffer.total_written == 0:
+            raise HTTPException(status_code=400, detail="No audio data was recorded")
+        
+        start, end = None, None
+        # Trim leading and trailing silence so STT only sees the utterance
+        if self.vad:
+            self.vad_stats = self.vad.get_stats()
+            bounds = self.vad.speech_bounds()
+            if bounds is None:
+                raise HTTPException(status_code=400, detail="No speech detected in recording")
+            start, end = bounds
+            logger.debug("VAD trimmed recording: kept %s ms of %s ms", self.vad_stats["kept_ms"], self.vad_stats["total_ms"])
+        
+        if (start or 0) < self.buffer.oldest:
+            logger.warning("Recording %s exceeded %ss, keeping the latest audio only", self.session_id, settings.RECORDER_MAX_SECONDS)
+        
+        samples = self.buffer.read(start, end)
+        
+        # Check minimum recording length (at least 0.5 seconds)
+        if samples.size / self.sample_rate < 0.5:
+            raise HTTPException(status_code=400, detail="Recording too short (minimum 0.5 seconds)")
+        return samples
+
+    def get_status(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "is_recording": self.is_recording,
+            "auto_stopped": self.auto_stopped,
+            "device_failed": self.device_failed,
+            "language": self.language,
+            "recorded_ms": int(self.buffer.total_written * 1000 / self.sample_rate),
+            "buffer_bytes": self.buffer.nbytes,
+            "vad": self.vad.get_stats() if self.vad else None
+        }
 
 class AudioRecorder:
+    """Manages concurrent recording sessions, keyed by session id, on a shared input device."""
+    SAMPLE_RATE = 44100
+    FRAMES_PER_BUFFER = 1024
+
     def __init__(self):
-        self.is_recording = False
-        self.current_language = None
         # Redirect ALSA errors to /dev/null
         os.environ['ALSA_PYTHON_ERR_HANDLER_TYPE'] = 'null'
         self.audio = pyaudio.PyAudio()
-        self.frames = []
-        self.stream = None
-        self.recording_thread = None
+        self.sessions: Dict[str, RecordingSession] = {}
+        self._lock = threading.Lock()
         self._select_input_device()
+        self.device = SharedInputDevice(self.audio, self.device_index, self.SAMPLE_RATE, self.FRAMES_PER_BUFFER)
 
     def _select_input_device(self) -> None:
         """Find the first working input device."""
         self.device_index = None
         
-        print("\nAvailable audio devices:")
+        logger.info("Available audio devices:")
         for i in range(self.audio.get_device_count()):
             try:
                 info = self.audio.get_device_info_by_index(i)
-                print(f"Device {i}: {info['name']} (Inputs: {info['maxInputChannels']})")
+                logger.info("Device %d: %s (Inputs: %s)", i, info["name"], info["maxInputChannels"])
             except IOError:
-                print(f"Device {i}: <error reading device info>")
+                logger.info("Device %d: <error reading device info>", i)
         
         # First try the configured device if any
         if settings.AUDIO_DEVICE_INDEX is not None:
@@ -36,10 +304,10 @@ class AudioRecorder:
                 device_info = self.audio.get_device_info_by_index(settings.AUDIO_DEVICE_INDEX)
                 if device_info['maxInputChannels'] > 0:
                     self.device_index = settings.AUDIO_DEVICE_INDEX
-                    print(f"\nUsing configured audio device {self.device_index}: {device_info['name']}")
+                    logger.info("Using configured audio device %s: %s", self.device_index, device_info["name"])
                     return
             except IOError:
-                print(f"Warning: Configured device {settings.AUDIO_DEVICE_INDEX} is not available")
+                logger.warning("Configured device %s is not available", settings.AUDIO_DEVICE_INDEX)
 
         # Otherwise find the first working input device
         for i in range(self.audio.get_device_count()):
@@ -47,7 +315,7 @@ class AudioRecorder:
                 device_info = self.audio.get_device_info_by_index(i)
                 if device_info['maxInputChannels'] > 0:
                     self.device_index = i
-                    print(f"\nSelected default audio input device {i}: {device_info['name']}")
+                    logger.info("Selected default audio input device %d: %s", i, device_info["name"])
                     return
             except IOError:
                 continue
@@ -55,102 +323,88 @@ class AudioRecorder:
         if self.device_index is None:
             raise HTTPException(status_code=500, detail="No working input device found")
 
-    def start_recording(self, language: str) -> None:
-        if self.is_recording:
-            raise HTTPException(status_code=400, detail="Recording already in progress")
+    def _validate_session_id(self, session_id: str) -> None:
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise HTTPException(status_code=400, detail="Invalid session id")
+
+    def _reap_expired(self) -> None:
+        """Discard finished recordings nobody collected. Caller must hold the lock."""
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            if session.finished_at is not None and now - session.finished_at > settings.RECORDER_SESSION_TIMEOUT_SECONDS:
+                logger.info("Discarding uncollected recording %s", session_id)
+                self.sessions.pop(session_id)
+
+    def start_recording(self, language: str, session_id: str = DEFAULT_SESSION_ID) -> None:
+        self._validate_session_id(session_id)
         
-        self.frames = []
-        self.is_recording = True
-        self.current_language = language
+        with self._lock:
+            self._reap_expired()
+            existing = self.sessions.get(session_id)
+            if existing and existing.is_recording:
+                raise HTTPException(status_code=400, detail="Recording already in progress")
+            active = sum(1 for s in self.sessions.values() if s.is_recording)
+            if active >= settings.RECORDER_MAX_SESSIONS:
+                raise HTTPException(status_code=429, detail="Too many concurrent recordings")
+            
+            session = RecordingSession(session_id, language, self.SAMPLE_RATE, on_auto_stop=self.device.unsubscribe)
+            self.sessions[session_id] = session
         
+        session.start()
         try:
-            self.stream = self.audio.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=44100,
-                input=True,
-                input_device_index=self.device_index,
-                frames_per_buffer=1024
-            )
-        except IOError as e:
-            self.is_recording = False
-            raise HTTPException(status_code=500, detail=f"Failed to start recording: {str(e)}")
-        
-        self.recording_thread = threading.Thread(target=self._record)
-        self.recording_thread.start()
+            self.device.subscribe(session_id, session.blocks)
+        except HTTPException:
+            session.stop()
+            with self._lock:
+                self.sessions.pop(session_id, None)
+            raise
 
-    def stop_recording(self) -> tuple[str, str]:
-        if not self.is_recording:
-            raise HTTPException(status_code=400, detail="No recording in progress")
-        
-        self.is_recording = False
-        self.recording_thread.join()
+    def stop_recording(self, session_id: str = DEFAULT_SESSION_ID) -> tuple[str, str, Optional[Dict]]:
+        """Stop a session and write its audio to a temporary WAV file.
+
+        Returns the file path, the session language and the VAD stats of the utterance.
+        """
+        self._validate_session_id(session_id)
         
-        if self.stream:
-            try:
-                self.stream.stop_stream()
-                self.stream.close()
-            except IOError:
-                pass  # Ignore errors during cleanup
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        # A recording stopped by the VAD still holds its audio until it is collected here
+        if session is None:
+            raise HTTPException(status_code=400, detail="No recording in progress")
         
-        # Check if we actually recorded any audio
-        if not self.frames:
-            raise HTTPException(status_code=400, detail="No audio data was recorded")
-            
-        # Check minimum recording length (at least 0.5 seconds)
-        total_frames = sum(len(frame) for frame in self.frames)
-        recording_duration = (total_frames / 2) / 44100  # Convert frames to seconds
-        if recording_duration < 0.5:
-            raise HTTPException(status_code=400, detail="Recording too short (minimum 0.5 seconds)")
+        self.device.unsubscribe(session_id)
+        session.stop()
+        samples = session.get_audio()
         
-        audio_file = "temp_audio.wav"
-        with wave.open(audio_file, 'wb') as wf:
+        fd, audio_file = tempfile.mkstemp(prefix=f"recording_{session_id}_", suffix=".wav")
+        with os.fdopen(fd, 'wb') as f, wave.open(f, 'wb') as wf:
             wf.setnchannels(1)
             wf.setsampwidth(self.audio.get_sample_size(pyaudio.paInt16))
-            wf.setframerate(44100)
-            wf.writeframes(b''.join(self.frames))
+            wf.setframerate(self.SAMPLE_RATE)
+            wf.writeframes(samples.tobytes())
         
-        language = self.current_language
-        self.current_language = None  # Reset language
-        return audio_file, language
+        return audio_file, session.language, session.vad_stats
 
-    def _record(self):
-        error_count = 0
-        max_errors = 5  # Maximum number of consecutive errors before stopping
-        total_frames = 0
-        
-        print(f"Starting recording with device index: {self.device_index}")
-        print(f"Device info: {self.audio.get_device_info_by_index(self.device_index)}")
-        
-        while self.is_recording:
-            try:
-                data = self.stream.read(1024, exception_on_overflow=False)
-                if data:  # Only append if we got actual data
-                    self.frames.append(data)
-                    total_frames += len(data)
-                    if total_frames % (44100 * 2) == 0:  # Log every second
-                        print(f"Recording in progress... Total data: {total_frames} bytes")
-                    error_count = 0  # Reset error count on successful read
-                else:
-                    error_count += 1
-                    print(f"Warning: Empty data received from microphone")
-            except IOError as e:
-                print(f"Warning: Recording error occurred: {str(e)}")
-                error_count += 1
-            
-            # Stop recording if we hit too many errors
-            if error_count >= max_errors:
-                print("Too many recording errors, stopping recording")
-                self.is_recording = False
-                break
-        
-        print(f"Recording stopped. Total frames: {len(self.frames)}, Total bytes: {sum(len(frame) for frame in self.frames)}")
+    def get_status(self, session_id: Optional[str] = None) -> Dict:
+        """Status of one session, or of every session when no id is given."""
+        with self._lock:
+            if session_id is None:
+                sessions = [s.get_status() for s in self.sessions.values()]
+                return {
+                    "sessions": sessions,
+                    "buffer_bytes": sum(s["buffer_bytes"] for s in sessions),
+                    "dropped_blocks": self.device.dropped_blocks
+                }
+            session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail=f"Unknown recording session: {session_id}")
+        return session.get_status()
 
     def __del__(self):
-        if self.stream:
+        for session_id in list(self.sessions):
             try:
-                self.stream.close()
-            except:
+                self.device.unsubscribe(session_id)
+            except Exception:
                 pass
         try:
             self.audio.terminate()
@@ -179,4 +433,4 @@ audio_recorder = AudioRecorder()
 async def cleanup_audio_file(file_path: str):
     if os.path.exists(file_path):
         os.remove(file_path)
-        print(f"Temporary audio file {file_path} removed.")
+        logger.debug("Temporary audio file %s removed", file_path)
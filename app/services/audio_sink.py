@@ -0,0 +1,66 @@
+import logging
+import queue
+import threading
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class AudioSink(ABC):
+    """Destination for synthesized 16-bit mono PCM besides the network stream"""
+
+    @abstractmethod
+    def write(self, pcm: np.ndarray) -> None:
+        """Hand over a block of int16 samples. Must not block on playback."""
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release the underlying device"""
+        pass
+
+class LocalPlaybackSink(AudioSink):
+    """Plays audio on the server's output device from a background thread.
+
+    Synthesis only enqueues samples, so it keeps running faster than real time
+    while playback drains the queue at the device's pace.
+    """
+
+    def __init__(self, sample_rate: int, blocksize: int = 1024):
+        # Imported here so headless servers without PortAudio never load it
+        import sounddevice as sd
+
+        self.stream = sd.OutputStream(
+            samplerate=sample_rate,
+            channels=1,
+            dtype=np.int16,
+            blocksize=blocksize,
+            latency="low",
+        )
+        self.stream.start()
+        self._queue: "queue.Queue[Optional[np.ndarray]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._play, name="local-playback", daemon=True)
+        self._thread.start()
+
+    def write(self, pcm: np.ndarray) -> None:
+        self._queue.put(pcm)
+
+    def _play(self):
+        while True:
+            pcm = self._queue.get()
+            if pcm is None:
+                break
+            try:
+                self.stream.write(pcm)
+            except Exception as e:
+                logger.error("Error during local playback: %s", e)
+        try:
+            self.stream.stop()
+            self.stream.close()
+        except Exception as e:
+            logger.error("Error closing audio stream: %s", e)
+
+    def close(self) -> None:
+        # Queued audio still plays out before the stream is closed
+        self._queue.put(None)
@@ -0,0 +1,203 @@
+"""Record and replay provider responses ("cassettes").
+
+With CASSETTE_MODE=record, every Gemini/OpenRouter streaming response and
+Google TTS synthesis is saved, with the time each piece arrived, to a
+gzipped JSONL file under CASSETTE_DIR/<provider>/. With CASSETTE_MODE=replay
+the services get those responses back instead of calling the APIs, paced
+like the original (CASSETTE_SPEED=2 plays twice as fast, 0 without delays).
+
+A request replays the cassette recorded for the identical request (same
+provider and payload; URLs and headers, which hold API keys, are never
+stored). Requests that weren't recorded, e.g. because the prompt includes a
+different story history, get the provider's cassettes in recording order.
+"""
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import aiohttp
+
+from app.core.config import settings
+
+class CassetteMissingError(Exception):
+    pass
+
+def request_key(provider: str, request: Any) -> str:
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(f"{provider}\n{canonical}".encode("utf-8")).hexdigest()[:20]
+
+class Cassette:
+    """One recorded response: its status and the chunks of its body with arrival times (seconds after the request)"""
+
+    def __init__(self, provider: str, key: str, status: int = 200):
+        self.provider = provider
+        self.key = key
+        self.status = status
+        self.events: List[Dict] = []
+
+    def add(self, elapsed: float, data: bytes, binary: bool = False) -> None:
+        if binary:
+            self.events.append({"t": round(elapsed, 4), "b64": base64.b64encode(data).decode("ascii")})
+        else:
+            self.events.append({"t": round(elapsed, 4), "s": data.decode("utf-8", "surrogateescape")})
+
+    @staticmethod
+    def chunk(event: Dict) -> bytes:
+        if "b64" in event:
+            return base64.b64decode(event["b64"])
+        return event["s"].encode("utf-8", "surrogateescape")
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = {"provider": self.provider, "key": self.key, "status": self.status, "recorded": datetime.now().isoformat()}
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            for event in self.events:
+                f.write(json.dumps(event) + "\n")
+
+    @classmethod
+    def load(cls, path: Path) -> "Cassette":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            cassette = cls(header["provider"], header["key"], header["status"])
+            cassette.events = [json.loads(line) for line in f if line.strip()]
+        return cassette
+
+    async def play(self) -> AsyncIterator[bytes]:
+        """The recorded chunks, each released at its original time divided by CASSETTE_SPEED"""
+        start = time.perf_counter()
+        for event in self.events:
+            if settings.CASSETTE_SPEED > 0:
+                delay = event["t"] / settings.CASSETTE_SPEED - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield self.chunk(event)
+
+class CassetteLibrary:
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = Path(directory or settings.CASSETTE_DIR)
+        self._order: Dict[str, List[Path]] = {}
+        self._next: Dict[str, int] = {}
+
+    def path(self, provider: str, key: str) -> Path:
+        return self.directory / provider / f"{key}.jsonl.gz"
+
+    def find(self, provider: str, key: str) -> Cassette:
+        path = self.path(provider, key)
+        if not path.exists():
+            # Not recorded as such: hand out the provider's cassettes in recording order
+            if provider not in self._order:
+                self._order[provider] = sorted((self.directory / provider).glob("*.jsonl.gz"), key=lambda p: p.stat().st_mtime)
+            recorded = self._order[provider]
+            if not recorded:
+                raise CassetteMissingError(f"No {provider} cassettes in {self.directory / provider}")
+            index = self._next.get(provider, 0)
+            self._next[provider] = index + 1
+            path = recorded[index % len(recorded)]
+        return Cassette.load(path)
+
+    async def save(self, cassette: Cassette) -> None:
+        await asyncio.to_thread(cassette.save, self.path(cassette.provider, cassette.key))
+
+cassette_library = CassetteLibrary()
+
+class _ReplayContent:
+    def __init__(self, cassette: Cassette):
+        self._cassette = cassette
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self._cassette.play().__aiter__()
+
+class _ReplayResponse:
+    """Stands in for an aiohttp response: status, text(), json() and line iteration over content"""
+
+    def __init__(self, cassette: Cassette):
+        self.status = cassette.status
+        self.content = _ReplayContent(cassette)
+        self._cassette = cassette
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self._cassette.play()])
+
+    async def text(self) -> str:
+        return (await self.read()).decode("utf-8")
+
+    async def json(self) -> Any:
+        return json.loads(await self.read())
+
+class _RecordingContent:
+    def __init__(self, response: aiohttp.ClientResponse, cassette: Cassette, start: float):
+        self._response = response
+        self._cassette = cassette
+        self._start = start
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for line in self._response.content:
+            self._cassette.add(time.perf_counter() - self._start, line)
+            yield line
+
+class _RecordingResponse:
+    """Passes a live aiohttp response through, keeping a copy of everything read from it"""
+
+    def __init__(self, response: aiohttp.ClientResponse, cassette: Cassette, start: float):
+        self.status = response.status
+        self.content = _RecordingContent(response, cassette, start)
+        self._response = response
+        self._cassette = cassette
+        self._start = start
+
+    async def read(self) -> bytes:
+        body = await self._response.read()
+        self._cassette.add(time.perf_counter() - self._start, body)
+        return body
+
+    async def text(self) -> str:
+        return (await self.read()).decode("utf-8")
+
+    async def json(self) -> Any:
+        return json.loads(await self.read())
+
+@asynccontextmanager
+async def cassette_post(provider: str, url: str, json: Dict, headers: Optional[Dict] = None):
+    """POST json to url, or replay/record the response depending on CASSETTE_MODE.
+
+    Yields an object with the parts of aiohttp's response the LLM services use:
+    status, content (async iteration over lines), text() and json().
+    """
+    payload = json
+    if settings.CASSETTE_MODE == "replay":
+        yield _ReplayResponse(cassette_library.find(provider, request_key(provider, payload)))
+        return
+
+    async with aiohttp.ClientSession() as session:
+        start = time.perf_counter()
+        async with session.post(url, json=payload, headers=headers) as response:
+            if settings.CASSETTE_MODE != "record":
+                yield response
+                return
+            cassette = Cassette(provider, request_key(provider, payload), response.status)
+            try:
+                yield _RecordingResponse(response, cassette, start)
+            finally:
+                await cassette_library.save(cassette)
+
+async def cassette_call(provider: str, request: Dict, call: Callable[[], bytes]) -> bytes:
+    """Run a blocking provider call that returns bytes, or replay/record it depending on CASSETTE_MODE"""
+    if settings.CASSETTE_MODE == "replay":
+        cassette = cassette_library.find(provider, request_key(provider, request))
+        return b"".join([chunk async for chunk in cassette.play()])
+    if settings.CASSETTE_MODE != "record":
+        return call()
+    start = time.perf_counter()
+    data = call()
+    cassette = Cassette(provider, request_key(provider, request))
+    cassette.add(time.perf_counter() - start, data, binary=True)
+    await cassette_library.save(cassette)
+    return data
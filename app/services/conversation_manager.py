@@ -1,6 +1,9 @@
-from typing import List
+import uuid
+from typing import Callable, List, Optional
 from dataclasses import dataclass
 from datetime import datetime
+from app.services.state_backend import StateBackend, state_backend
+from app.services.story_archive import StoryArchive, get_story_archive
 
 @dataclass
 class StoryTurn:
@@ -8,27 +11,74 @@ class StoryTurn:
     story: str
     language: str
     timestamp: datetime
+    client_id: Optional[str] = None
+    id: Optional[int] = None
+    story_id: Optional[str] = None
 
 class ConversationManager:
-    def __init__(self):
-        self.history: List[StoryTurn] = []
+    """Story history, kept in the state backend so every worker sees the same stories.
+
+    Finished stories also go to the persistent archive when it is enabled; the
+    archive writes them in the background, and a blocking backend's write runs
+    in a worker thread, so add_story doesn't wait on disk on the event loop.
+    Reads (the previous story for the prompt, the /stories pages) still query
+    the backend inline; they are indexed lookups of a few rows.
+    """
+    
+    def __init__(
+        self,
+        backend: StateBackend = state_backend,
+        get_archive: Callable[[], Optional[StoryArchive]] = get_story_archive
+    ):
+        self.backend = backend
+        self.get_archive = get_archive
         
-    def add_story(self, transcription: str, story: str, language: str) -> None:
-        """Add a new story to the history"""
-        turn = StoryTurn(
-            transcription=transcription,
-            story=story,
-            language=language,
-            timestamp=datetime.now()
-        )
-        self.history.append(turn)
+    async def add_story(
+        self,
+        transcription: str,
+        story: str,
+        language: str,
+        client_id: Optional[str] = None,
+        story_id: Optional[str] = None
+    ) -> None:
+        """Add a new story to the history and queue it for the archive"""
+        record = {
+            "story_id": story_id or uuid.uuid4().hex,
+            "transcription": transcription,
+            "story": story,
+            "language": language,
+            "timestamp": datetime.now().isoformat(),
+            "client_id": client_id
+        }
+        await self.backend.run(self.backend.add_story, record)
+        archive = self.get_archive()
+        if archive is not None:
+            archive.add(record)
         
-    def get_recent_stories(self, limit: int = 5) -> List[StoryTurn]:
-        """Get the most recent stories"""
-        return sorted(self.history, key=lambda x: x.timestamp, reverse=True)[:limit]
+    def get_recent_stories(
+        self,
+        limit: int = 5,
+        client_id: Optional[str] = None,
+        language: Optional[str] = None,
+        before_id: Optional[int] = None
+    ) -> List[StoryTurn]:
+        """Get the most recent stories, optionally for one client or language; pass the last
+        story's id as before_id to get the next page"""
+        return [
+            StoryTurn(
+                transcription=record["transcription"],
+                story=record["story"],
+                language=record["language"],
+                timestamp=datetime.fromisoformat(record["timestamp"]),
+                client_id=record.get("client_id"),
+                id=record.get("id"),
+                story_id=record.get("story_id")
+            )
+            for record in self.backend.get_recent_stories(limit, client_id, language, before_id)
+        ]
         
     def clear_history(self) -> None:
-        """Clear the story history"""
-        self.history = []
+        """Clear the story history; the archive keeps its stories"""
+        self.backend.clear_history()
 
-conversation_manager = ConversationManager()
\ No newline at end of file
+conversation_manager = ConversationManager()
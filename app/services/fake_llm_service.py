@@ -0,0 +1,55 @@
+import asyncio
+import random
+from typing import AsyncGenerator, Optional
+from app.core.config import settings
+from app.services.llm_service import BaseLLMService
+
+_CHARACTERS = ["a little mouse", "a brave rabbit", "a sleepy owl", "a curious fox", "a tiny dragon", "a kind giant"]
+_PLACES = ["the old lighthouse", "the whispering forest", "a quiet village", "the golden dunes", "a hidden garden"]
+_ACTIONS = [
+    "found a silver feather", "followed a trail of footprints", "heard a soft song",
+    "met a friendly crab", "climbed a tall tree", "opened a tiny door"
+]
+_ENDINGS = ["with a big smile", "just before sunset", "without making a sound", "and felt very proud", "as the wind grew warm"]
+
+class FakeLLMService(BaseLLMService):
+    """Streams made-up story text with configurable latency, for benchmarks without an LLM provider.
+
+    The text, the delays and injected failures all come from a random generator
+    seeded with FAKE_SEED and the request, so the same request always produces
+    the same stream. Each token is one word.
+    """
+
+    def _length(self, phase: Optional[str]) -> int:
+        """Words to generate: the low end of the phase's target, or FAKE_LLM_STORY_WORDS"""
+        if phase and settings.ENABLE_PHASED_GENERATION:
+            return int(settings.STORY_PHASES[phase]["target_words"].split("-")[0])
+        return settings.FAKE_LLM_STORY_WORDS
+
+    def _sentence(self, rng: random.Random, user_input: str) -> str:
+        sentence = f"{rng.choice(_CHARACTERS).capitalize()} {rng.choice(_ACTIONS)} near {rng.choice(_PLACES)} {rng.choice(_ENDINGS)}."
+        if rng.random() < 0.2:
+            sentence = f"It was a story about {user_input.strip().rstrip('.!?').lower()}. {sentence}"
+        return sentence
+
+    def _delay(self, rng: random.Random, seconds: float) -> float:
+        jitter = settings.FAKE_LLM_JITTER
+        return max(0.0, seconds * (1 + rng.uniform(-jitter, jitter)))
+
+    async def generate_story(self, user_input: str, language: str = "french", phase: Optional[str] = None, previous_content: Optional[str] = None) -> AsyncGenerator[str, None]:
+        # Built like a real request so prompt assembly is part of what gets measured
+        self._get_story_prompt(user_input, language, phase, previous_content)
+        rng = random.Random(f"{settings.FAKE_SEED}:{language}:{phase}:{user_input}")
+        words = self._length(phase)
+        fail_at = rng.randrange(words) if rng.random() < settings.FAKE_LLM_ERROR_RATE else None
+
+        await asyncio.sleep(self._delay(rng, settings.FAKE_LLM_TTFT_MS / 1000))
+        token_seconds = 1 / settings.FAKE_LLM_TOKENS_PER_SECOND
+        sent = 0
+        while sent < words:
+            for word in self._sentence(rng, user_input).split():
+                if sent == fail_at:
+                    raise Exception("API Error: injected fake LLM failure")
+                yield word + " "
+                sent += 1
+                await asyncio.sleep(self._delay(rng, token_seconds))
@@ -0,0 +1,59 @@
+import asyncio
+import random
+from typing import AsyncGenerator, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.tts_service import TTSService
+
+# Roughly how fast a storyteller reads, used to size the synthetic audio
+_CHARS_PER_SECOND = 15
+_CHUNK_SECONDS = 0.2
+
+class FakeTTSService(TTSService):
+    """Returns a synthetic tone as long as the text would take to read, at a configurable speed.
+
+    Audio is produced at FAKE_TTS_REAL_TIME_FACTOR seconds of waiting per
+    second of audio, in 200 ms chunks, after FAKE_TTS_FIRST_CHUNK_MS. Like
+    FakeLLMService, the output, delays and injected failures are seeded from
+    FAKE_SEED and the text.
+    """
+
+    def __init__(self):
+        self.sample_rate = settings.FAKE_TTS_SAMPLE_RATE
+
+    def _chunk_text(self, text: str, max_chars: Optional[int] = None) -> list[str]:
+        max_chars = max_chars or settings.TTS_CHUNK_SIZE
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+    def _delay(self, rng: random.Random, seconds: float) -> float:
+        jitter = settings.FAKE_TTS_JITTER
+        return max(0.0, seconds * (1 + rng.uniform(-jitter, jitter)))
+
+    def _tone(self, rng: random.Random, samples: int) -> np.ndarray:
+        """A quiet tone with a fade in and out, so the audio is audible but unobtrusive"""
+        t = np.arange(samples) / self.sample_rate
+        frequency = rng.uniform(180, 320)
+        envelope = np.minimum(1.0, np.minimum(t, t[::-1]) / 0.02)
+        return (np.sin(2 * np.pi * frequency * t) * envelope * 3000).astype(np.int16)
+
+    async def convert_text_to_speech(
+        self,
+        text: str,
+        story_id: str,
+        language: str,
+    ) -> AsyncGenerator[bytes, None]:
+        rng = random.Random(f"{settings.FAKE_SEED}:{language}:{text}")
+        if rng.random() < settings.FAKE_TTS_ERROR_RATE:
+            await asyncio.sleep(self._delay(rng, settings.FAKE_TTS_FIRST_CHUNK_MS / 1000))
+            raise RuntimeError("Injected fake TTS failure")
+
+        duration = max(_CHUNK_SECONDS, len(text.strip()) / _CHARS_PER_SECOND)
+        audio = self._tone(rng, int(duration * self.sample_rate)).tobytes()
+        chunk_bytes = int(_CHUNK_SECONDS * self.sample_rate) * 2
+        await asyncio.sleep(self._delay(rng, settings.FAKE_TTS_FIRST_CHUNK_MS / 1000))
+        for start in range(0, len(audio), chunk_bytes):
+            if start:
+                await asyncio.sleep(self._delay(rng, _CHUNK_SECONDS * settings.FAKE_TTS_REAL_TIME_FACTOR))
+            yield audio[start:start + chunk_bytes]
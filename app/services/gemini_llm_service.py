@@ -1,8 +1,11 @@
-import aiohttp
 import json
+import logging
 from typing import AsyncGenerator, Optional
 from app.core.config import settings
 from app.services.llm_service import BaseLLMService
+from app.services.cassettes import cassette_post
+
+logger = logging.getLogger(__name__)
 
 class GeminiLLMService(BaseLLMService):
     async def generate_story(self, user_input: str, language: str = "french", phase: Optional[str] = None, previous_content: Optional[str] = None) -> AsyncGenerator[str, None]:
@@ -14,38 +17,38 @@ class GeminiLLMService(BaseLLMService):
             
             url = f"https://generativelanguage.googleapis.com/v1beta/models/{settings.GEMINI_MODEL}:streamGenerateContent?alt=sse&key={settings.GEMINI_API_KEY}"
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url,
-                    json={
-                        "contents": [{"parts": [{"text": prompt}]}],
-                        "generationConfig": {
-                            "maxOutputTokens": max_tokens,
-                            "temperature": settings.GEMINI_TEMPERATURE,
-                            "topP": settings.GEMINI_TOP_P,
-                            "topK": settings.GEMINI_TOP_K
-                        }
-                    },
-                    headers={"Content-Type": "application/json"}
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"API Error: {error_text}")
+            async with cassette_post(
+                "gemini",
+                url,
+                json={
+                    "contents": [{"parts": [{"text": prompt}]}],
+                    "generationConfig": {
+                        "maxOutputTokens": max_tokens,
+                        "temperature": settings.GEMINI_TEMPERATURE,
+                        "topP": settings.GEMINI_TOP_P,
+                        "topK": settings.GEMINI_TOP_K
+                    }
+                },
+                headers={"Content-Type": "application/json"}
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise Exception(f"API Error: {error_text}")
                     
-                    async for line in response.content:
-                        if line:
-                            chunk = line.decode('utf-8').strip()
-                            if chunk.startswith('data: '):
-                                try:
-                                    data = json.loads(chunk[6:])  # Remove 'data: ' prefix
-                                    if 'candidates' in data and data['candidates']:
-                                        text = data['candidates'][0]['content']['parts'][0]['text']
-                                        yield text
-                                except json.JSONDecodeError:
-                                    if chunk != 'data: [DONE]':  # Ignore end marker
-                                        print(f"Failed to parse chunk: {chunk}")
-                                    continue
+                async for line in response.content:
+                    if line:
+                        chunk = line.decode('utf-8').strip()
+                        if chunk.startswith('data: '):
+                            try:
+                                data = json.loads(chunk[6:])  # Remove 'data: ' prefix
+                                if 'candidates' in data and data['candidates']:
+                                    text = data['candidates'][0]['content']['parts'][0]['text']
+                                    yield text
+                            except json.JSONDecodeError:
+                                if chunk != 'data: [DONE]':  # Ignore end marker
+                                    logger.warning("Failed to parse chunk: %s", chunk)
+                                continue
                     
         except Exception as e:
-            print(f"Error generating story: {str(e)}")
+            logger.error("Error generating story: %s", e)
             raise 
\ No newline at end of file
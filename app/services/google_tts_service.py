@@ -1,16 +1,28 @@
 from google.cloud import texttospeech
 import io
+import wave
 from typing import AsyncGenerator, Optional
 from app.core.languages import LANGUAGE_TO_BCP47, TTS_VOICES, DEFAULT_BCP47
 from app.utils.text_cleanup import clean_text_for_tts
 from app.services.tts_service import TTSService
+from app.services.cassettes import cassette_call
+from app.core.config import settings
 
 class GoogleTextToSpeechService(TTSService):
     DEFAULT_LANGUAGE = DEFAULT_BCP47
     
     def __init__(self):
-        self.client = texttospeech.TextToSpeechClient()
+        # Replayed sessions never call the API, so they need no credentials
+        self.client = texttospeech.TextToSpeechClient() if settings.CASSETTE_MODE != "replay" else None
         self.voices = TTS_VOICES
+        self.sample_rate = 16000
+
+    def _strip_wav_header(self, audio_content: bytes) -> bytes:
+        """LINEAR16 responses come as a WAV file; keep just the PCM frames"""
+        if not audio_content.startswith(b"RIFF"):
+            return audio_content
+        with wave.open(io.BytesIO(audio_content), "rb") as wav_file:
+            return wav_file.readframes(wav_file.getnframes())
 
     def _get_language_code(self, language: str) -> str:
         """Convert simple language name to BCP-47 code."""
@@ -58,16 +70,20 @@ class GoogleTextToSpeechService(TTSService):
 
                 audio_config = texttospeech.AudioConfig(
                     audio_encoding=texttospeech.AudioEncoding.LINEAR16,
-                    sample_rate_hertz=16000
+                    sample_rate_hertz=self.sample_rate
                 )
 
-                response = self.client.synthesize_speech(
-                    input=input_text,
-                    voice=voice_params,
-                    audio_config=audio_config
+                audio_content = await cassette_call(
+                    "google_tts",
+                    {"text": chunk, "voice": voice_params.name, "language_code": language_code, "sample_rate": self.sample_rate},
+                    lambda: self.client.synthesize_speech(
+                        input=input_text,
+                        voice=voice_params,
+                        audio_config=audio_config
+                    ).audio_content
                 )
                 
-                yield response.audio_content
+                yield self._strip_wav_header(audio_content)
             
         except Exception as e:
             raise ValueError(f"Error generating speech for language {language}: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,126 @@
+import itertools
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+class _IdIndex:
+    """Ascending story ids for one partition, trimmed from the front as old stories are dropped.
+
+    Dropped ids are skipped with a start offset and compacted away once they
+    make up half the list, so dropping the oldest id is amortized O(1) and the
+    list stays searchable with bisect.
+    """
+
+    __slots__ = ("ids", "start")
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.start = 0
+
+    def __len__(self) -> int:
+        return len(self.ids) - self.start
+
+    def append(self, story_id: int) -> None:
+        self.ids.append(story_id)
+
+    def drop_oldest(self) -> None:
+        self.start += 1
+        if self.start > 1024 and self.start * 2 > len(self.ids):
+            del self.ids[:self.start]
+            self.start = 0
+
+    def oldest(self) -> Optional[int]:
+        return self.ids[self.start] if len(self) else None
+
+    def newest_before(self, before_id: Optional[int], limit: int) -> List[int]:
+        """Up to limit ids lower than before_id (or the newest ones), newest first"""
+        end = len(self.ids) if before_id is None else bisect_left(self.ids, before_id, lo=self.start)
+        begin = max(self.start, end - limit)
+        if end <= begin:
+            return []
+        return self.ids[end - 1:begin - 1 if begin > 0 else None:-1]
+
+class HistoryStore:
+    """Finished stories in insertion order, with per-client and per-language partitions.
+
+    Looking up the k most recent stories, overall or within a partition, is
+    O(k) (plus O(log n) when paging with before_id). At most max_stories
+    are kept; the oldest are dropped first.
+    """
+
+    def __init__(self, max_stories: Optional[int] = None):
+        self.max_stories = max_stories or settings.HISTORY_MAX_STORIES
+        self._records: Dict[int, Dict] = {}
+        self._all = _IdIndex()
+        self._by_client: Dict[str, _IdIndex] = {}
+        self._by_language: Dict[str, _IdIndex] = {}
+        self._ids = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, record: Dict) -> int:
+        story_id = next(self._ids)
+        record = {**record, "id": story_id}
+        self._records[story_id] = record
+        self._all.append(story_id)
+        if record.get("client_id"):
+            self._by_client.setdefault(record["client_id"], _IdIndex()).append(story_id)
+        self._by_language.setdefault(record["language"], _IdIndex()).append(story_id)
+
+        while len(self._records) > self.max_stories:
+            self._drop_oldest()
+        return story_id
+
+    def _drop_oldest(self) -> None:
+        story_id = self._all.oldest()
+        self._all.drop_oldest()
+        record = self._records.pop(story_id)
+        # Partitions are in insertion order too, so this story is the oldest in each of its partitions
+        for partitions, key in ((self._by_client, record.get("client_id")), (self._by_language, record["language"])):
+            index = partitions.get(key)
+            if index is None:
+                continue
+            index.drop_oldest()
+            if not len(index):
+                del partitions[key]
+
+    def recent(
+        self,
+        limit: int = 5,
+        client_id: Optional[str] = None,
+        language: Optional[str] = None,
+        before_id: Optional[int] = None
+    ) -> List[Dict]:
+        """Most recent stories first, optionally within a client and/or language, older than before_id"""
+        if client_id is not None and language is not None:
+            # Walk the client's stories and filter by language; a client's history is short
+            index = self._by_client.get(client_id)
+            if index is None:
+                return []
+            matches = []
+            cursor = before_id
+            while len(matches) < limit:
+                ids = index.newest_before(cursor, limit)
+                if not ids:
+                    break
+                matches.extend(i for i in ids if self._records[i]["language"] == language)
+                cursor = ids[-1]
+            return [self._records[i] for i in matches[:limit]]
+
+        if client_id is not None:
+            index = self._by_client.get(client_id)
+        elif language is not None:
+            index = self._by_language.get(language)
+        else:
+            index = self._all
+        if index is None:
+            return []
+        return [self._records[i] for i in index.newest_before(before_id, limit)]
+
+    def clear(self) -> None:
+        self._records.clear()
+        self._all = _IdIndex()
+        self._by_client.clear()
+        self._by_language.clear()
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import weakref
+import numpy as np
+import torch
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.core import metrics
+from app.core.profiling import torch_capture
+from app.models.kokoro.kokoro import tokenize
+from app.services.phoneme_cache import phoneme_cache
+
+logger = logging.getLogger(__name__)
+
+MAX_TOKENS = 510  # Kokoro's context limit, same truncation as kokoro.generate
+
+@dataclass
+class SynthesisRequest:
+    text: str
+    voicepack: torch.Tensor
+    lang: str  # 'a' for American, 'b' for British
+    speed: float = 1.0
+
+def _prepare(request: SynthesisRequest) -> Optional[Tuple[List[int], torch.Tensor]]:
+    """Phonemize and tokenize a sentence, returning its tokens and style vector"""
+    tokens = tokenize(phoneme_cache.phonemize(request.text, request.lang))
+    if not tokens:
+        return None
+    if len(tokens) > MAX_TOKENS:
+        tokens = tokens[:MAX_TOKENS]
+        logger.warning("Truncated to %d tokens", MAX_TOKENS)
+    return tokens, request.voicepack[len(tokens)]
+
+@torch.no_grad()
+def synthesize_batch(model, requests: List[SynthesisRequest]) -> List[Optional[np.ndarray]]:
+    """Synthesize several sentences, sharing the text and duration stages in one padded pass.
+
+    The BERT, text encoders and duration predictor are masked/packed so padding
+    does not change their output. Prosody prediction and the decoder rely on
+    instance normalization over time, which padding would skew, so they run per
+    sentence on the aligned features.
+    """
+    prepared = [_prepare(request) for request in requests]
+    indices = [i for i, item in enumerate(prepared) if item is not None]
+    outputs: List[Optional[np.ndarray]] = [None] * len(requests)
+    if not indices:
+        return outputs
+
+    items = [prepared[i] for i in indices]
+    device = items[0][1].device
+    lengths = [len(tokens) + 2 for tokens, _ in items]  # Boundary token on each side
+    max_len = max(lengths)
+
+    tokens = torch.zeros((len(items), max_len), dtype=torch.long, device=device)
+    for row, (item_tokens, _) in enumerate(items):
+        tokens[row, 1:lengths[row] - 1] = torch.tensor(item_tokens, dtype=torch.long, device=device)
+    input_lengths = torch.tensor(lengths, dtype=torch.long, device=device)
+    text_mask = torch.arange(max_len, device=device).unsqueeze(0) >= input_lengths.unsqueeze(1)  # True on padding
+    ref_s = torch.cat([ref for _, ref in items])
+    speed = torch.tensor([requests[i].speed for i in indices], device=device).unsqueeze(1)
+
+    # Attention mask passed positionally so the module can also be traced (see kokoro_engine)
+    bert_dur = model.bert(tokens, (~text_mask).int())
+    d_en = model.bert_encoder(bert_dur).transpose(-1, -2)
+    s = ref_s[:, 128:]
+    d = model.predictor.text_encoder(d_en, s, input_lengths, text_mask)
+
+    # The duration LSTM is bidirectional, so pack it to keep padding out of the backward pass
+    packed = torch.nn.utils.rnn.pack_padded_sequence(d, input_lengths.cpu(), batch_first=True, enforce_sorted=False)
+    x, _ = model.predictor.lstm(packed)
+    x, _ = torch.nn.utils.rnn.pad_packed_sequence(x, batch_first=True, total_length=max_len)
+    duration = model.predictor.duration_proj(x)
+    duration = torch.sigmoid(duration).sum(axis=-1) / speed
+    pred_dur = torch.round(duration).clamp(min=1).long()
+
+    t_en = model.text_encoder(tokens, input_lengths, text_mask)
+
+    for row, (i, length) in enumerate(zip(indices, lengths)):
+        item_dur = pred_dur[row, :length]
+        frames = int(item_dur.sum().item())
+        # One-hot alignment from token positions to output frames
+        pred_aln_trg = torch.zeros(length, frames, device=device)
+        token_index = torch.repeat_interleave(torch.arange(length, device=device), item_dur)
+        pred_aln_trg[token_index, torch.arange(frames, device=device)] = 1
+        pred_aln_trg = pred_aln_trg.unsqueeze(0)
+
+        en = d[row:row + 1, :length].transpose(-1, -2) @ pred_aln_trg
+        F0_pred, N_pred = model.predictor.F0Ntrain(en, s[row:row + 1])
+        asr = t_en[row:row + 1, :, :length] @ pred_aln_trg
+        audio = model.decoder(asr, F0_pred, N_pred, ref_s[row:row + 1, :128])
+        outputs[i] = audio.squeeze().cpu().numpy()
+
+    return outputs
+
+class KokoroBatchScheduler:
+    """Queues sentence synthesis requests and runs them through Kokoro in batches.
+
+    Requests from every story share one queue. Whatever is waiting when the model
+    becomes free is batched immediately; otherwise the scheduler waits at most
+    max_wait_ms for a batch to fill, which bounds the latency added to a sentence.
+    Batches run on a dedicated thread so synthesis never competes with itself.
+    """
+
+    def __init__(self, model, max_batch_size: Optional[int] = None, max_wait_ms: Optional[int] = None):
+        self.model = model
+        self.max_batch_size = max_batch_size or settings.KOKORO_BATCH_MAX_SIZE
+        self.max_wait = (settings.KOKORO_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kokoro-batch")
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches_run = 0
+        self.sentences_run = 0
+        # Weak, so a scheduler dropped by tts_factory.reset() can still be collected
+        scheduler = weakref.ref(self)
+        metrics.registry.gauge(
+            "storyteller_kokoro_batch_queue", "Sentences waiting for a Kokoro batch",
+            function=lambda: scheduler().queue_depth if scheduler() is not None else 0)
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def synthesize(self, request: SynthesisRequest) -> Optional[np.ndarray]:
+        """Synthesize one sentence. Returns None when the text has no pronounceable tokens."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((request, future))
+        return await future
+
+    async def _collect_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Take what is already waiting without delay, then wait out the deadline
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return [(request, future) for request, future in batch if not future.cancelled()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(
+                    self._executor,
+                    torch_capture.profiled,
+                    "kokoro",
+                    synthesize_batch,
+                    self.model,
+                    [request for request, _ in batch]
+                )
+                self.batches_run += 1
+                self.sentences_run += len(batch)
+                for (_, future), audio in zip(batch, results):
+                    if not future.done():
+                        future.set_result(audio)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,145 @@
+import logging
+import time
+import torch
+from typing import Any, Dict, List, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Submodules on Kokoro's inference path, as attribute paths from the model dict
+ENGINE_TARGETS: List[Tuple[str, ...]] = [
+    ("bert",),
+    ("bert_encoder",),
+    ("text_encoder",),
+    ("predictor", "text_encoder"),
+    ("decoder",),
+]
+
+# Two lengths, so a traced module that baked in a shape fails the check
+REFERENCE_SENTENCES = [
+    "Once upon a time, a little fox found a shiny key.",
+    "The moon smiled down on the sleepy village, and every window glowed with warm yellow light.",
+]
+
+def _get_module(model, path: Tuple[str, ...]) -> torch.nn.Module:
+    module = model[path[0]]
+    for name in path[1:]:
+        module = getattr(module, name)
+    return module
+
+def _set_module(model, path: Tuple[str, ...], module: torch.nn.Module) -> None:
+    if len(path) == 1:
+        model[path[0]] = module
+        return
+    parent = _get_module(model, path[:-1])
+    setattr(parent, path[-1], module)
+
+def _tensors(value: Any) -> List[torch.Tensor]:
+    """Flatten a module output into its tensors"""
+    if isinstance(value, torch.Tensor):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return [t for item in value for t in _tensors(item)]
+    if isinstance(value, dict):
+        return [t for item in value.values() for t in _tensors(item)]
+    return []
+
+def _outputs_match(expected: Any, actual: Any) -> Tuple[bool, float]:
+    expected_tensors, actual_tensors = _tensors(expected), _tensors(actual)
+    if len(expected_tensors) != len(actual_tensors):
+        return False, float("inf")
+    max_diff = 0.0
+    for e, a in zip(expected_tensors, actual_tensors):
+        if e.shape != a.shape:
+            return False, float("inf")
+        if e.is_floating_point():
+            max_diff = max(max_diff, (e - a).abs().max().item() if e.numel() else 0.0)
+            if not torch.allclose(e, a, rtol=settings.KOKORO_ENGINE_RTOL, atol=settings.KOKORO_ENGINE_ATOL):
+                return False, max_diff
+        elif not torch.equal(e, a):
+            return False, float("inf")
+    return True, max_diff
+
+def _get_rng_state():
+    return torch.get_rng_state(), torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None
+
+def _set_rng_state(state) -> None:
+    cpu_state, cuda_state = state
+    torch.set_rng_state(cpu_state)
+    if cuda_state is not None:
+        torch.cuda.set_rng_state_all(cuda_state)
+
+def _record_calls(model, voicepack: torch.Tensor) -> Dict[Tuple[str, ...], list]:
+    """Run the eager model on the reference sentences, recording each target's inputs and outputs.
+
+    The RNG state before each call is kept too, since the decoder injects random noise.
+    """
+    from app.services.kokoro_batching import SynthesisRequest, synthesize_batch
+
+    calls: Dict[Tuple[str, ...], list] = {path: [] for path in ENGINE_TARGETS}
+    rng_states: Dict[Tuple[str, ...], Any] = {}
+    handles = []
+    for path in ENGINE_TARGETS:
+        def pre_hook(module, args, path=path):
+            rng_states[path] = _get_rng_state()
+        def hook(module, args, kwargs, output, path=path):
+            calls[path].append((args, kwargs, output, rng_states.pop(path)))
+        module = _get_module(model, path)
+        handles.append(module.register_forward_pre_hook(pre_hook))
+        handles.append(module.register_forward_hook(hook, with_kwargs=True))
+    try:
+        for sentence in REFERENCE_SENTENCES:
+            torch.manual_seed(0)
+            synthesize_batch(model, [SynthesisRequest(text=sentence, voicepack=voicepack, lang="a")])
+    finally:
+        for handle in handles:
+            handle.remove()
+    return calls
+
+def _build(module: torch.nn.Module, engine: str, example) -> torch.nn.Module:
+    if engine == "compile":
+        return torch.compile(module, dynamic=True)
+    if engine == "torchscript":
+        args, kwargs, _, _ = example
+        if kwargs:
+            raise ValueError("modules called with keyword inputs cannot be traced")
+        return torch.jit.trace(module, args, strict=False, check_trace=False)
+    raise ValueError(f"Unknown Kokoro engine: {engine}")
+
+@torch.no_grad()
+def apply_engine(model, engine: str, voicepack: torch.Tensor) -> Dict[str, str]:
+    """Swap Kokoro submodules for compiled or traced versions where they match eager output.
+
+    Every target is built and then checked against the eager outputs recorded on
+    the reference sentences. Targets that fail to build or drift beyond
+    KOKORO_ENGINE_RTOL/ATOL keep their eager module, so the model always works.
+    Returns the engine used for each target.
+    """
+    report = {".".join(path): "eager" for path in ENGINE_TARGETS}
+    if engine == "eager":
+        return report
+
+    calls = _record_calls(model, voicepack)
+    for path in ENGINE_TARGETS:
+        name = ".".join(path)
+        eager_module = _get_module(model, path)
+        if not calls[path]:
+            report[name] = "eager (not called)"
+            continue
+        try:
+            start = time.perf_counter()
+            accelerated = _build(eager_module, engine, calls[path][0])
+            for args, kwargs, expected, rng_state in calls[path]:
+                # Replay with the RNG state the eager call saw, so random noise lines up
+                _set_rng_state(rng_state)
+                matches, max_diff = _outputs_match(expected, accelerated(*args, **kwargs))
+                if not matches:
+                    raise ValueError(f"output differs from eager (max diff {max_diff:.2e})")
+            _set_module(model, path, accelerated)
+            report[name] = engine
+            logger.info("Kokoro %s: using %s (%.1fs to build and verify)", name, engine, time.perf_counter() - start)
+        except Exception as e:
+            report[name] = f"eager ({str(e).splitlines()[0] if str(e) else type(e).__name__})"
+            logger.warning("Kokoro %s: falling back to eager, %s failed: %s", name, engine, e)
+    return report
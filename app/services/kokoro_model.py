@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import time
+import numpy as np
+import torch
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+# Import directly from the cloned repository
+from app.models.kokoro.models import build_model
+
+logger = logging.getLogger(__name__)
+
+CONVERTED_FORMAT_VERSION = 1
+
+def _torch_load(path: Path):
+    """Memory-map a checkpoint when its format allows it, otherwise read it fully"""
+    try:
+        return torch.load(path, map_location='cpu', weights_only=True, mmap=True)
+    except RuntimeError:
+        # Legacy (non-zip) checkpoints cannot be memory-mapped
+        return torch.load(path, map_location='cpu', weights_only=True)
+
+def _converted_weights_path() -> Path:
+    if settings.KOKORO_CONVERTED_WEIGHTS_PATH:
+        return Path(settings.KOKORO_CONVERTED_WEIGHTS_PATH)
+    weights_path = settings.TTS_MODEL_PATH / settings.TTS_MODEL_WEIGHTS
+    return weights_path.with_name(f"{weights_path.stem}.converted.pt")
+
+def _source_signature(path: Path) -> Dict:
+    stat = path.stat()
+    return {"version": CONVERTED_FORMAT_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def _convert_state_dict(state_dict: Dict[str, torch.Tensor], module: torch.nn.Module) -> Dict[str, torch.Tensor]:
+    """Strip the 'module.' prefix left by DataParallel when the module doesn't expect it"""
+    expected = module.state_dict().keys()
+    if any(key in expected for key in state_dict):
+        return state_dict
+    return {key[7:] if key.startswith('module.') else key: value for key, value in state_dict.items()}
+
+def _load_weights(model) -> Dict[str, Dict[str, torch.Tensor]]:
+    """Return per-module state dicts, from the converted cache when it matches the checkpoint.
+
+    The cache holds the state dicts exactly as the modules expect them, so loading
+    is a memory map plus one strict load_state_dict per module, with no prefix retries.
+    """
+    source_path = settings.TTS_MODEL_PATH / settings.TTS_MODEL_WEIGHTS
+    converted_path = _converted_weights_path()
+    signature = _source_signature(source_path)
+
+    if converted_path.exists():
+        try:
+            cached = _torch_load(converted_path)
+            if cached.get("source") == signature:
+                return cached["net"]
+            logger.info("Converted Kokoro weights at %s are stale, rebuilding", converted_path)
+        except Exception as e:
+            logger.warning("Failed to read converted Kokoro weights at %s: %s", converted_path, e)
+
+    weights = _torch_load(source_path)['net']
+    converted = {}
+    for key, state_dict in weights.items():
+        assert key in model, key
+        converted[key] = _convert_state_dict(state_dict, model[key])
+
+    try:
+        tmp_path = converted_path.with_suffix(converted_path.suffix + ".tmp")
+        torch.save({"source": signature, "net": converted}, tmp_path)
+        os.replace(tmp_path, converted_path)
+        logger.info("Saved converted Kokoro weights to %s", converted_path)
+    except OSError as e:
+        logger.warning("Could not save converted Kokoro weights: %s", e)
+    return converted
+
+def load_kokoro_model(device: str, engine: Optional[str] = None):
+    """Build the Kokoro model from its config and load the checkpoint weights.
+
+    The inference engine defaults to KOKORO_ENGINE; anything but eager is applied
+    after loading and falls back per submodule to eager mode.
+    """
+    start = time.perf_counter()
+    model_dir = settings.TTS_MODEL_PATH
+
+    # Load model config and build model
+    config_path = model_dir / "config.json"
+    with open(config_path) as f:
+        config = json.load(f)
+
+    # Build model with config
+    model = build_model(config, device)
+
+    # On CPU the parameters are assigned straight from the memory-mapped file, so
+    # nothing is copied and worker processes share the same pages
+    assign = torch.device(device).type == "cpu"
+    for key, state_dict in _load_weights(model).items():
+        try:
+            model[key].load_state_dict(state_dict, assign=assign)
+        except RuntimeError as e:
+            logger.warning("Loading Kokoro %s non-strictly: %s", key, str(e).splitlines()[0])
+            model[key].load_state_dict(state_dict, strict=False, assign=assign)
+
+    # Move each component to device
+    for key in model.keys():
+        model[key] = model[key].to(device)
+
+    logger.info("Loaded Kokoro model from %s in %.2fs", model_dir, time.perf_counter() - start)
+    
+    engine = engine or settings.KOKORO_ENGINE
+    if engine != "eager":
+        from app.services.kokoro_engine import apply_engine
+        apply_engine(model, engine, load_voicepack(settings.TTS_VOICE, device))
+    return model
+
+def load_voicepack(voice_name: str, device: str) -> torch.Tensor:
+    """Load a voice pack (style vectors indexed by token count)"""
+    voice_path = settings.TTS_MODEL_PATH / "voices" / f"{voice_name}.pt"
+    return _torch_load(voice_path).to(device)
+
+def to_pcm16(audio_data: np.ndarray) -> np.ndarray:
+    """Normalize, amplify and convert a whole sentence to int16 in one pass"""
+    max_value = np.max(np.abs(audio_data))
+    if max_value > 0:
+        # Normalize to 0.95 then apply a slight amplification, clipping instead of wrapping around
+        audio_data = np.clip(audio_data * (0.95 * 1.5 / max_value), -1.0, 1.0)
+    return (audio_data * 32767).astype(np.int16)
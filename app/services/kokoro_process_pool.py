@@ -0,0 +1,318 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+KOKORO_SAMPLE_RATE = 24000
+WORKER_CHECK_INTERVAL = 1.0  # Seconds between liveness checks of the workers
+
+def _worker_main(
+    worker_id: int,
+    generation: int,
+    slab_name: str,
+    slab_samples: int,
+    slab_free,
+    requests: mp.Queue,
+    results: mp.Queue,
+    torch_threads: int,
+    device: str
+):
+    """Worker process: load a model, then synthesize batches of requests until told to stop.
+
+    PCM is written into this worker's shared-memory slab; only the request id and
+    sample count go back through the results queue. Every result carries the
+    worker's generation, so the parent can tell a restarted worker's results
+    from those its dead predecessor left in the queue.
+    """
+    import torch
+
+    from app.core import tracing
+
+    # Spawned workers start without the parent's log handlers
+    tracing.configure()
+
+    # Pin threads before any parallel work so workers don't oversubscribe the cores
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+    from app.services.kokoro_batching import SynthesisRequest, synthesize_batch
+    from app.services.kokoro_model import load_kokoro_model, load_voicepack, to_pcm16
+    from app.services.phoneme_cache import phoneme_cache
+
+    slab = SharedMemory(name=slab_name)
+    pcm_out = np.ndarray((slab_samples,), dtype=np.int16, buffer=slab.buf)
+    try:
+        model = load_kokoro_model(device)
+        voicepacks: Dict[str, torch.Tensor] = {}
+        for voice in settings.KOKORO_PRELOAD_VOICES:
+            try:
+                voicepacks[voice] = load_voicepack(voice, device)
+            except Exception as e:
+                logger.warning("Kokoro worker %d: failed to preload voice %s: %s", worker_id, voice, e)
+        results.put(("ready", worker_id, generation, None, None))
+
+        while True:
+            message = requests.get()
+            if message is None:
+                break
+            batch = [message]
+            # Drain whatever else is waiting so it shares the forward pass
+            while len(batch) < settings.KOKORO_BATCH_MAX_SIZE:
+                try:
+                    message = requests.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    requests.put(None)  # Leave the stop signal for the next loop iteration
+                    break
+                batch.append(message)
+
+            request_ids = [request_id for request_id, *_ in batch]
+            results.put(("started", worker_id, generation, request_ids, None))
+            try:
+                synthesis_requests = []
+                for _, text, voice, lang, speed in batch:
+                    if voice not in voicepacks:
+                        voicepacks[voice] = load_voicepack(voice, device)
+                    synthesis_requests.append(SynthesisRequest(text=text, voicepack=voicepacks[voice], lang=lang, speed=speed))
+                audios = synthesize_batch(model, synthesis_requests)
+            except Exception as e:
+                for request_id in request_ids:
+                    results.put(("error", worker_id, generation, request_id, str(e)))
+                continue
+
+            for request_id, audio in zip(request_ids, audios):
+                if audio is None:
+                    results.put(("done", worker_id, generation, request_id, 0))
+                    continue
+                pcm = to_pcm16(audio)
+                if pcm.size > slab_samples:
+                    # Failed rather than cut off, so nobody gets clipped speech as a success
+                    results.put((
+                        "error", worker_id, generation, request_id,
+                        f"Sentence audio is {pcm.size / KOKORO_SAMPLE_RATE:.1f}s, longer than "
+                        f"KOKORO_WORKER_MAX_AUDIO_SECONDS ({slab_samples // KOKORO_SAMPLE_RATE}s)"
+                    ))
+                    continue
+                # Wait until the parent copied the previous result out of the slab
+                slab_free.acquire()
+                pcm_out[:pcm.size] = pcm
+                results.put(("done", worker_id, generation, request_id, pcm.size))
+    finally:
+        phoneme_cache.save()
+        del pcm_out
+        slab.close()
+        tracing.shutdown()
+
+class KokoroProcessPool:
+    """Runs Kokoro synthesis in N worker processes.
+
+    Each worker loads its own model with a pinned torch thread count and pulls
+    requests from one shared queue, so load balances itself across cores and
+    synthesis stays off the API process. Requests are tiny tuples; audio comes
+    back through a per-worker shared-memory slab instead of being pickled.
+    """
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        torch_threads: Optional[int] = None,
+        device: str = "cpu"
+    ):
+        self.num_workers = num_workers or settings.KOKORO_NUM_WORKERS
+        self.torch_threads = torch_threads or settings.KOKORO_WORKER_TORCH_THREADS
+        self.device = device
+        self.slab_samples = KOKORO_SAMPLE_RATE * settings.KOKORO_WORKER_MAX_AUDIO_SECONDS
+
+        ctx = mp.get_context("spawn")
+        self._ctx = ctx
+        self._requests = ctx.Queue()
+        self._results = ctx.Queue()
+        self._slabs: List[SharedMemory] = []
+        self._slab_free = []
+        self._workers: List[Optional[mp.Process]] = []
+        self._generations: List[int] = []  # Bumped on every restart of a worker
+        self._pending: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._in_flight: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._ready = set()
+        self._closed = False
+
+        for worker_id in range(self.num_workers):
+            self._slabs.append(SharedMemory(create=True, size=self.slab_samples * 2))
+            self._slab_free.append(ctx.Semaphore(1))
+            self._workers.append(None)
+            self._generations.append(0)
+            self._start_worker(worker_id)
+
+        self._reader = threading.Thread(target=self._read_results, name="kokoro-pool-results", daemon=True)
+        self._reader.start()
+        logger.info("Started Kokoro process pool with %d workers x %d threads", self.num_workers, self.torch_threads)
+
+    def _start_worker(self, worker_id: int) -> None:
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                worker_id,
+                self._generations[worker_id],
+                self._slabs[worker_id].name,
+                self.slab_samples,
+                self._slab_free[worker_id],
+                self._requests,
+                self._results,
+                self.torch_threads,
+                self.device
+            ),
+            name=f"kokoro-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self._workers[worker_id] = process
+
+    @property
+    def ready_workers(self) -> int:
+        return len(self._ready)
+
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    async def synthesize(self, text: str, voice: str, lang: str, speed: float = 1.0) -> Optional[np.ndarray]:
+        """Synthesize one sentence and return int16 PCM, or None if it has nothing to say"""
+        if self._closed:
+            raise RuntimeError("Kokoro process pool is closed")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        request_id = next(self._ids)
+        with self._lock:
+            self._pending[request_id] = (loop, future)
+        self._requests.put((request_id, text, voice, lang, speed))
+        timeout = settings.KOKORO_WORKER_REQUEST_TIMEOUT_SECONDS
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"No audio from the Kokoro workers within {timeout:.0f}s") from None
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    def _resolve(self, request_id: int, result=None, error: Optional[str] = None) -> None:
+        with self._lock:
+            entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return  # Caller gave up on it
+        loop, future = entry
+
+        def set_outcome():
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+        loop.call_soon_threadsafe(set_outcome)
+
+    def _read_results(self):
+        last_check = time.monotonic()
+        while not self._closed:
+            # Checked on a timer rather than when the queue goes idle, so a crash is noticed under steady load too
+            if time.monotonic() - last_check >= WORKER_CHECK_INTERVAL:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                message = self._results.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            self._handle(message)
+
+    def _handle(self, message: Tuple) -> None:
+        kind, worker_id, generation, payload, value = message
+        if generation != self._generations[worker_id]:
+            # Left in the queue by a worker that has been restarted since; its requests were already failed
+            return
+        if kind == "ready":
+            self._ready.add(worker_id)
+            logger.info("Kokoro worker %d ready", worker_id)
+        elif kind == "started":
+            self._in_flight.setdefault(worker_id, []).extend(payload)
+        elif kind == "error":
+            self._forget(worker_id, payload)
+            self._resolve(payload, error=value)
+        elif kind == "done":
+            self._forget(worker_id, payload)
+            if value == 0:
+                self._resolve(payload, None)
+                return
+            # Copy out of the slab, then hand it back to the worker
+            pcm = np.ndarray((value,), dtype=np.int16, buffer=self._slabs[worker_id].buf).copy()
+            self._slab_free[worker_id].release()
+            self._resolve(payload, pcm)
+
+    def _drain_results(self) -> None:
+        while True:
+            try:
+                message = self._results.get_nowait()
+            except queue.Empty:
+                return
+            self._handle(message)
+
+    def _forget(self, worker_id: int, request_id: int) -> None:
+        in_flight = self._in_flight.get(worker_id)
+        if in_flight and request_id in in_flight:
+            in_flight.remove(request_id)
+
+    def _check_workers(self) -> None:
+        """Restart dead workers and fail the requests they were holding"""
+        dead = [
+            worker_id for worker_id, process in enumerate(self._workers)
+            if process is not None and not process.is_alive() and not self._closed
+        ]
+        if not dead:
+            return
+        # Results a dead worker sent before it died still count; only what it never finished fails
+        self._drain_results()
+        for worker_id in dead:
+            process = self._workers[worker_id]
+            logger.warning("Kokoro worker %d exited with code %s, restarting", worker_id, process.exitcode)
+            self._generations[worker_id] += 1
+            self._ready.discard(worker_id)
+            for request_id in self._in_flight.pop(worker_id, []):
+                self._resolve(request_id, error=f"Kokoro worker {worker_id} crashed")
+            # The slab may have been left acquired by the dead worker
+            self._slab_free[worker_id] = self._ctx.Semaphore(1)
+            self._start_worker(worker_id)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._requests.put(None)
+        for semaphore in self._slab_free:
+            semaphore.release()  # Unblock workers waiting on a slab
+        for process in self._workers:
+            if process is not None:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+        with self._lock:
+            pending = list(self._pending)
+        for request_id in pending:
+            self._resolve(request_id, error="Kokoro process pool closed")
+        for slab in self._slabs:
+            slab.close()
+            slab.unlink()
@@ -1,19 +1,17 @@
 import asyncio
-import aiofiles
+import logging
+import threading
 import numpy as np
-import sounddevice as sd
-import torch
-import json
-from typing import AsyncGenerator, Optional, List
-from pathlib import Path
-import time
+from typing import AsyncGenerator, Optional
 
 from app.core.config import settings
 from app.services.tts_service import TTSService
+from app.services.audio_sink import AudioSink, LocalPlaybackSink
+from app.services.kokoro_model import load_kokoro_model, load_voicepack, to_pcm16
+from app.services.kokoro_batching import KokoroBatchScheduler, SynthesisRequest
+from app.services.phoneme_cache import phoneme_cache
 
-# Import directly from the cloned repository
-from app.models.kokoro.models import build_model
-from app.models.kokoro.kokoro import generate
+logger = logging.getLogger(__name__)
 
 class KokoroTTSService(TTSService):
     def __init__(self):
@@ -21,57 +19,60 @@ class KokoroTTSService(TTSService):
         self.device = settings.TTS_DEVICE
         self.model = None
         self.voicepacks = {}
+        self.scheduler: Optional[KokoroBatchScheduler] = None
+        self.pool = None
         self.sample_rate = 24000  # Kokoro sample rate
-        self._initialize_model()
-        print("KokoroTTSService initialized")
+        self.stream_chunk_samples = 2048  # Samples per chunk sent to clients
+        self.send_to_network = settings.TTS_OUTPUT_SINK in ("network", "both")
+        self.local_sink: Optional[AudioSink] = None
+        if settings.TTS_OUTPUT_SINK in ("local", "both"):
+            self.local_sink = LocalPlaybackSink(self.sample_rate)
+        
+        if settings.KOKORO_EXECUTION_MODE == "process":
+            # Workers load their own models; the API process only dispatches
+            from app.services.kokoro_process_pool import KokoroProcessPool
+            self.pool = KokoroProcessPool(device=self.device)
+        else:
+            self._initialize_model()
+            self.scheduler = KokoroBatchScheduler(self.model)
+            threading.Thread(target=self._preload_voices, name="kokoro-voices", daemon=True).start()
+        logger.info("KokoroTTSService initialized (%s mode)", settings.KOKORO_EXECUTION_MODE)
+    
+    @property
+    def is_ready(self) -> bool:
+        if self.pool is not None:
+            return self.pool.ready_workers > 0
+        return self.model is not None
+    
+    def _preload_voices(self):
+        """Load the configured voice packs so the first sentence in each voice doesn't wait on disk"""
+        for voice_name in settings.KOKORO_PRELOAD_VOICES:
+            try:
+                self._load_voice(voice_name)
+            except Exception:
+                pass  # Already reported by _load_voice; the voice loads lazily later
     
     def _initialize_model(self):
         """Initialize the Kokoro model and load default voice"""
         try:
-            model_dir = settings.TTS_MODEL_PATH
-            
-            # Load model config and build model
-            config_path = model_dir / "config.json"
-            with open(config_path) as f:
-                config = json.load(f)
-            
-            # Build model with config
-            self.model = build_model(config, self.device)
-            
-            # Load model weights
-            weights = torch.load(model_dir / "kokoro-v0_19.pth", map_location='cpu', weights_only=True)['net']
-            for key, state_dict in weights.items():
-                assert key in self.model, key
-                try:
-                    self.model[key].load_state_dict(state_dict)
-                except:
-                    # Some state dicts might have 'module.' prefix, try removing it
-                    state_dict = {k[7:]: v for k, v in state_dict.items()}
-                    self.model[key].load_state_dict(state_dict, strict=False)
-            
-            # Move each component to device
-            for key in self.model.keys():
-                self.model[key] = self.model[key].to(self.device)
-            
-            print(f"Loaded Kokoro model from {model_dir}")
+            self.model = load_kokoro_model(self.device)
             
             # Load default voice
             self._load_voice(settings.TTS_VOICE)
             
         except Exception as e:
-            print(f"Failed to initialize Kokoro model: {str(e)}")
+            logger.error("Failed to initialize Kokoro model: %s", e)
             raise
     
     def _load_voice(self, voice_name: str):
         """Load a specific voice pack"""
         try:
             if voice_name not in self.voicepacks:
-                voice_path = settings.TTS_MODEL_PATH / "voices" / f"{voice_name}.pt"
-                self.voicepacks[voice_name] = torch.load(voice_path, weights_only=True).to(self.device)
-                print(f"Loaded voice: {voice_name}")
+                self.voicepacks[voice_name] = load_voicepack(voice_name, self.device)
+                logger.info("Loaded voice: %s", voice_name)
             return self.voicepacks[voice_name]
         except Exception as e:
-            print(f"Failed to load voice {voice_name}: {str(e)}")
+            logger.error("Failed to load voice %s: %s", voice_name, e)
             raise
     
     def _chunk_text(self, text: str, max_chars: Optional[int] = None) -> list[str]:
@@ -97,6 +98,29 @@ class KokoroTTSService(TTSService):
             
         return sentences
 
+    def close(self) -> None:
+        if self.scheduler is not None:
+            self.scheduler.close()
+            phoneme_cache.save()
+        if self.pool is not None:
+            self.pool.close()
+        if self.local_sink is not None:
+            self.local_sink.close()
+            self.local_sink = None
+
+    async def _synthesize(self, sentence: str, voice: str) -> Optional[np.ndarray]:
+        """Synthesize one sentence to int16 PCM, in a worker process or the batch scheduler"""
+        lang = voice[0]  # 'a' for American, 'b' for British
+        if self.pool is not None:
+            return await self.pool.synthesize(sentence, voice, lang)
+        
+        audio_data = await self.scheduler.synthesize(SynthesisRequest(
+            text=sentence,
+            voicepack=self._load_voice(voice),
+            lang=lang
+        ))
+        return to_pcm16(audio_data) if audio_data is not None else None
+
     async def convert_text_to_speech(
         self, 
         text: str,
@@ -104,78 +128,48 @@ class KokoroTTSService(TTSService):
         language: str,
     ) -> AsyncGenerator[bytes, None]:
         """Convert text to speech using Kokoro model"""
-        stream = None
         try:
-            print("Starting text-to-speech conversion")
-            
             # Get voice - for Kokoro we only support English voices
             voice = "af_bella" if language.lower().startswith("en") else "bf"  # af for American, bf for British
-            voicepack = self._load_voice(voice)
             
             # Split text into sentences
             sentences = self._chunk_text(text)
             
-            # Create audio stream
-            stream = sd.OutputStream(
-                samplerate=self.sample_rate,
-                channels=1,
-                dtype=np.int16,
-                blocksize=1024,
-                latency="low",
-            )
-            stream.start()
+            # Queue every sentence up front so they can share batches, then stream them in order
+            tasks = [asyncio.ensure_future(self._synthesize(sentence, voice)) for sentence in sentences]
             
-            for i, sentence in enumerate(sentences, 1):
-                try:
-                    print(f"Processing sentence {i}/{len(sentences)}")
-                    
-                    # Add small delay between sentences
-                    if i > 1:
-                        await asyncio.sleep(0.1)
-                    
-                    # Generate audio
-                    loop = asyncio.get_event_loop()
-                    audio_data, _ = await loop.run_in_executor(
-                        None,
-                        lambda: generate(
-                            self.model,
-                            sentence,
-                            voicepack,
-                            lang=voice[0]  # 'a' for American, 'b' for British
-                        )
-                    )
-                    
-                    # Normalize and amplify
-                    max_value = np.max(np.abs(audio_data))
-                    if max_value > 0:
-                        audio_data = (audio_data / max_value) * 0.95
-                        audio_data *= 1.5  # Slight amplification
-                    
-                    # Stream in small chunks for low latency
-                    buffer_size = 2048
-                    for start_idx in range(0, len(audio_data), buffer_size):
-                        chunk = audio_data[start_idx:start_idx + buffer_size]
-                        chunk_int16 = (chunk * 32767).astype(np.int16)
-                        stream.write(chunk_int16)
-                        yield chunk_int16.tobytes()
-                        await asyncio.sleep(0)  # Allow other tasks to run
+            try:
+                for i, task in enumerate(tasks, 1):
+                    try:
+                        logger.debug("Processing sentence %d/%d", i, len(sentences))
                         
-                except asyncio.CancelledError:
-                    print("Audio streaming cancelled")
-                    return
-                except Exception as e:
-                    print(f"Error processing sentence {i}: {str(e)}")
-                    return
-                
-            print("Text-to-speech conversion completed successfully")
+                        pcm = await task
+                        if pcm is None:
+                            continue
+                        
+                        if self.local_sink is not None:
+                            self.local_sink.write(pcm)
+                        
+                        if self.send_to_network:
+                            # Stream in small chunks for low latency
+                            pcm_bytes = pcm.tobytes()
+                            chunk_bytes = self.stream_chunk_samples * 2
+                            for start_idx in range(0, len(pcm_bytes), chunk_bytes):
+                                yield pcm_bytes[start_idx:start_idx + chunk_bytes]
+                                await asyncio.sleep(0)  # Allow other tasks to run
+                        
+                    except asyncio.CancelledError:
+                        logger.debug("Audio streaming cancelled")
+                        return
+                    except Exception as e:
+                        logger.error("Error processing sentence %d: %s", i, e)
+                        return
+            finally:
+                # Drop sentences still queued if the client went away
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
             
         except Exception as e:
-            print(f"Error in text-to-speech conversion: {str(e)}")
+            logger.error("Error in text-to-speech conversion: %s", e)
             raise ValueError(f"Error generating speech: {str(e)}")
-        finally:
-            if stream is not None:
-                try:
-                    stream.stop()
-                    stream.close()
-                except Exception as e:
-                    print(f"Error closing audio stream: {str(e)}") 
\ No newline at end of file
@@ -1,8 +1,11 @@
+import logging
 from abc import ABC, abstractmethod
 from typing import AsyncGenerator, Dict, Optional
 from app.services.conversation_manager import conversation_manager
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 class BaseLLMService(ABC):
     def _get_story_prompt(self, user_input: str, language: str, phase: Optional[str] = None, previous_content: Optional[str] = None) -> str:
         """Get the appropriate prompt based on conversation history and story phase"""
@@ -35,7 +38,7 @@ class BaseLLMService(ABC):
                 phase_prompt=phase_prompt if settings.ENABLE_PHASED_GENERATION else None
             )
         except Exception as e:
-            print(f"Error in _get_story_prompt: {str(e)}")
+            logger.error("Error in _get_story_prompt: %s", e)
             raise
 
     async def generate_story_phase(self, user_input: str, phase: str, language: str = "french", previous_content: Optional[str] = None) -> AsyncGenerator[str, None]:
@@ -57,7 +60,7 @@ class BaseLLMService(ABC):
 class LLMServiceFactory:
     @staticmethod
     def create_service(service_type: str = "gemini") -> BaseLLMService:
-        print(f"Creating LLM service of type: {service_type}")
+        logger.info("Creating LLM service of type: %s", service_type)
         if service_type == "gemini":
             from app.services.gemini_llm_service import GeminiLLMService
             return GeminiLLMService()
@@ -67,6 +70,9 @@ class LLMServiceFactory:
         elif service_type == "openrouter":
             from app.services.openrouter_llm_service import OpenRouterService
             return OpenRouterService()
+        elif service_type == "fake":
+            from app.services.fake_llm_service import FakeLLMService
+            return FakeLLMService()
         else:
             raise ValueError(f"Unknown LLM service type: {service_type}")
 
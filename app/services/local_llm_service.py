@@ -1,3 +1,4 @@
+import logging
 import torch
 import os
 from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, TextIteratorStreamer
@@ -5,15 +6,18 @@ from huggingface_hub import login
 from threading import Thread
 from typing import AsyncGenerator
 from app.core.config import settings
+from app.core.profiling import torch_capture
 from app.services.llm_service import BaseLLMService
 
+logger = logging.getLogger(__name__)
+
 class LocalLLMService(BaseLLMService):
     def __init__(self):
         # Set PyTorch memory allocator configuration
         os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
         
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"Initializing Llama model on {self.device}")
+        logger.info("Initializing Llama model on %s", self.device)
         
         # Enable memory efficient attention
         torch.backends.cuda.sdp_kernel(enable_flash=True, enable_math=False, enable_mem_efficient=True)
@@ -46,7 +50,7 @@ class LocalLLMService(BaseLLMService):
             "meta-llama/Llama-3.2-1B",
             token=settings.HUGGINGFACE_TOKEN
         )
-        print("Llama model initialized successfully")
+        logger.info("Llama model initialized successfully")
 
     async def generate_story(self, user_input: str, language: str = "french") -> AsyncGenerator[str, None]:
         """Generate story using local Llama model"""
@@ -68,7 +72,7 @@ class LocalLLMService(BaseLLMService):
             }
 
             # Start generation in a separate thread
-            thread = Thread(target=self.model.generate, kwargs=generation_kwargs)
+            thread = Thread(target=torch_capture.profiled, args=("llm", self.model.generate), kwargs=generation_kwargs)
             thread.start()
 
             # Yield generated text chunks
@@ -76,7 +80,7 @@ class LocalLLMService(BaseLLMService):
                 yield text
 
         except Exception as e:
-            print(f"Error generating story: {str(e)}")
+            logger.error("Error generating story: %s", e)
             raise
 
 local_llm_service = LocalLLMService() 
\ No newline at end of file
@@ -1,8 +1,11 @@
-import aiohttp
 import json
+import logging
 from typing import AsyncGenerator, Dict, Any, Optional
 from app.core.config import settings
 from app.services.llm_service import BaseLLMService
+from app.services.cassettes import cassette_post
+
+logger = logging.getLogger(__name__)
 
 class OpenRouterError(Exception):
     def __init__(self, message: str, status_code: int = None, response_data: Dict = None):
@@ -18,7 +21,7 @@ class OpenRouterService(BaseLLMService):
             "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
             "Content-Type": "application/json",
         }
-        print(f"OpenRouterService initialized with model: {self.model}")
+        logger.info("OpenRouterService initialized with model: %s", self.model)
 
     async def generate_story(self, user_input: str, language: str = "french", phase: Optional[str] = None, previous_content: Optional[str] = None) -> AsyncGenerator[str, None]:
         """Generate a story using the OpenRouter API with streaming"""
@@ -41,53 +44,52 @@ class OpenRouterService(BaseLLMService):
                 "presence_penalty": settings.OPENROUTER_PRESENCE_PENALTY
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, headers=self.headers) as response:
-                    if response.status != 200:
-                        error_data = await response.json()
-                        error_msg = error_data.get('error', {}).get('message', 'Unknown error')
-                        print(f"API error: {error_msg}")
-                        raise OpenRouterError(
-                            f"OpenRouter API error: {error_msg}",
-                            status_code=response.status,
-                            response_data=error_data
-                        )
+            async with cassette_post("openrouter", url, json=payload, headers=self.headers) as response:
+                if response.status != 200:
+                    error_data = await response.json()
+                    error_msg = error_data.get('error', {}).get('message', 'Unknown error')
+                    logger.error("API error: %s", error_msg)
+                    raise OpenRouterError(
+                        f"OpenRouter API error: {error_msg}",
+                        status_code=response.status,
+                        response_data=error_data
+                    )
                     
-                    buffer = ""
-                    async for chunk in response.content:
-                        if not chunk:
-                            continue
+                buffer = ""
+                async for chunk in response.content:
+                    if not chunk:
+                        continue
                             
-                        try:
-                            chunk_text = chunk.decode('utf-8')
-                            buffer += chunk_text
+                    try:
+                        chunk_text = chunk.decode('utf-8')
+                        buffer += chunk_text
                             
-                            while '\n' in buffer:
-                                line, buffer = buffer.split('\n', 1)
-                                line = line.strip()
+                        while '\n' in buffer:
+                            line, buffer = buffer.split('\n', 1)
+                            line = line.strip()
                                 
-                                if not line or line.startswith(': OPENROUTER'):
-                                    continue
+                            if not line or line.startswith(': OPENROUTER'):
+                                continue
                                 
-                                if line.startswith('data: '):
-                                    if line == 'data: [DONE]':
-                                        break
+                            if line.startswith('data: '):
+                                if line == 'data: [DONE]':
+                                    break
                                     
-                                    try:
-                                        data = json.loads(line[6:])  # Remove 'data: ' prefix
-                                        if content := data['choices'][0]['delta'].get('content'):
-                                            yield content
-                                    except json.JSONDecodeError:
-                                        if line != 'data: [DONE]':  # Ignore end marker
-                                            print(f"Failed to parse chunk: {line}")
-                                        continue
+                                try:
+                                    data = json.loads(line[6:])  # Remove 'data: ' prefix
+                                    if content := data['choices'][0]['delta'].get('content'):
+                                        yield content
+                                except json.JSONDecodeError:
+                                    if line != 'data: [DONE]':  # Ignore end marker
+                                        logger.warning("Failed to parse chunk: %s", line)
+                                    continue
                                     
-                        except UnicodeDecodeError as e:
-                            print(f"Unicode decode error: {str(e)}")
-                            continue
+                    except UnicodeDecodeError as e:
+                        logger.warning("Unicode decode error: %s", e)
+                        continue
                     
         except Exception as e:
-            print(f"Error generating story: {str(e)}")
+            logger.error("Error generating story: %s", e)
             raise
 
 openrouter_service = OpenRouterService() 
\ No newline at end of file
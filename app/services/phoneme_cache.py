@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str]  # (language, text)
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on path, shared with other processes saving the same cache"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class LRUDict:
+    """OrderedDict based LRU map with a fixed capacity"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data: "OrderedDict[CacheKey, str]" = OrderedDict()
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: CacheKey, value: str) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.capacity:
+            self._data.popitem(last=False)
+
+    def items(self):
+        return self._data.items()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class PhonemeCache:
+    """Bounded sentence- and word-level cache in front of Kokoro's phonemizer.
+
+    Children's stories repeat names and phrases a lot, so most sentences and
+    words are phonemized once and then served from memory. Entries are keyed by
+    Kokoro language code and can be persisted to disk between restarts.
+
+    Several processes (the Kokoro workers, API workers) may save to the same
+    file: saves take a lock file, merge the entries already on disk with
+    their own and write through a per-process temporary file.
+    """
+
+    def __init__(
+        self,
+        max_sentences: Optional[int] = None,
+        max_words: Optional[int] = None,
+        word_level: Optional[bool] = None,
+        path: Optional[Path] = None
+    ):
+        self._sentences = LRUDict(max_sentences or settings.PHONEME_CACHE_MAX_SENTENCES)
+        self._words = LRUDict(max_words or settings.PHONEME_CACHE_MAX_WORDS)
+        self.word_level = settings.PHONEME_CACHE_WORD_LEVEL if word_level is None else word_level
+        self.path = path or settings.PHONEME_CACHE_PATH
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.sentence_hits = 0
+        self.sentence_misses = 0
+        self.word_hits = 0
+        self.word_misses = 0
+        if self.path:
+            self.load()
+
+    def _phonemize(self, text: str, lang: str, norm: bool = True) -> str:
+        # Imported lazily so the cache can be used without loading espeak
+        from app.models.kokoro.kokoro import phonemize
+        return phonemize(text, lang, norm=norm)
+
+    def _phonemize_words(self, text: str, lang: str) -> str:
+        from app.models.kokoro.kokoro import normalize_text
+
+        phonemes = []
+        for word in normalize_text(text).split():
+            key = (lang, word)
+            with self._lock:
+                ps = self._words.get(key)
+            if ps is None:
+                self.word_misses += 1
+                ps = self._phonemize(word, lang, norm=False)
+                with self._lock:
+                    self._words.put(key, ps)
+                    self._unsaved += 1
+            else:
+                self.word_hits += 1
+            if ps:
+                phonemes.append(ps)
+        return " ".join(phonemes)
+
+    def phonemize(self, text: str, lang: str) -> str:
+        """Phonemes for a sentence, from the cache when possible"""
+        key = (lang, text)
+        with self._lock:
+            ps = self._sentences.get(key)
+        if ps is not None:
+            self.sentence_hits += 1
+            return ps
+
+        self.sentence_misses += 1
+        if self.word_level:
+            ps = self._phonemize_words(text, lang)
+        else:
+            ps = self._phonemize(text, lang)
+
+        with self._lock:
+            self._sentences.put(key, ps)
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= settings.PHONEME_CACHE_SAVE_EVERY
+        if should_save:
+            self.save()
+        return ps
+
+    def get_stats(self) -> Dict:
+        sentence_total = self.sentence_hits + self.sentence_misses
+        word_total = self.word_hits + self.word_misses
+        return {
+            "sentences": len(self._sentences),
+            "words": len(self._words),
+            "sentence_hits": self.sentence_hits,
+            "sentence_misses": self.sentence_misses,
+            "sentence_hit_rate": self.sentence_hits / sentence_total if sentence_total else 0.0,
+            "word_hits": self.word_hits,
+            "word_misses": self.word_misses,
+            "word_hit_rate": self.word_hits / word_total if word_total else 0.0,
+            "word_level": self.word_level,
+            "path": str(self.path) if self.path else None
+        }
+
+    @staticmethod
+    def _read(path: Path) -> Dict:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _merge(saved: List, entries, capacity: int) -> List:
+        # Entries on disk first, so this process's own (more recent) ones win and survive the capacity cut
+        merged = LRUDict(capacity)
+        for lang, text, ps in saved:
+            merged.put((lang, text), ps)
+        for (lang, text), ps in entries:
+            merged.put((lang, text), ps)
+        return [[lang, text, ps] for (lang, text), ps in merged.items()]
+
+    def load(self) -> None:
+        """Load persisted entries. A missing or unreadable file starts an empty cache."""
+        if not self.path or not Path(self.path).exists():
+            return
+        try:
+            data = self._read(self.path)
+            with self._lock:
+                for lang, text, ps in data.get("sentences", []):
+                    self._sentences.put((lang, text), ps)
+                for lang, word, ps in data.get("words", []):
+                    self._words.put((lang, word), ps)
+            logger.info("Loaded phoneme cache from %s: %d sentences, %d words", self.path, len(self._sentences), len(self._words))
+        except (OSError, ValueError) as e:
+            logger.warning("Failed to load phoneme cache from %s: %s", self.path, e)
+
+    def save(self) -> None:
+        """Merge the cache into the file on disk and replace it atomically"""
+        if not self.path:
+            return
+        with self._lock:
+            sentences = list(self._sentences.items())
+            words = list(self._words.items())
+            self._unsaved = 0
+        try:
+            path = Path(self.path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with _file_lock(path.with_suffix(path.suffix + ".lock")):
+                try:
+                    saved = self._read(path) if path.exists() else {}
+                except ValueError:
+                    saved = {}  # Unreadable; replaced by this process's entries
+                data = {
+                    "version": 1,
+                    "sentences": self._merge(saved.get("sentences", []), sentences, self._sentences.capacity),
+                    "words": self._merge(saved.get("words", []), words, self._words.capacity)
+                }
+                tmp_path = path.with_suffix(f"{path.suffix}.tmp.{os.getpid()}")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error("Failed to save phoneme cache to %s: %s", self.path, e)
+
+phoneme_cache = PhonemeCache()
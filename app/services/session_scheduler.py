@@ -0,0 +1,207 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first. Sessions already playing audio would stutter if they waited
+# behind a new story, so they go ahead of sessions that haven't started yet.
+PRIORITY_PLAYING = 0
+PRIORITY_NEW = 1
+
+class SchedulerBusyError(Exception):
+    """The wait queue for new sessions is full"""
+    pass
+
+class PrioritySemaphore:
+    """Semaphore whose waiters are served by priority, then arrival order.
+
+    A released slot is handed directly to the best waiter, so a newcomer can't
+    take it between the release and the waiter waking up.
+    """
+
+    def __init__(self, limit: int, on_queue_change: Optional[Callable[[], None]] = None):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters: List[list] = []  # Heap of [priority, seq, key, future]
+        self._seq = itertools.count()
+        self._on_queue_change = on_queue_change
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def queue_order(self) -> List[str]:
+        """Keys of the waiters, in the order they will be served"""
+        return [key for _, _, key, _ in sorted(self._waiters)]
+
+    def _queue_changed(self) -> None:
+        if self._on_queue_change is not None:
+            self._on_queue_change()
+
+    async def acquire(self, priority: int = PRIORITY_NEW, key: str = "") -> None:
+        if self.in_use < self.limit and not self._waiters:
+            self.in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), key, future]
+        heapq.heappush(self._waiters, entry)
+        self._queue_changed()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self.release()
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._queue_changed()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            *_, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # The slot moves to the waiter, in_use stays the same
+                self._queue_changed()
+                return
+        self.in_use -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_NEW, key: str = ""):
+        await self.acquire(priority, key)
+        try:
+            yield
+        finally:
+            self.release()
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, burst: float):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token; returns 0 on success, otherwise the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class SessionScheduler:
+    """Admission control and fair scheduling for concurrent story sessions.
+
+    - At most SCHEDULER_MAX_ACTIVE_SESSIONS stories stream at once; up to
+      SCHEDULER_MAX_QUEUED_SESSIONS more wait in line and are told their position.
+    - LLM generations and TTS synthesis each have their own concurrency limit,
+      and sessions already playing audio are served before new ones.
+    - Each client address gets a token bucket of new stories per minute.
+    """
+
+    def __init__(self):
+        self._position_callbacks: Dict[str, Callable[[int], Awaitable[None]]] = {}
+        self._positions: Dict[str, int] = {}  # Last position each waiting session was told
+        self._notifications: Set[asyncio.Task] = set()  # Referenced until done, so they aren't garbage collected
+        self.admission = PrioritySemaphore(settings.SCHEDULER_MAX_ACTIVE_SESSIONS, self._notify_positions)
+        self.generation = PrioritySemaphore(settings.SCHEDULER_MAX_CONCURRENT_GENERATIONS)
+        self.synthesis = PrioritySemaphore(settings.SCHEDULER_MAX_CONCURRENT_SYNTHESIS)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.rejected = 0
+        self.rate_limited = 0
+
+    def check_rate_limit(self, client_key: str) -> float:
+        """Count a new story for this client; returns 0 if allowed, otherwise seconds to wait"""
+        if settings.SCHEDULER_RATE_LIMIT_STORIES_PER_MINUTE <= 0:
+            return 0.0
+        bucket = self._buckets.get(client_key)
+        if bucket is None:
+            # Forget idle clients so the table doesn't grow without bound
+            if len(self._buckets) >= 10000:
+                now = time.monotonic()
+                self._buckets = {key: b for key, b in self._buckets.items() if now - b.updated < 3600}
+            bucket = self._buckets[client_key] = TokenBucket(
+                settings.SCHEDULER_RATE_LIMIT_STORIES_PER_MINUTE / 60,
+                settings.SCHEDULER_RATE_LIMIT_BURST
+            )
+        retry_after = bucket.take()
+        if retry_after:
+            self.rate_limited += 1
+        return retry_after
+
+    def _notify_positions(self) -> None:
+        for position, client_id in enumerate(self.admission.queue_order(), 1):
+            callback = self._position_callbacks.get(client_id)
+            if callback is not None and self._positions.get(client_id) != position:
+                self._positions[client_id] = position
+                task = asyncio.ensure_future(callback(position))
+                self._notifications.add(task)
+                task.add_done_callback(self._notification_done)
+
+    def _notification_done(self, task: asyncio.Task) -> None:
+        self._notifications.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Failed to send a queue position: %s", task.exception())
+
+    @asynccontextmanager
+    async def session(self, client_id: str, on_position: Optional[Callable[[int], Awaitable[None]]] = None):
+        """Hold one of the active session slots for the duration of a story.
+
+        Raises SchedulerBusyError right away if the wait queue is full.
+        on_position(n) is awaited whenever this session's place in the queue changes.
+        """
+        if self.admission.in_use >= self.admission.limit and self.admission.waiting >= settings.SCHEDULER_MAX_QUEUED_SESSIONS:
+            self.rejected += 1
+            raise SchedulerBusyError("Too many stories are being told right now, please try again shortly")
+        if on_position is not None:
+            self._position_callbacks[client_id] = on_position
+        try:
+            await self.admission.acquire(PRIORITY_NEW, client_id)
+        finally:
+            self._position_callbacks.pop(client_id, None)
+            self._positions.pop(client_id, None)
+        try:
+            yield
+        finally:
+            self.admission.release()
+
+    def generation_slot(self, priority: int = PRIORITY_NEW, client_id: str = ""):
+        """Hold while streaming one LLM generation"""
+        return self.generation.slot(priority, client_id)
+
+    def synthesis_slot(self, priority: int = PRIORITY_NEW, client_id: str = ""):
+        """Hold while synthesizing one piece of text"""
+        return self.synthesis.slot(priority, client_id)
+
+    def get_stats(self) -> Dict:
+        return {
+            "active_sessions": self.admission.in_use,
+            "queued_sessions": self.admission.waiting,
+            "max_active_sessions": self.admission.limit,
+            "generations": {"running": self.generation.in_use, "waiting": self.generation.waiting},
+            "synthesis": {"running": self.synthesis.in_use, "waiting": self.synthesis.waiting},
+            "rejected": self.rejected,
+            "rate_limited": self.rate_limited,
+        }
+
+session_scheduler = SessionScheduler()
+
+metrics.registry.gauge("storyteller_scheduler_active_sessions", "Stories admitted and running",
+                       function=lambda: session_scheduler.admission.in_use)
+metrics.registry.gauge("storyteller_scheduler_queued_sessions", "Stories waiting for admission",
+                       function=lambda: session_scheduler.admission.waiting)
+metrics.registry.gauge("storyteller_scheduler_generation_queue", "Stories waiting for an LLM generation slot",
+                       function=lambda: session_scheduler.generation.waiting)
+metrics.registry.gauge("storyteller_scheduler_synthesis_queue", "Sentences waiting for a TTS synthesis slot",
+                       function=lambda: session_scheduler.synthesis.waiting)
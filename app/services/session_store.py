@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.core import metrics
+from app.services.state_backend import StateBackend, state_backend
+from app.services.text_coalescer import TextCoalescer, dumps
+
+logger = logging.getLogger(__name__)
+
+class SessionStoreFullError(Exception):
+    """Every stored session is busy streaming, so a new one can't be admitted"""
+    pass
+
+class StorySession:
+    """State of one websocket client: its connection, the story so far and per-story streaming objects.
+
+    The story text is kept as a list of chunks and joined on demand, so
+    appending an LLM chunk is O(1) instead of copying the whole story.
+    """
+
+    __slots__ = (
+        "client_id", "websocket", "created_at", "last_active",
+        "current_phase", "awaiting_interaction", "interaction_responses", "playing", "queued",
+        "send_lock", "text", "story_id", "story_started_at", "transcription", "resumable",
+        "output_stage", "framer", "flow",
+        "_story_parts", "_story_chars", "_story_bytes", "_story_cache"
+    )
+
+    def __init__(self, client_id: str, websocket: WebSocket):
+        self.client_id = client_id
+        self.websocket = websocket
+        self.created_at = self.last_active = time.monotonic()
+        self.current_phase: Optional[str] = None
+        self.awaiting_interaction = False
+        self.interaction_responses: asyncio.Queue = asyncio.Queue()
+        self.playing = False  # Audio already sent, so the scheduler serves this session first
+        self.queued = False  # Waiting for admission by the scheduler; pinned so it isn't evicted meanwhile
+        # One lock per session serializes sends from the story task and the text coalescer's timer
+        self.send_lock = asyncio.Lock()
+        self.text = TextCoalescer(self.write_json)
+        self.story_id: Optional[str] = None  # Id of the story being streamed, also its archive key
+        self.story_started_at: Optional[float] = None  # perf_counter() when the story was requested
+        self.transcription: Optional[str] = None  # The story's input so far, including the user's interactions
+        self.resumable = False  # Restored from a story that was waiting for the user after current_phase
+        self.output_stage = None
+        self.framer = None  # Set when the client asked for framed audio
+        self.flow = None
+        self._story_parts: List[str] = []
+        self._story_chars = 0
+        self._story_bytes = 0
+        self._story_cache: Optional[str] = None
+
+    async def write_json(self, message: Dict) -> None:
+        text = dumps(message)
+        size = len(text.encode("utf-8"))
+        start = time.perf_counter()
+        async with self.send_lock:
+            await self.websocket.send_text(text)
+        metrics.websocket_send_seconds.observe(time.perf_counter() - start, kind="text")
+        metrics.websocket_sent_bytes.inc(size, kind="text")
+        self.last_active = time.monotonic()
+
+    def touch(self) -> None:
+        self.last_active = time.monotonic()
+
+    def append_story(self, text: str) -> None:
+        self._story_parts.append(text)
+        self._story_chars += len(text)
+        self._story_bytes += sys.getsizeof(text)
+        self._story_cache = None
+
+    @property
+    def complete_story(self) -> str:
+        if self._story_cache is None:
+            self._story_cache = "".join(self._story_parts)
+            # Keep the joined string as the only chunk, so the text isn't held twice
+            self._story_parts = [self._story_cache] if self._story_cache else []
+            self._story_bytes = sys.getsizeof(self._story_cache) if self._story_cache else 0
+        return self._story_cache
+
+    @property
+    def story_length(self) -> int:
+        return self._story_chars
+
+    def reset_story(self) -> None:
+        """Forget the previous story's text and phase before a new one starts"""
+        self._story_parts = []
+        self._story_chars = 0
+        self._story_bytes = 0
+        self._story_cache = None
+        self.current_phase = None
+        self.transcription = None
+        self.resumable = False
+
+    def end_story(self) -> None:
+        """Drop the per-story streaming objects once a story finished or failed"""
+        self.output_stage = None
+        self.framer = None
+        self.flow = None
+        self.awaiting_interaction = False
+        self.touch()
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint: the session object, its story text and the chunk list"""
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self._story_parts)
+            + self._story_bytes
+            + self.text.buffered_bytes
+        )
+
+    @property
+    def busy(self) -> bool:
+        """Streaming a story right now or waiting to (and not just waiting on the user)"""
+        return self.queued or (self.output_stage is not None and not self.awaiting_interaction)
+
+    def close(self) -> None:
+        self.text.close()
+
+class SessionStore:
+    """Live story sessions by client id, bounded by count and idle time.
+
+    Sessions are kept in least-recently-used order. Sessions idle for longer
+    than the TTL are swept lazily whenever the store is used, and creating a
+    session beyond SESSION_STORE_MAX_SESSIONS evicts the least recently used
+    idle one. A session that is streaming a story is never expired or
+    evicted; when all of them are, creating one raises SessionStoreFullError.
+    Evicted sessions get their websocket closed.
+    
+    Each session is also saved to the state backend when a story fails or waits
+    for the user, and its record is deleted once a story completes. A client
+    that reconnects, to this or another worker, while its story was waiting
+    for the user gets that story back and can resume it after the saved phase.
+    Backend calls go through backend.run, so a SQLite backend doesn't block
+    the event loop.
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        backend: StateBackend = state_backend
+    ):
+        self.max_sessions = max_sessions or settings.SESSION_STORE_MAX_SESSIONS
+        self.ttl_seconds = ttl_seconds or settings.SESSION_STORE_TTL_SECONDS
+        self.backend = backend
+        self._sessions: "OrderedDict[str, StorySession]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+        self.expired = 0
+        self.evicted = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, client_id: str) -> bool:
+        return client_id in self._sessions
+
+    async def create(self, client_id: str, websocket: WebSocket) -> StorySession:
+        # Read before touching the store, so nothing below waits between checking for room and taking it
+        record = await self.backend.run(self.backend.get_session, client_id)
+        self._sweep()
+        self.remove(client_id)
+        while len(self._sessions) >= self.max_sessions:
+            victim = next((s for s in self._sessions.values() if not s.busy), None)
+            if victim is None:
+                self.rejected += 1
+                raise SessionStoreFullError("The server is full, please try again in a moment")
+            self._evict(victim)
+            self.evicted += 1
+            logger.info("Session store full, evicted session %s", victim.client_id)
+        session = StorySession(client_id, websocket)
+        if record is not None and record.get("awaiting_interaction") and record.get("phase"):
+            # The client left while its story waited for the user, on this or another worker
+            session.current_phase = record["phase"]
+            session.story_id = record.get("story_id")
+            session.transcription = record.get("transcription") or ""
+            session.append_story(record.get("story") or "")
+            session.resumable = True
+        self._sessions[client_id] = session
+        return session
+
+    async def save(self, session: StorySession) -> None:
+        """Write the session to the state backend"""
+        record = {
+            "worker": os.getpid(),
+            "phase": session.current_phase,
+            "story_id": session.story_id,
+            "story": session.complete_story,
+            "transcription": session.transcription,
+            "awaiting_interaction": session.awaiting_interaction,
+        }
+        try:
+            await self.backend.run(self.backend.put_session, session.client_id, record)
+        except Exception as e:
+            logger.error("Failed to save session %s: %s", session.client_id, e)
+
+    async def forget(self, session: StorySession) -> None:
+        """Delete the session's record from the state backend, once its story completed"""
+        try:
+            await self.backend.run(self.backend.delete_session, session.client_id)
+        except Exception as e:
+            logger.error("Failed to delete session %s: %s", session.client_id, e)
+
+    def get(self, client_id: str) -> Optional[StorySession]:
+        self._sweep()
+        session = self._sessions.get(client_id)
+        if session is not None:
+            session.touch()
+            self._sessions.move_to_end(client_id)
+        return session
+
+    def remove(self, client_id: str) -> None:
+        session = self._sessions.pop(client_id, None)
+        if session is not None:
+            session.close()
+
+    def _evict(self, session: StorySession) -> None:
+        self.remove(session.client_id)
+
+        async def close_connection():
+            try:
+                await session.websocket.close(code=1001, reason="Session expired")
+            except Exception:
+                pass  # Already closed
+        asyncio.ensure_future(close_connection())
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        if now - self._last_sweep < settings.SESSION_STORE_SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        for session in list(self._sessions.values()):
+            if session.busy or now - session.last_active < self.ttl_seconds:
+                continue
+            self._evict(session)
+            self.expired += 1
+            logger.info("Session %s expired after %.0fs idle", session.client_id, now - session.last_active)
+
+    def memory_bytes(self) -> int:
+        return sum(session.memory_bytes() for session in self._sessions.values())
+
+    async def get_stats(self) -> Dict:
+        records = await self.backend.run(self.backend.list_sessions)
+        now = time.monotonic()
+        sessions = [
+            {
+                "client_id": session.client_id,
+                "age_seconds": round(now - session.created_at, 1),
+                "idle_seconds": round(now - session.last_active, 1),
+                "phase": session.current_phase,
+                "streaming": session.output_stage is not None,
+                "awaiting_interaction": session.awaiting_interaction,
+                "story_chars": session.story_length,
+                "memory_bytes": session.memory_bytes(),
+            }
+            for session in reversed(self._sessions.values())
+        ]
+        return {
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "memory_bytes": sum(s["memory_bytes"] for s in sessions),
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "rejected": self.rejected,
+            "details": sessions,
+            # Sessions saved by any worker, from the state backend
+            "all_workers": [
+                {
+                    "client_id": record["client_id"],
+                    "worker": record.get("worker"),
+                    "phase": record.get("phase"),
+                    "story_chars": len(record.get("story") or ""),
+                    "awaiting_interaction": record.get("awaiting_interaction", False),
+                    "updated": record["updated"],
+                }
+                for record in records
+            ],
+        }
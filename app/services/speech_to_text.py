@@ -2,8 +2,15 @@ import torch
 from transformers import WhisperProcessor, WhisperForConditionalGeneration
 from pydantic import BaseModel, validator
 from app.core.config import settings
+from app.core import metrics
+from app.core.profiling import torch_capture
 from app.core.languages import LANGUAGE_TO_ISO, DEFAULT_LANGUAGE
-from typing import Dict, Optional
+from app.services.whisper_features import LogMelFeatureExtractor
+from typing import Dict, List, Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 class AudioInput(BaseModel):
     array: list
@@ -22,6 +29,7 @@ class SpeechToTextService:
     def __init__(self):
         self.processor: Optional[WhisperProcessor] = None
         self.model: Optional[WhisperForConditionalGeneration] = None
+        self.feature_extractor: Optional[LogMelFeatureExtractor] = None
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         
     def initialize(self):
@@ -29,7 +37,7 @@ class SpeechToTextService:
         if self.processor is not None:
             return  # Already initialized
             
-        print(f"Initializing Whisper model {settings.WHISPER_MODEL} on {self.device}")
+        logger.info("Initializing Whisper model %s on %s", settings.WHISPER_MODEL, self.device)
         
         self.processor = WhisperProcessor.from_pretrained(settings.WHISPER_MODEL)
         self.model = WhisperForConditionalGeneration.from_pretrained(
@@ -39,37 +47,56 @@ class SpeechToTextService:
             torch_dtype=torch.float16,
             low_cpu_mem_usage=True
         )
-        print("Whisper model initialized successfully")
+        self.feature_extractor = LogMelFeatureExtractor(self.processor.feature_extractor, self.device)
+        logger.info("Whisper model initialized successfully")
 
     async def transcribe(self, audio: AudioInput) -> str:
+        transcriptions = await self.transcribe_batch([audio])
+        return transcriptions[0]
+
+    async def transcribe_batch(self, audios: List[AudioInput]) -> List[str]:
+        """Transcribe several clips, running one generate call per language."""
         if self.processor is None or self.model is None:
             raise RuntimeError("SpeechToTextService not initialized. Call initialize() first.")
             
-        if not audio.array or len(audio.array) == 0:
-            raise ValueError("Empty audio input received. Please provide valid audio data.")
-            
-        language_code = LANGUAGE_TO_ISO.get(audio.language, audio.language)
+        for audio in audios:
+            if not audio.array or len(audio.array) == 0:
+                raise ValueError("Empty audio input received. Please provide valid audio data.")
+            if audio.sampling_rate != self.feature_extractor.sampling_rate:
+                raise ValueError(f"Audio must be sampled at {self.feature_extractor.sampling_rate} Hz, got {audio.sampling_rate} Hz")
         
-        forced_decoder_ids = self.processor.get_decoder_prompt_ids(language=language_code, task="transcribe")
-        self.model.config.forced_decoder_ids = forced_decoder_ids
-        
-        input_features = self.processor(
-            audio.array, 
-            sampling_rate=audio.sampling_rate, 
-            return_tensors="pt"
-        ).input_features.to(device=self.device, dtype=torch.float16)
-
-        # Create attention mask
-        attention_mask = torch.ones_like(input_features)
+        start = time.perf_counter()
+        # Forced decoder ids are set on the model config, so each language is its own batch
+        by_language: Dict[str, List[int]] = {}
+        for i, audio in enumerate(audios):
+            language_code = LANGUAGE_TO_ISO.get(audio.language, audio.language)
+            by_language.setdefault(language_code, []).append(i)
         
-        # Generate with proper language settings
-        predicted_ids = self.model.generate(
-            input_features,
-            attention_mask=attention_mask,
-            temperature=0.0
-        )
+        transcriptions: List[str] = [""] * len(audios)
+        for language_code, indices in by_language.items():
+            forced_decoder_ids = self.processor.get_decoder_prompt_ids(language=language_code, task="transcribe")
+            self.model.config.forced_decoder_ids = forced_decoder_ids
+            
+            input_features = self.feature_extractor(
+                [audios[i].array for i in indices],
+                dtype=torch.float16
+            )
+            
+            # Generate with proper language settings
+            with torch_capture.capture("whisper"):
+                predicted_ids = self.model.generate(
+                    input_features,
+                    temperature=0.0
+                )
+            
+            decoded = self.processor.batch_decode(predicted_ids, skip_special_tokens=True)
+            for i, text in zip(indices, decoded):
+                transcriptions[i] = text.strip()
         
-        transcription = self.processor.batch_decode(predicted_ids, skip_special_tokens=True)
-        return transcription[0].strip()
+        elapsed = time.perf_counter() - start
+        audio_seconds = sum(len(audio.array) / audio.sampling_rate for audio in audios)
+        metrics.stt_seconds.observe(elapsed)
+        metrics.stt_real_time_factor.observe(elapsed / audio_seconds)
+        return transcriptions
 
 speech_to_text_service = SpeechToTextService()
\ No newline at end of file
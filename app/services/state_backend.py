@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.history_store import HistoryStore
+
+logger = logging.getLogger(__name__)
+
+# Key for the language used by clients that haven't picked their own
+DEFAULT_LANGUAGE_KEY = "__default__"
+
+class StateBackend(ABC):
+    """Where state shared by all API workers lives: story history, per-client
+    language and a record of each story session.
+
+    Websockets themselves stay in the worker that accepted them; the session
+    record lets any worker see a session and lets a client that reconnects to
+    another worker continue its story.
+    """
+
+    # Whether calls wait on disk, so async code should make them through run()
+    blocking = False
+
+    async def run(self, call: Callable[..., Any], *args) -> Any:
+        """Make a backend call (or a function of several) from async code: in a worker thread when the backend blocks"""
+        if self.blocking:
+            return await asyncio.to_thread(call, *args)
+        return call(*args)
+
+    # Per-client language
+    @abstractmethod
+    def get_language(self, client_id: Optional[str] = None) -> Optional[str]:
+        """The client's language, or the shared default when client_id is None"""
+        pass
+
+    @abstractmethod
+    def set_language(self, language: str, client_id: Optional[str] = None) -> None:
+        pass
+
+    # Story history
+    @abstractmethod
+    def add_story(self, record: Dict) -> None:
+        """Store a finished story: story_id, transcription, story, language, timestamp (ISO) and client_id"""
+        pass
+
+    @abstractmethod
+    def get_recent_stories(
+        self,
+        limit: int = 5,
+        client_id: Optional[str] = None,
+        language: Optional[str] = None,
+        before_id: Optional[int] = None
+    ) -> List[Dict]:
+        """Most recent stories first, each with its "id"; filtered by client and/or language,
+        and older than before_id to fetch the next page"""
+        pass
+
+    @abstractmethod
+    def clear_history(self) -> None:
+        pass
+
+    # Story sessions
+    @abstractmethod
+    def put_session(self, client_id: str, record: Dict) -> None:
+        pass
+
+    @abstractmethod
+    def get_session(self, client_id: str) -> Optional[Dict]:
+        """The session record, unless it wasn't updated within SESSION_STORE_TTL_SECONDS"""
+        pass
+
+    @abstractmethod
+    def list_sessions(self) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    def delete_session(self, client_id: str) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+class MemoryStateBackend(StateBackend):
+    """Keeps everything in this process. Fine for a single worker."""
+
+    def __init__(self):
+        self._languages: Dict[str, str] = {}
+        self._history = HistoryStore()
+        self._sessions: Dict[str, Dict] = {}
+
+    def get_language(self, client_id: Optional[str] = None) -> Optional[str]:
+        return self._languages.get(client_id or DEFAULT_LANGUAGE_KEY)
+
+    def set_language(self, language: str, client_id: Optional[str] = None) -> None:
+        self._languages[client_id or DEFAULT_LANGUAGE_KEY] = language
+
+    def add_story(self, record: Dict) -> None:
+        self._history.add(record)
+
+    def get_recent_stories(
+        self,
+        limit: int = 5,
+        client_id: Optional[str] = None,
+        language: Optional[str] = None,
+        before_id: Optional[int] = None
+    ) -> List[Dict]:
+        return self._history.recent(limit, client_id, language, before_id)
+
+    def clear_history(self) -> None:
+        self._history.clear()
+
+    def put_session(self, client_id: str, record: Dict) -> None:
+        self._sessions[client_id] = {**record, "client_id": client_id, "updated": time.time()}
+
+    def _expire_sessions(self) -> None:
+        cutoff = time.time() - settings.SESSION_STORE_TTL_SECONDS
+        for client_id in [c for c, r in self._sessions.items() if r["updated"] < cutoff]:
+            del self._sessions[client_id]
+
+    def get_session(self, client_id: str) -> Optional[Dict]:
+        self._expire_sessions()
+        return self._sessions.get(client_id)
+
+    def list_sessions(self) -> List[Dict]:
+        self._expire_sessions()
+        return list(self._sessions.values())
+
+    def delete_session(self, client_id: str) -> None:
+        self._sessions.pop(client_id, None)
+
+class SQLiteStateBackend(StateBackend):
+    """Shares state between worker processes on one machine through a SQLite
+    database in WAL mode, so readers never wait for the single writer.
+    """
+
+    blocking = True
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or settings.STATE_SQLITE_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints, no fsync per write
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS languages (
+                client_id TEXT PRIMARY KEY,
+                language TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS stories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                client_id TEXT,
+                language TEXT NOT NULL,
+                transcription TEXT NOT NULL,
+                story TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                story_id TEXT
+            );
+            CREATE TABLE IF NOT EXISTS sessions (
+                client_id TEXT PRIMARY KEY,
+                record TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS stories_client ON stories (client_id, id);
+            CREATE INDEX IF NOT EXISTS stories_language ON stories (language, id);
+            CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+        """)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(stories)")}
+        if "story_id" not in columns:
+            # Databases created before stories had a story_id
+            self._conn.execute("ALTER TABLE stories ADD COLUMN story_id TEXT")
+        logger.info("Using SQLite state backend at %s (pid %d)", self.path, os.getpid())
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get_language(self, client_id: Optional[str] = None) -> Optional[str]:
+        rows = self._execute("SELECT language FROM languages WHERE client_id = ?", (client_id or DEFAULT_LANGUAGE_KEY,))
+        return rows[0]["language"] if rows else None
+
+    def set_language(self, language: str, client_id: Optional[str] = None) -> None:
+        self._execute(
+            "INSERT INTO languages (client_id, language) VALUES (?, ?) "
+            "ON CONFLICT (client_id) DO UPDATE SET language = excluded.language",
+            (client_id or DEFAULT_LANGUAGE_KEY, language)
+        )
+
+    def add_story(self, record: Dict) -> None:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO stories (client_id, language, transcription, story, timestamp, story_id) VALUES (?, ?, ?, ?, ?, ?)",
+                (record.get("client_id"), record["language"], record["transcription"], record["story"], record["timestamp"], record.get("story_id"))
+            )
+            # Ids only grow, so everything at or below this one is past the retention cap
+            self._conn.execute("DELETE FROM stories WHERE id <= ?", (cursor.lastrowid - settings.HISTORY_MAX_STORIES,))
+
+    def get_recent_stories(
+        self,
+        limit: int = 5,
+        client_id: Optional[str] = None,
+        language: Optional[str] = None,
+        before_id: Optional[int] = None
+    ) -> List[Dict]:
+        conditions, params = [], []
+        if client_id is not None:
+            conditions.append("client_id = ?")
+            params.append(client_id)
+        if language is not None:
+            conditions.append("language = ?")
+            params.append(language)
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._execute(
+            f"SELECT id, story_id, client_id, language, transcription, story, timestamp FROM stories {where} ORDER BY id DESC LIMIT ?",
+            (*params, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def clear_history(self) -> None:
+        self._execute("DELETE FROM stories")
+
+    def put_session(self, client_id: str, record: Dict) -> None:
+        self._execute(
+            "INSERT INTO sessions (client_id, record, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT (client_id) DO UPDATE SET record = excluded.record, updated = excluded.updated",
+            (client_id, json.dumps(record), time.time())
+        )
+
+    def _expire_sessions(self) -> None:
+        self._execute("DELETE FROM sessions WHERE updated < ?", (time.time() - settings.SESSION_STORE_TTL_SECONDS,))
+
+    def get_session(self, client_id: str) -> Optional[Dict]:
+        self._expire_sessions()
+        rows = self._execute("SELECT record, updated FROM sessions WHERE client_id = ?", (client_id,))
+        if not rows:
+            return None
+        return {**json.loads(rows[0]["record"]), "client_id": client_id, "updated": rows[0]["updated"]}
+
+    def list_sessions(self) -> List[Dict]:
+        self._expire_sessions()
+        rows = self._execute("SELECT client_id, record, updated FROM sessions ORDER BY updated DESC")
+        return [{**json.loads(row["record"]), "client_id": row["client_id"], "updated": row["updated"]} for row in rows]
+
+    def delete_session(self, client_id: str) -> None:
+        self._execute("DELETE FROM sessions WHERE client_id = ?", (client_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def create_state_backend(backend_type: Optional[str] = None) -> StateBackend:
+    backend_type = backend_type or settings.STATE_BACKEND
+    if backend_type == "sqlite":
+        return SQLiteStateBackend()
+    if backend_type == "memory":
+        return MemoryStateBackend()
+    raise ValueError(f"Unknown state backend: {backend_type}")
+
+state_backend = create_state_backend()
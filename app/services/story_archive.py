@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+class StoryArchive:
+    """Every finished story, kept across restarts in SQLite.
+
+    Story text is stored zlib-compressed; transcriptions and stories are
+    indexed in a contentless FTS5 table, so the index doesn't hold a second
+    copy of the text. Writes are queued and committed in batches by a
+    background task, so add() never touches the disk on the event loop.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or settings.ARCHIVE_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Separate connections so searches don't wait behind a batch being written
+        self._write_conn = self._connect()
+        self._read_conn = self._connect()
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._write_conn.executescript("""
+            CREATE TABLE IF NOT EXISTS stories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                story_id TEXT NOT NULL UNIQUE,
+                client_id TEXT,
+                language TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                transcription TEXT NOT NULL,
+                story_z BLOB NOT NULL,
+                story_chars INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS stories_language ON stories (language, id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS stories_fts USING fts5(
+                transcription, story, content='', tokenize='unicode61 remove_diacritics 2'
+            );
+        """)
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self.written = 0
+        self.batches = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # Writing
+
+    def add(self, record: Dict) -> None:
+        """Queue a story for archiving. Written synchronously when there is no running event loop (CLI tools)."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_batch([record])
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._writer is None or self._writer.done():
+            self._writer = loop.create_task(self._write_loop())
+        self._queue.put_nowait(record)
+
+    async def _write_loop(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + settings.ARCHIVE_FLUSH_INTERVAL_MS / 1000
+            # Gather whatever arrives within the flush interval, up to a batch
+            while len(batch) < settings.ARCHIVE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # asyncio.wait rather than wait_for, which can swallow the cancellation from close()
+                getter = asyncio.ensure_future(self._queue.get())
+                try:
+                    done, _ = await asyncio.wait({getter}, timeout=remaining)
+                finally:
+                    if not getter.done():
+                        getter.cancel()
+                if not done:
+                    break
+                batch.append(getter.result())
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                logger.error("Failed to archive %d stories: %s", len(batch), e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch: List[Dict]) -> None:
+        rows = [
+            (
+                record["story_id"], record.get("client_id"), record["language"], record["timestamp"],
+                record["transcription"],
+                zlib.compress(record["story"].encode("utf-8"), settings.ARCHIVE_COMPRESSION_LEVEL),
+                len(record["story"])
+            )
+            for record in batch
+        ]
+        with self._write_lock:
+            self._write_conn.execute("BEGIN")
+            try:
+                for row, record in zip(rows, batch):
+                    cursor = self._write_conn.execute(
+                        "INSERT OR IGNORE INTO stories (story_id, client_id, language, timestamp, transcription, story_z, story_chars) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        row
+                    )
+                    if cursor.rowcount:
+                        self._write_conn.execute(
+                            "INSERT INTO stories_fts (rowid, transcription, story) VALUES (?, ?, ?)",
+                            (cursor.lastrowid, record["transcription"], record["story"])
+                        )
+                self._write_conn.execute("COMMIT")
+            except Exception:
+                self._write_conn.execute("ROLLBACK")
+                raise
+        self.written += len(batch)
+        self.batches += 1
+
+    async def flush(self) -> None:
+        """Wait until every queued story is written"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._writer is not None:
+            self._writer.cancel()
+        with self._write_lock:
+            self._write_conn.close()
+        with self._read_lock:
+            self._read_conn.close()
+
+    # Reading (blocking; call through asyncio.to_thread from async code)
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._read_lock:
+            return self._read_conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row, include_story: bool = True) -> Dict:
+        record = {
+            "id": row["id"],
+            "story_id": row["story_id"],
+            "client_id": row["client_id"],
+            "language": row["language"],
+            "timestamp": row["timestamp"],
+            "transcription": row["transcription"],
+            "story_chars": row["story_chars"],
+        }
+        if include_story:
+            record["story"] = zlib.decompress(row["story_z"]).decode("utf-8")
+        return record
+
+    def recent(self, limit: int = 20, before_id: Optional[int] = None, language: Optional[str] = None) -> List[Dict]:
+        """Newest first; pass the last id of a page as before_id for the next one"""
+        conditions, params = [], []
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+        if language is not None:
+            conditions.append("language = ?")
+            params.append(language)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._query(f"SELECT * FROM stories {where} ORDER BY id DESC LIMIT ?", (*params, limit))
+        return [self._to_dict(row) for row in rows]
+
+    def get(self, story_id: str) -> Optional[Dict]:
+        rows = self._query("SELECT * FROM stories WHERE story_id = ?", (story_id,))
+        return self._to_dict(rows[0]) if rows else None
+
+    def search(self, query: str, limit: int = 20, offset: int = 0, language: Optional[str] = None) -> Dict:
+        """Full-text search over transcriptions and stories, best matches first.
+
+        The query uses FTS5 syntax (words, "phrases", OR, NOT, prefix*);
+        invalid syntax raises sqlite3.OperationalError.
+        """
+        language_filter = "AND s.language = ?" if language else ""
+        params = (query, language) if language else (query,)
+        rows = self._query(
+            f"SELECT s.*, bm25(stories_fts) AS rank FROM stories_fts "
+            f"JOIN stories s ON s.id = stories_fts.rowid "
+            f"WHERE stories_fts MATCH ? {language_filter} ORDER BY rank LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        )
+        total = self._query(
+            f"SELECT COUNT(*) FROM stories_fts JOIN stories s ON s.id = stories_fts.rowid "
+            f"WHERE stories_fts MATCH ? {language_filter}",
+            params
+        )[0][0]
+        return {
+            "total": total,
+            "offset": offset,
+            "results": [self._to_dict(row) for row in rows],
+        }
+
+    def get_stats(self) -> Dict:
+        row = self._query("SELECT COUNT(*) AS stories, COALESCE(SUM(story_chars), 0) AS chars, "
+                          "COALESCE(SUM(LENGTH(story_z)), 0) AS compressed FROM stories")[0]
+        return {
+            "stories": row["stories"],
+            "story_chars": row["chars"],
+            "compressed_bytes": row["compressed"],
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written_this_run": self.written,
+            "batches_this_run": self.batches,
+        }
+
+_archive: Optional[StoryArchive] = None
+
+def get_story_archive() -> Optional[StoryArchive]:
+    """The shared archive, opened (and its database created) on first use; None when ARCHIVE_ENABLED is off"""
+    global _archive
+    if _archive is None and settings.ARCHIVE_ENABLED:
+        _archive = StoryArchive()
+    return _archive
+
+async def close_story_archive() -> None:
+    """Write out queued stories and close the archive, if it was opened"""
+    global _archive
+    if _archive is not None:
+        archive, _archive = _archive, None
+        await archive.close()
+
+metrics.registry.gauge(
+    "storyteller_archive_write_queue", "Stories waiting to be written to the archive",
+    function=lambda: _archive._queue.qsize() if _archive is not None and _archive._queue is not None else 0)
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import soundfile as sf
+
+from app.core.config import settings
+from app.services.audio_output import StreamingResampler
+
+# libsndfile format, subtype and media type for each archive format
+STORY_AUDIO_FORMATS = {
+    "ogg": ("OGG", "VORBIS", "audio/ogg"),
+    "flac": ("FLAC", "PCM_16", "audio/flac"),
+}
+
+# Story ids are uuid4 hex; anything else never names a file
+_STORY_ID = re.compile(r"^[0-9a-f]{32}$")
+
+def story_audio_path(story_id: str, audio_format: Optional[str] = None) -> Optional[Path]:
+    """Where a story's finished audio is (or would be) stored, or None for an invalid story id"""
+    if not _STORY_ID.match(story_id):
+        return None
+    return Path(settings.AUDIO_OUTPUT_DIR) / f"{story_id}.{audio_format or settings.STORY_AUDIO_FORMAT}"
+
+def story_audio_media_type(audio_format: Optional[str] = None) -> str:
+    return STORY_AUDIO_FORMATS[audio_format or settings.STORY_AUDIO_FORMAT][2]
+
+class StoryAudioWriter:
+    """Writes a story's audio, as sent to the client, into one compressed file.
+
+    write() is called with each chunk of int16 PCM from the AudioOutputStage
+    and only queues it; a background task encodes and appends the chunks in
+    order off the event loop. The file is written as <name>.part and renamed
+    by finish(), so a file at the final path is always complete.
+
+    A story interrupted while waiting for the user keeps its audio so far as
+    <name>.paused (suspend()); the writer of the resumed run (resume=True)
+    starts its file with that audio, so the finished file holds all of it.
+    """
+
+    def __init__(
+        self,
+        story_id: str,
+        sample_rate: int,
+        audio_format: Optional[str] = None,
+        path: Optional[Path] = None,
+        resume: bool = False
+    ):
+        self.audio_format = audio_format or settings.STORY_AUDIO_FORMAT
+        # Stories go to AUDIO_OUTPUT_DIR unless the caller picks the file
+        self.path = Path(path) if path is not None else story_audio_path(story_id, self.audio_format)
+        if self.path is None:
+            raise ValueError(f"Invalid story id: {story_id}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._part_path = self.path.with_name(self.path.name + ".part")
+        self._paused_path = self.path.with_name(self.path.name + ".paused")
+        container, subtype, _ = STORY_AUDIO_FORMATS[self.audio_format]
+        self._file = sf.SoundFile(
+            self._part_path, mode="w", samplerate=sample_rate, channels=1,
+            format=container, subtype=subtype
+        )
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.samples = 0
+        self.finished = False
+        self._task = asyncio.ensure_future(self._write_loop(resume))
+
+    def write(self, pcm: np.ndarray) -> None:
+        # Copied because the caller's buffer may be reused
+        self._queue.put_nowait(pcm.copy())
+        self.samples += pcm.size
+
+    def _copy_paused(self) -> None:
+        """Write the audio of the interrupted run first, resampled if this run's rate differs"""
+        if not self._paused_path.exists():
+            return
+        with sf.SoundFile(self._paused_path) as paused:
+            resampler = StreamingResampler(paused.samplerate, self._file.samplerate)
+            for block in paused.blocks(blocksize=65536, dtype="int16"):
+                if not resampler.passthrough:
+                    block = np.clip(np.round(resampler.process(block.astype(np.float32))), -32768, 32767).astype(np.int16)
+                self._file.write(block)
+                self.samples += block.size
+        self._paused_path.unlink()
+
+    async def _write_loop(self, resume: bool) -> None:
+        if resume:
+            await asyncio.to_thread(self._copy_paused)
+        while True:
+            pcm = await self._queue.get()
+            if pcm is None:
+                return
+            # Take everything already queued so one thread hop encodes several chunks
+            chunks = [pcm]
+            while not self._queue.empty():
+                chunks.append(self._queue.get_nowait())
+            done = chunks[-1] is None
+            chunks = [c for c in chunks if c is not None]
+            await asyncio.to_thread(self._file.write, np.concatenate(chunks))
+            if done:
+                return
+
+    async def _close(self) -> None:
+        self.finished = True
+        self._queue.put_nowait(None)
+        try:
+            await self._task
+        finally:
+            await asyncio.to_thread(self._file.close)
+
+    async def finish(self) -> Optional[Path]:
+        """Write the remaining audio and publish the file; returns its path, or None if there was no audio"""
+        try:
+            await self._close()
+        except Exception:
+            self._part_path.unlink(missing_ok=True)
+            raise
+        if not self.samples:
+            self._part_path.unlink(missing_ok=True)
+            return None
+        os.replace(self._part_path, self.path)
+        return self.path
+
+    async def suspend(self) -> None:
+        """Keep the audio of a story interrupted while waiting for the user, for its resumed run"""
+        try:
+            await self._close()
+        except Exception:
+            self._part_path.unlink(missing_ok=True)
+            raise
+        if self.samples:
+            os.replace(self._part_path, self._paused_path)
+        else:
+            self._part_path.unlink(missing_ok=True)
+
+    async def abort(self) -> None:
+        """Drop the partial file of a story that didn't finish"""
+        try:
+            await self._close()
+        except Exception:
+            pass  # The file is discarded anyway
+        self._part_path.unlink(missing_ok=True)
@@ -0,0 +1,89 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+try:
+    import orjson
+
+    def dumps(message: Dict) -> str:
+        """Serialize a websocket message; orjson is several times faster than json for these small dicts"""
+        return orjson.dumps(message).decode("utf-8")
+except ImportError:
+    import json
+
+    def dumps(message: Dict) -> str:
+        """Serialize a websocket message"""
+        return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+class TextCoalescer:
+    """Batches LLM text deltas into fewer websocket text messages.
+
+    Deltas are buffered and sent as one {"type": "text"} message when
+    window_ms has passed since the first buffered delta, when the buffer
+    reaches max_bytes, when the phase changes, or when flush() is called
+    (which the caller does before sending anything else, so ordering with
+    audio and status messages is kept).
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Dict], Awaitable[None]],
+        window_ms: Optional[int] = None,
+        max_bytes: Optional[int] = None
+    ):
+        self._send = send
+        self.window = (window_ms if window_ms is not None else settings.WS_TEXT_COALESCE_MS) / 1000
+        self.max_bytes = max_bytes if max_bytes is not None else settings.WS_TEXT_COALESCE_MAX_BYTES
+        self._parts: List[str] = []
+        self._size = 0
+        self._phase: Optional[str] = None
+        self._timer: Optional[asyncio.Task] = None
+        self.deltas_in = 0
+        self.messages_out = 0
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._size
+
+    async def add(self, content: str, phase: Optional[str]) -> None:
+        if not content:
+            return
+        if self._parts and phase != self._phase:
+            await self.flush()
+        self._parts.append(content)
+        self._size += len(content.encode("utf-8"))
+        self._phase = phase
+        self.deltas_in += 1
+
+        if self.window <= 0 or self._size >= self.max_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        self._timer = None
+        await self._send_buffered()
+
+    async def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self._send_buffered()
+
+    async def _send_buffered(self) -> None:
+        if not self._parts:
+            return
+        # Take the buffer before awaiting, so deltas added meanwhile go into the next message
+        content, phase = "".join(self._parts), self._phase
+        self._parts, self._size = [], 0
+        self.messages_out += 1
+        await self._send({"type": "text", "content": content, "phase": phase})
+
+    def close(self) -> None:
+        """Drop anything still buffered, for a session that is going away"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._parts, self._size = [], 0
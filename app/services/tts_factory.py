@@ -1,8 +1,14 @@
+import asyncio
+import logging
+import threading
 from typing import Dict, Optional, Type
 from app.core.config import settings
 from app.services.tts_service import TTSService
 from app.services.kokoro_tts_service import KokoroTTSService
 from app.services.google_tts_service import GoogleTextToSpeechService
+from app.services.fake_tts_service import FakeTTSService
+
+logger = logging.getLogger(__name__)
 
 class TTSFactory:
     """Factory for creating and managing TTS service instances"""
@@ -10,26 +16,93 @@ class TTSFactory:
     _services: Dict[str, Type[TTSService]] = {
         "kokoro": KokoroTTSService,
         "google": GoogleTextToSpeechService,
+        "fake": FakeTTSService,
     }
     
     _instances: Dict[str, TTSService] = {}
+    _loading: Dict[str, threading.Event] = {}
+    _lock = threading.Lock()
     
     @classmethod
     def get_service(cls, service_name: Optional[str] = None) -> TTSService:
         """Get or create a TTS service instance"""
         service_name = service_name or settings.TTS_SERVICE
-        print(f"Using TTS service: {service_name} (configured: {settings.TTS_SERVICE})")
         
         if service_name not in cls._services:
             raise ValueError(f"Unknown TTS service: {service_name}")
         
-        if service_name not in cls._instances:
-            cls._instances[service_name] = cls._services[service_name]()
+        return cls._get_or_create(service_name)
+
+    @classmethod
+    def _get_or_create(cls, service_name: str) -> TTSService:
+        """Create a service once, making concurrent callers wait for the same load"""
+        with cls._lock:
+            instance = cls._instances.get(service_name)
+            if instance is not None:
+                return instance
+            event = cls._loading.get(service_name)
+            is_loader = event is None
+            if is_loader:
+                event = threading.Event()
+                cls._loading[service_name] = event
+        
+        if not is_loader:
+            event.wait()
+            with cls._lock:
+                instance = cls._instances.get(service_name)
+            if instance is None:
+                raise RuntimeError(f"TTS service {service_name} failed to load")
+            return instance
+        
+        try:
+            instance = cls._services[service_name]()
+            with cls._lock:
+                cls._instances[service_name] = instance
+            logger.info("Loaded TTS service %s", service_name)
+            return instance
+        finally:
+            with cls._lock:
+                cls._loading.pop(service_name, None)
+            event.set()
+
+    @classmethod
+    def warmup(cls, service_name: Optional[str] = None) -> threading.Thread:
+        """Load a service in the background so the first story doesn't pay for it"""
+        service_name = service_name or settings.TTS_SERVICE
+        
+        def load():
+            try:
+                cls._get_or_create(service_name)
+                logger.info("TTS service %s ready", service_name)
+            except Exception as e:
+                logger.error("Failed to preload TTS service %s: %s", service_name, e)
         
-        return cls._instances[service_name]
+        thread = threading.Thread(target=load, name=f"tts-warmup-{service_name}", daemon=True)
+        thread.start()
+        return thread
+
+    @classmethod
+    async def ensure_ready(cls, service_name: Optional[str] = None) -> TTSService:
+        """Wait for a service without blocking the event loop, loading it if nobody has yet"""
+        service_name = service_name or settings.TTS_SERVICE
+        if service_name not in cls._services:
+            raise ValueError(f"Unknown TTS service: {service_name}")
+        instance = cls._instances.get(service_name)
+        if instance is not None:
+            return instance
+        return await asyncio.get_running_loop().run_in_executor(None, cls._get_or_create, service_name)
+
+    @classmethod
+    def is_ready(cls, service_name: Optional[str] = None) -> bool:
+        instance = cls._instances.get(service_name or settings.TTS_SERVICE)
+        return instance is not None and instance.is_ready
 
     @classmethod
     def reset(cls):
         """Reset all service instances. Call this when configuration changes."""
-        cls._instances = {}
+        with cls._lock:
+            instances = list(cls._instances.values())
+            cls._instances = {}
+        for instance in instances:
+            instance.close()
 tts_factory = TTSFactory()
@@ -2,7 +2,13 @@ from abc import ABC, abstractmethod
 from typing import AsyncGenerator, Optional
 
 class TTSService(ABC):
-    """Base class for Text-to-Speech services"""
+    """Base class for Text-to-Speech services.
+    
+    convert_text_to_speech yields raw 16-bit mono PCM at `sample_rate`; the
+    audio output stage resamples and encodes it for each client.
+    """
+    
+    sample_rate: int = 16000
     
     @abstractmethod
     async def convert_text_to_speech(
@@ -17,4 +23,13 @@ class TTSService(ABC):
     @abstractmethod
     def _chunk_text(self, text: str, max_chars: Optional[int] = None) -> list[str]:
         """Split text into manageable chunks for processing"""
-        pass 
\ No newline at end of file
+        pass
+    
+    @property
+    def is_ready(self) -> bool:
+        """Whether the service can synthesize right away"""
+        return True
+    
+    def close(self) -> None:
+        """Release resources held by the service. Called when services are reset."""
+        pass
@@ -0,0 +1,111 @@
+import numpy as np
+from typing import Optional, Dict, Any
+from app.core.config import settings
+
+class EnergyVAD:
+    """Energy based voice activity detector for 16-bit mono PCM blocks.
+
+    Blocks are fed as they are captured. The detector tracks where speech starts
+    and ends (in samples) so the recording can be trimmed, and flags when enough
+    silence followed the speech to stop the recording automatically.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        threshold_db: Optional[float] = None,
+        min_speech_ms: Optional[int] = None,
+        padding_ms: Optional[int] = None,
+        auto_stop_silence_ms: Optional[int] = None
+    ):
+        self.sample_rate = sample_rate
+        self.threshold_db = settings.VAD_ENERGY_THRESHOLD_DB if threshold_db is None else threshold_db
+        self.min_speech_samples = self._ms_to_samples(settings.VAD_MIN_SPEECH_MS if min_speech_ms is None else min_speech_ms)
+        self.padding_samples = self._ms_to_samples(settings.VAD_PADDING_MS if padding_ms is None else padding_ms)
+        auto_stop_ms = settings.VAD_AUTO_STOP_SILENCE_MS if auto_stop_silence_ms is None else auto_stop_silence_ms
+        self.auto_stop_samples = self._ms_to_samples(auto_stop_ms) if auto_stop_ms > 0 else None
+
+        self.total_samples = 0
+        self.speech_samples = 0
+        self.speech_segments = 0
+        self.speech_start: Optional[int] = None  # First sample of the first utterance
+        self.speech_end: Optional[int] = None  # Last sample of the latest utterance
+        self._run_start: Optional[int] = None  # Start of the current run of speech blocks
+        self._run_samples = 0
+        self._in_speech = False
+
+    def _ms_to_samples(self, ms: int) -> int:
+        return int(self.sample_rate * ms / 1000)
+
+    def _samples_to_ms(self, samples: int) -> int:
+        return int(samples * 1000 / self.sample_rate)
+
+    def process(self, block: bytes) -> bool:
+        """Classify a block of audio and update the utterance bounds. Returns True for speech."""
+        samples = np.frombuffer(block, dtype=np.int16)
+        if samples.size == 0:
+            return False
+
+        offset = self.total_samples
+        self.total_samples += samples.size
+
+        rms = np.sqrt(np.mean(samples.astype(np.float32) ** 2))
+        energy_db = 20 * np.log10(rms / 32768.0 + 1e-10)
+        is_speech = energy_db > self.threshold_db
+
+        if is_speech:
+            self.speech_samples += samples.size
+            if self._run_start is None:
+                self._run_start = offset
+            self._run_samples += samples.size
+            # Only confirm speech once it lasted long enough, so clicks and bumps are ignored
+            if self._run_samples >= self.min_speech_samples:
+                if not self._in_speech:
+                    self._in_speech = True
+                    self.speech_segments += 1
+                    if self.speech_start is None:
+                        self.speech_start = self._run_start
+                self.speech_end = self.total_samples
+        else:
+            self._run_start = None
+            self._run_samples = 0
+            self._in_speech = False
+
+        return is_speech
+
+    @property
+    def trailing_silence_samples(self) -> int:
+        if self.speech_end is None:
+            return 0
+        return self.total_samples - self.speech_end
+
+    @property
+    def should_stop(self) -> bool:
+        """True once the configured amount of silence followed detected speech."""
+        if self.auto_stop_samples is None or self.speech_end is None:
+            return False
+        return self.trailing_silence_samples >= self.auto_stop_samples
+
+    def speech_bounds(self) -> Optional[tuple[int, int]]:
+        """Sample range to keep (speech plus padding), or None if no speech was detected."""
+        if self.speech_start is None:
+            return None
+        start = max(0, self.speech_start - self.padding_samples)
+        end = min(self.total_samples, self.speech_end + self.padding_samples)
+        return start, end
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Speech/silence statistics for the current utterance, in milliseconds."""
+        bounds = self.speech_bounds()
+        kept_samples = bounds[1] - bounds[0] if bounds else 0
+        return {
+            "total_ms": self._samples_to_ms(self.total_samples),
+            "speech_ms": self._samples_to_ms(self.speech_samples),
+            "silence_ms": self._samples_to_ms(self.total_samples - self.speech_samples),
+            "leading_silence_ms": self._samples_to_ms(self.speech_start) if self.speech_start is not None else None,
+            "trailing_silence_ms": self._samples_to_ms(self.trailing_silence_samples),
+            "kept_ms": self._samples_to_ms(kept_samples),
+            "trimmed_ms": self._samples_to_ms(self.total_samples - kept_samples),
+            "speech_segments": self.speech_segments,
+            "speech_detected": bounds is not None
+        }
@@ -0,0 +1,73 @@
+import numpy as np
+import torch
+from typing import Dict, Sequence, Union
+from transformers import WhisperFeatureExtractor
+
+AudioClip = Union[Sequence[float], np.ndarray]
+
+class LogMelFeatureExtractor:
+    """Batched Whisper log-mel features computed with torch.stft.
+
+    Produces the same features as WhisperProcessor, but for a whole batch of clips
+    in one pass and on the inference device. Mel filterbanks and STFT windows are
+    built once per device and reused.
+    """
+
+    def __init__(self, feature_extractor: WhisperFeatureExtractor, device: Union[str, torch.device] = "cpu"):
+        self.device = torch.device(device)
+        self.n_fft = feature_extractor.n_fft
+        self.hop_length = feature_extractor.hop_length
+        self.n_samples = feature_extractor.n_samples
+        self.sampling_rate = feature_extractor.sampling_rate
+        self._mel_filters_np = np.asarray(feature_extractor.mel_filters, dtype=np.float32)
+        self._mel_filters: Dict[torch.device, torch.Tensor] = {}
+        self._windows: Dict[torch.device, torch.Tensor] = {}
+
+    def _get_mel_filters(self, device: torch.device) -> torch.Tensor:
+        if device not in self._mel_filters:
+            # Stored transposed so the projection is a single (n_mels, n_freqs) @ (n_freqs, frames) matmul
+            self._mel_filters[device] = torch.from_numpy(self._mel_filters_np.T.copy()).to(device)
+        return self._mel_filters[device]
+
+    def _get_window(self, device: torch.device) -> torch.Tensor:
+        if device not in self._windows:
+            self._windows[device] = torch.hann_window(self.n_fft, device=device)
+        return self._windows[device]
+
+    def _pad_batch(self, clips: Sequence[AudioClip]) -> torch.Tensor:
+        """Pad or truncate every clip to Whisper's 30 second window."""
+        batch = np.zeros((len(clips), self.n_samples), dtype=np.float32)
+        for i, clip in enumerate(clips):
+            clip = np.asarray(clip, dtype=np.float32)[:self.n_samples]
+            batch[i, :clip.shape[0]] = clip
+        return torch.from_numpy(batch)
+
+    @torch.no_grad()
+    def __call__(self, clips: Sequence[AudioClip], dtype: torch.dtype = torch.float32) -> torch.Tensor:
+        """Return input features of shape (batch, n_mels, frames) on the extractor's device."""
+        if len(clips) == 0:
+            raise ValueError("At least one audio clip is required")
+
+        device = self.device
+        waveforms = self._pad_batch(clips)
+        if device.type == "cuda":
+            waveforms = waveforms.pin_memory().to(device, non_blocking=True)
+
+        stft = torch.stft(
+            waveforms,
+            self.n_fft,
+            self.hop_length,
+            window=self._get_window(device),
+            return_complex=True
+        )
+        magnitudes = stft[..., :-1].abs() ** 2
+
+        mel_spec = self._get_mel_filters(device) @ magnitudes
+        log_spec = torch.clamp(mel_spec, min=1e-10).log10()
+
+        # Dynamic range compression is per clip, matching the processor
+        max_val = log_spec.amax(dim=(1, 2), keepdim=True)
+        log_spec = torch.maximum(log_spec, max_val - 8.0)
+        log_spec = (log_spec + 4.0) / 4.0
+
+        return log_spec.to(dtype)
@@ -0,0 +1,289 @@
+"""Render a library of stories offline: a text file and an audio file for every prompt in a JSONL file.
+
+Usage:
+    python -m app.utils.batch_render prompts.jsonl --out output/library [--llm gemini]
+        [--llm-concurrency 4] [--tts-concurrency 2] [--format ogg] [--sample-rate 24000]
+
+Each input line is {"prompt": "...", "language": "french"}, with an optional "id"
+(letters, digits, "-" and "_") naming the output files; without one the id is
+derived from the prompt and language. Finished stories are recorded in
+<out>/manifest.jsonl, and running the same command again skips them, so an
+interrupted run resumes where it stopped.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, List, Set
+
+from app.core.config import settings
+from app.core import tracing
+from app.core.languages import LANGUAGE_TO_BCP47, DEFAULT_LANGUAGE
+from app.services.audio_output import AudioFormat, AudioOutputStage
+from app.services.llm_service import BaseLLMService, LLMServiceFactory
+from app.services.story_audio import STORY_AUDIO_FORMATS, StoryAudioWriter
+from app.services.tts_factory import tts_factory
+from app.services.tts_service import TTSService
+from app.utils.text_cleanup import split_into_sentences
+
+_JOB_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+class StageMeter:
+    """A concurrency limit for one pipeline stage that also measures how busy the stage was"""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.busy_seconds = 0.0
+        self.calls = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.busy_seconds += time.perf_counter() - start
+                self.calls += 1
+
+    def utilisation(self, elapsed: float) -> float:
+        """Share of the stage's slot-seconds spent working, 0 to 1"""
+        return self.busy_seconds / (elapsed * self.limit) if elapsed > 0 else 0.0
+
+def load_jobs(path: Path) -> List[Dict]:
+    jobs, seen = [], set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            if not job.get("prompt"):
+                raise ValueError(f"{path}:{line_number}: missing \"prompt\"")
+            language = job.get("language") or DEFAULT_LANGUAGE
+            if language not in LANGUAGE_TO_BCP47:
+                raise ValueError(f"{path}:{line_number}: unsupported language {language!r}")
+            job_id = str(job.get("id") or hashlib.sha1(f"{language}\n{job['prompt']}".encode("utf-8")).hexdigest()[:16])
+            if not _JOB_ID.match(job_id):
+                raise ValueError(f"{path}:{line_number}: invalid id {job_id!r}")
+            if job_id in seen:
+                continue
+            seen.add(job_id)
+            jobs.append({"id": job_id, "prompt": job["prompt"], "language": language})
+    return jobs
+
+def load_finished(manifest_path: Path) -> Set[str]:
+    """Ids of stories whose files were completely written by an earlier run"""
+    finished = set()
+    if manifest_path.exists():
+        with open(manifest_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A line cut short by a crash
+                if entry.get("status") == "done":
+                    finished.add(entry["id"])
+    return finished
+
+class BatchRenderer:
+    """Renders stories with bounded LLM and TTS concurrency.
+
+    Within a story, sentences go to TTS as soon as the LLM finishes them, so
+    generation and synthesis overlap; across stories, at most llm_concurrency
+    generations and tts_concurrency syntheses run at once.
+    """
+
+    def __init__(
+        self,
+        llm: BaseLLMService,
+        tts: TTSService,
+        out_dir: Path,
+        llm_concurrency: int,
+        tts_concurrency: int,
+        audio_format: str,
+        sample_rate: int
+    ):
+        self.llm = llm
+        self.tts = tts
+        self.out_dir = out_dir
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.llm_stage = StageMeter("llm", llm_concurrency)
+        self.tts_stage = StageMeter("tts", tts_concurrency)
+        self.manifest_path = out_dir / "manifest.jsonl"
+        self.done = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+
+    def _record(self, entry: Dict) -> None:
+        # One line per story, synced so a crash never loses a finished story's entry
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _generate(self, job: Dict, sentences: asyncio.Queue) -> str:
+        """Run the LLM, queueing each complete sentence for synthesis; returns the story text"""
+        parts: List[str] = []
+        buffer = ""
+        phases = list(settings.STORY_PHASES.keys()) if settings.ENABLE_PHASED_GENERATION else [None]
+        for phase in phases:
+            async with self.llm_stage.slot():
+                async for chunk in self.llm.generate_story(
+                    job["prompt"], job["language"], phase, "".join(parts) or None
+                ):
+                    parts.append(chunk)
+                    buffer += chunk
+                    complete = split_into_sentences(buffer)
+                    if len(complete) > 1:
+                        buffer = complete[-1]
+                        for sentence in complete[:-1]:
+                            sentences.put_nowait(sentence)
+        if buffer.strip():
+            if not re.search(r'[.!?]$', buffer.strip()):
+                buffer = buffer.strip() + "."
+                parts.append(".")
+            sentences.put_nowait(buffer.strip())
+        sentences.put_nowait(None)
+        return "".join(parts)
+
+    async def _synthesize(self, job: Dict, sentences: asyncio.Queue, stage: AudioOutputStage) -> None:
+        while True:
+            sentence = await sentences.get()
+            if sentence is None:
+                return
+            async with self.tts_stage.slot():
+                async for audio_chunk in self.tts.convert_text_to_speech(
+                    text=sentence,
+                    story_id=job["id"],
+                    language=job["language"]
+                ):
+                    stage.process(audio_chunk, self.tts.sample_rate)
+
+    async def render(self, job: Dict) -> None:
+        start = time.perf_counter()
+        audio_path = self.out_dir / f"{job['id']}.{self.audio_format}"
+        text_path = self.out_dir / f"{job['id']}.txt"
+        writer = StoryAudioWriter(job["id"], self.sample_rate, self.audio_format, path=audio_path)
+        stage = AudioOutputStage(AudioFormat("pcm16", self.sample_rate))
+        stage.tee = writer.write
+        sentences: asyncio.Queue = asyncio.Queue()
+        synthesis = asyncio.ensure_future(self._synthesize(job, sentences, stage))
+        generation = asyncio.ensure_future(self._generate(job, sentences))
+        try:
+            try:
+                # Returns at the first failure, so a TTS error stops generation instead of waiting for the story
+                await asyncio.wait({generation, synthesis}, return_when=asyncio.FIRST_EXCEPTION)
+                if synthesis.done():
+                    synthesis.result()  # Raises the TTS error
+                story = await generation
+                await synthesis
+            finally:
+                for task in (generation, synthesis):
+                    task.cancel()  # No-op for a finished task
+                await asyncio.gather(generation, synthesis, return_exceptions=True)
+            stage.flush()
+            await writer.finish()
+            part_path = text_path.with_name(text_path.name + ".part")
+            part_path.write_text(story, encoding="utf-8")
+            os.replace(part_path, text_path)
+        except Exception as e:
+            await writer.abort()
+            self.failed += 1
+            self._record({"id": job["id"], "status": "failed", "error": str(e)})
+            print(f"Failed to render story {job['id']}: {str(e)}")
+            return
+
+        audio_seconds = stage.duration_ms / 1000
+        self.audio_seconds += audio_seconds
+        self.done += 1
+        elapsed = time.perf_counter() - start
+        self._record({
+            "id": job["id"],
+            "status": "done",
+            "language": job["language"],
+            "prompt": job["prompt"],
+            "text": text_path.name,
+            "audio": audio_path.name,
+            "story_chars": len(story),
+            "audio_seconds": round(audio_seconds, 2),
+            "render_seconds": round(elapsed, 2),
+        })
+        print(f"Rendered {job['id']}: {len(story)} characters, {audio_seconds:.0f}s of audio in {elapsed:.0f}s")
+
+    async def run(self, jobs: List[Dict]) -> Dict:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+
+        async def worker():
+            while not queue.empty():
+                await self.render(queue.get_nowait())
+
+        # Enough stories in flight to keep both stages busy while some are between sentences
+        workers = min(len(jobs), self.llm_stage.limit + self.tts_stage.limit)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        elapsed = time.perf_counter() - start
+        return {
+            "stories_done": self.done,
+            "stories_failed": self.failed,
+            "elapsed_seconds": round(elapsed, 1),
+            "stories_per_hour": round(self.done * 3600 / elapsed, 1) if elapsed > 0 else 0.0,
+            "audio_hours": round(self.audio_seconds / 3600, 3),
+            "llm_utilisation": round(self.llm_stage.utilisation(elapsed), 3),
+            "tts_utilisation": round(self.tts_stage.utilisation(elapsed), 3),
+            # Seconds of synthesis per second of audio; below 1 is faster than real time
+            "tts_real_time_factor": round(self.tts_stage.busy_seconds / self.audio_seconds, 3) if self.audio_seconds else None,
+        }
+
+async def main(args: argparse.Namespace) -> None:
+    jobs = load_jobs(args.prompts)
+    finished = load_finished(args.out / "manifest.jsonl")
+    pending = [job for job in jobs if job["id"] not in finished]
+    print(f"{len(jobs)} stories in {args.prompts}, {len(jobs) - len(pending)} already rendered, {len(pending)} to go")
+    if not pending:
+        return
+
+    tracing.configure()
+    llm = LLMServiceFactory.create_service(args.llm or settings.LLM_SERVICE)
+    tts = await tts_factory.ensure_ready()
+    renderer = BatchRenderer(
+        llm, tts, args.out,
+        llm_concurrency=args.llm_concurrency,
+        tts_concurrency=args.tts_concurrency,
+        audio_format=args.format,
+        sample_rate=args.sample_rate
+    )
+    try:
+        report = await renderer.run(pending)
+    finally:
+        tts_factory.reset()
+        tracing.shutdown()
+
+    print("\n=== Batch Render Complete ===")
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render stories from a JSONL file of prompts to text and audio files")
+    parser.add_argument("prompts", type=Path, help='JSONL file, one {"prompt": ..., "language": ...} per line')
+    parser.add_argument("--out", type=Path, default=settings.AUDIO_OUTPUT_DIR / "library", help="Output directory")
+    parser.add_argument("--llm", type=str, choices=["gemini", "local", "openrouter", "fake"],
+                        help="LLM service to use (overrides config setting)")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Story generations running at once")
+    parser.add_argument("--tts-concurrency", type=int, default=2, help="Sentences being synthesized at once")
+    parser.add_argument("--format", choices=list(STORY_AUDIO_FORMATS), default=settings.STORY_AUDIO_FORMAT)
+    parser.add_argument("--sample-rate", type=int, default=settings.AUDIO_OUTPUT_SAMPLE_RATE)
+    parser.add_argument("--report", type=Path, help="Also write the throughput report to this JSON file")
+    asyncio.run(main(parser.parse_args()))
@@ -25,4 +25,10 @@ def clean_text_for_tts(text: str) -> str:
     # Clean up multiple spaces
     text = re.sub(r'\s+', ' ', text)
     
-    return text.strip() 
\ No newline at end of file
+    return text.strip() 
+
+def split_into_sentences(text: str) -> list[str]:
+    """Split text into sentences using regex to handle various punctuation"""
+    text = text.strip()
+    sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!)\s', text)
+    return [s.strip() for s in sentences if s.strip()]
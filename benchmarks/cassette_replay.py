@@ -0,0 +1,64 @@
+"""Replay recorded LLM streams through their services with no delays, timing SSE parsing and sentence splitting.
+
+Record some sessions first with CASSETTE_MODE=record, then:
+
+Usage:
+    python -m benchmarks.cassette_replay [--provider gemini|openrouter] [--rounds 5]
+"""
+import argparse
+import asyncio
+import cProfile
+import pstats
+import time
+from app.core.config import settings
+from app.services.llm_service import LLMServiceFactory
+from app.utils.text_cleanup import split_into_sentences
+
+async def replay_all(service, count: int) -> tuple:
+    chunks = sentences = chars = 0
+    for _ in range(count):
+        buffer = ""
+        # Unmatched requests get the provider's cassettes in recording order
+        async for chunk in service.generate_story("benchmark", "english"):
+            chunks += 1
+            chars += len(chunk)
+            buffer += chunk
+            complete = split_into_sentences(buffer)
+            if len(complete) > 1:
+                sentences += len(complete) - 1
+                buffer = complete[-1]
+    return chunks, sentences, chars
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLM stream handling on recorded cassettes")
+    parser.add_argument("--provider", choices=["gemini", "openrouter"], default="gemini")
+    parser.add_argument("--rounds", type=int, default=5, help="Times every cassette is replayed")
+    parser.add_argument("--profile", action="store_true", help="Print the top functions by cumulative time")
+    args = parser.parse_args()
+
+    settings.CASSETTE_MODE = "replay"
+    settings.CASSETTE_SPEED = 0
+    cassettes = list((settings.CASSETTE_DIR / args.provider).glob("*.jsonl.gz"))
+    if not cassettes:
+        raise SystemExit(f"No cassettes in {settings.CASSETTE_DIR / args.provider}; record some with CASSETTE_MODE=record")
+    service = LLMServiceFactory.create_service(args.provider)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    start = time.perf_counter()
+    chunks, sentences, chars = asyncio.run(replay_all(service, len(cassettes) * args.rounds))
+    elapsed = time.perf_counter() - start
+    if profiler:
+        profiler.disable()
+
+    print(f"\n{len(cassettes)} {args.provider} cassettes x {args.rounds} rounds")
+    print(f"  {'chunks':<24} {chunks:>12}")
+    print(f"  {'sentences':<24} {sentences:>12}")
+    print(f"  {'per chunk':<24} {elapsed / max(1, chunks) * 1e6:>10.1f} us")
+    print(f"  {'characters per second':<24} {chars / elapsed:>12.0f}")
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Story history lookups with 100k stored stories: the old sorted list vs HistoryStore vs SQLite.
+
+Usage:
+    python -m benchmarks.history_store [--stories 100000] [--lookups 1000]
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from app.services.history_store import HistoryStore
+from app.services.state_backend import SQLiteStateBackend
+
+LANGUAGES = ["french", "english", "spanish", "german"]
+
+def make_records(count: int, clients: int) -> list:
+    start = datetime(2025, 1, 1)
+    return [{
+        "transcription": f"A story about animal number {i}",
+        "story": "Once upon a time... " * 20,
+        "language": random.choice(LANGUAGES),
+        "timestamp": (start + timedelta(seconds=i)).isoformat(),
+        "client_id": f"client-{random.randrange(clients)}",
+    } for i in range(count)]
+
+def timed(label: str, fn, lookups: int) -> float:
+    start = time.perf_counter()
+    for _ in range(lookups):
+        fn()
+    per_call = (time.perf_counter() - start) / lookups
+    print(f"  {label:<38} {per_call * 1e6:>12.1f} us")
+    return per_call
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark story history lookups")
+    parser.add_argument("--stories", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    records = make_records(args.stories, args.clients)
+
+    print(f"\nSorted list (previous ConversationManager), {args.stories} stories")
+    history = list(records)
+    timed("recent 1 (every story prompt)", lambda: sorted(history, key=lambda x: x["timestamp"], reverse=True)[:1], max(1, args.lookups // 100))
+
+    print(f"\nHistoryStore, {args.stories} stories")
+    store = HistoryStore(max_stories=args.stories)
+    start = time.perf_counter()
+    for record in records:
+        store.add(record)
+    print(f"  {'insert':<38} {(time.perf_counter() - start) / args.stories * 1e6:>12.1f} us")
+    middle_id = args.stories // 2
+    timed("recent 1 (every story prompt)", lambda: store.recent(1), args.lookups)
+    timed("recent 20", lambda: store.recent(20), args.lookups)
+    timed("recent 20, one client", lambda: store.recent(20, client_id=f"client-{random.randrange(args.clients)}"), args.lookups)
+    timed("recent 20, one language", lambda: store.recent(20, language="english"), args.lookups)
+    timed("page of 20 from the middle", lambda: store.recent(20, before_id=middle_id), args.lookups)
+    timed("insert past the retention cap", lambda: store.add(records[0]), args.lookups)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"\nSQLite backend, {args.stories} stories")
+        backend = SQLiteStateBackend(Path(tmp) / "state.sqlite3")
+        start = time.perf_counter()
+        with backend._lock:
+            backend._conn.execute("BEGIN")
+            backend._conn.executemany(
+                "INSERT INTO stories (client_id, language, transcription, story, timestamp) VALUES (?, ?, ?, ?, ?)",
+                [(r["client_id"], r["language"], r["transcription"], r["story"], r["timestamp"]) for r in records]
+            )
+            backend._conn.execute("COMMIT")
+        print(f"  {'bulk load':<38} {(time.perf_counter() - start):>11.2f} s")
+        timed("recent 1", lambda: backend.get_recent_stories(1), args.lookups)
+        timed("recent 20, one client", lambda: backend.get_recent_stories(20, client_id=f"client-{random.randrange(args.clients)}"), args.lookups)
+        timed("page of 20 from the middle", lambda: backend.get_recent_stories(20, before_id=middle_id), args.lookups)
+        backend.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Per-sentence Kokoro latency for each inference engine (eager, torch.compile, TorchScript).
+
+Usage:
+    python -m benchmarks.kokoro_engine [--engines eager compile torchscript] [--repeats 5]
+"""
+import argparse
+import statistics
+import time
+import torch
+from app.core.config import settings
+from app.services.kokoro_batching import SynthesisRequest, synthesize_batch
+from app.services.kokoro_engine import apply_engine
+from app.services.kokoro_model import load_kokoro_model, load_voicepack
+
+SENTENCES = [
+    "Hello!",
+    "Lulu the mouse loved cheese more than anything.",
+    "Every morning, she climbed the old lighthouse to watch the fishing boats sail home across the sparkling bay.",
+    "When the storm came, the lighthouse keeper's lamp flickered, and Lulu knew she had to find a way to keep the light burning until every boat was safely back in the harbour.",
+]
+
+def measure(model, voicepack: torch.Tensor, repeats: int) -> dict:
+    latencies = {}
+    for sentence in SENTENCES:
+        request = SynthesisRequest(text=sentence, voicepack=voicepack, lang="a")
+        synthesize_batch(model, [request])  # Warm up, triggers compilation for this shape
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            synthesize_batch(model, [request])
+            timings.append(time.perf_counter() - start)
+        latencies[len(sentence)] = statistics.median(timings)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Kokoro inference engines")
+    parser.add_argument("--engines", nargs="+", default=["eager", "compile", "torchscript"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None, help="Torch intra-op threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    device = settings.TTS_DEVICE
+    voicepack = load_voicepack(settings.TTS_VOICE, device)
+
+    results = {}
+    for engine in args.engines:
+        model = load_kokoro_model(device, engine="eager")
+        report = apply_engine(model, engine, voicepack)
+        print(f"\n{engine}: " + ", ".join(f"{name}={used}" for name, used in report.items()))
+        results[engine] = measure(model, voicepack, args.repeats)
+
+    print(f"\n{'chars':>6} " + " ".join(f"{engine:>12}" for engine in args.engines))
+    for length in results[args.engines[0]]:
+        print(f"{length:>6} " + " ".join(f"{results[engine][length] * 1000:>10.1f}ms" for engine in args.engines))
+
+if __name__ == "__main__":
+    main()
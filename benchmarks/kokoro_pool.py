@@ -0,0 +1,72 @@
+"""Benchmark Kokoro synthesis throughput with 1 to N worker processes.
+
+Usage:
+    python -m benchmarks.kokoro_pool [--max-workers 4] [--threads 1] [--sentences 32]
+"""
+import argparse
+import asyncio
+import os
+import time
+from app.services.kokoro_process_pool import KokoroProcessPool, KOKORO_SAMPLE_RATE
+
+SENTENCES = [
+    "Once upon a time, in a quiet village by the sea, there lived a little mouse named Lulu.",
+    "Every morning, Lulu climbed the old lighthouse to watch the boats come home.",
+    "One day, a strange silver feather landed right on her nose.",
+    "She wondered where it came from, and decided to find out.",
+    "The wind whispered secrets as she hurried across the golden dunes.",
+    "Her best friend, a clumsy crab called Pip, insisted on coming along.",
+    "Together they followed the trail of feathers into the whispering forest.",
+    "At last, they found a tiny bird with a broken wing, waiting for help.",
+]
+
+async def wait_until_ready(pool: KokoroProcessPool, timeout: float = 300) -> None:
+    start = time.perf_counter()
+    while pool.ready_workers < pool.num_workers:
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("Workers did not load their models in time")
+        await asyncio.sleep(0.2)
+
+async def run(num_workers: int, threads: int, count: int, voice: str) -> dict:
+    pool = KokoroProcessPool(num_workers=num_workers, torch_threads=threads)
+    try:
+        await wait_until_ready(pool)
+        # Warm up every worker once
+        await asyncio.gather(*(pool.synthesize(SENTENCES[0], voice, voice[0]) for _ in range(num_workers)))
+
+        sentences = [SENTENCES[i % len(SENTENCES)] for i in range(count)]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(pool.synthesize(s, voice, voice[0]) for s in sentences))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+
+    audio_seconds = sum(r.size for r in results if r is not None) / KOKORO_SAMPLE_RATE
+    cores = num_workers * threads
+    return {
+        "workers": num_workers,
+        "sentences_per_s": count / elapsed,
+        "realtime_factor": audio_seconds / elapsed,
+        "realtime_per_core": audio_seconds / elapsed / cores,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Kokoro process pool")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=1, help="Torch threads per worker")
+    parser.add_argument("--sentences", type=int, default=32)
+    parser.add_argument("--voice", default="af_bella")
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'sent/s':>8} {'x realtime':>11} {'x rt/core':>10} {'scaling':>8}")
+    baseline = None
+    for num_workers in range(1, args.max_workers + 1):
+        result = asyncio.run(run(num_workers, args.threads, args.sentences, args.voice))
+        baseline = baseline or result["sentences_per_s"]
+        print(
+            f"{result['workers']:>8} {result['sentences_per_s']:>8.2f} {result['realtime_factor']:>11.2f} "
+            f"{result['realtime_per_core']:>10.2f} {result['sentences_per_s'] / baseline:>7.2f}x"
+        )
+
+if __name__ == "__main__":
+    main()
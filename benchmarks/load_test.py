@@ -0,0 +1,237 @@
+"""End-to-end load test: N simulated clients each request a story and listen to it.
+
+Every client goes through POST /text-input and then /ws/story/{client_id},
+answers interaction requests automatically and plays the audio back on a
+simulated real-time clock. Per session it records time to first text, time
+to first audio, completion time and audio gaps (moments where playback ran
+dry waiting for the next chunk; pauses for interaction requests don't count).
+
+The server's per-address rate limit applies to the load test too, so start it
+with SCHEDULER_RATE_LIMIT_STORIES_PER_MINUTE=0 (and LLM_SERVICE=fake TTS_SERVICE=fake
+to measure the pipeline itself rather than the providers).
+
+Usage:
+    python -m benchmarks.load_test [--url http://127.0.0.1:8000] [--clients 16] [--ramp-seconds 5]
+        [--json results.json] [--baseline previous.json --max-regression 0.2]
+
+With --baseline, p50/p95 of each metric are compared against an earlier
+--json result and the exit code is 1 if any got worse by more than
+--max-regression (a fraction), so CI can compare commits.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+PROMPTS = [
+    "A little mouse who wants to visit the moon",
+    "A dragon who is afraid of the dark",
+    "Two friends building a boat from leaves",
+    "A cat who opens a bakery in Paris",
+]
+INTERACTION_REPLIES = [
+    "Keep the current direction",
+    "Add a friendly owl",
+    "They should be brave and try",
+]
+METRICS = ["queue_wait", "time_to_first_text", "time_to_first_audio", "completion", "audio_gap", "stall_total"]
+
+class PlaybackClock:
+    """Plays received audio in real time and measures how long playback waited for data"""
+
+    def __init__(self):
+        self.buffer_end: Optional[float] = None  # When the audio received so far finishes playing
+        self.gaps: List[float] = []
+
+    def on_audio(self, now: float, duration: float) -> None:
+        if self.buffer_end is None:
+            self.buffer_end = now
+        elif now > self.buffer_end:
+            self.gaps.append(now - self.buffer_end)
+            self.buffer_end = now
+        self.buffer_end += duration
+
+    def pause(self) -> None:
+        """Playback restarts from the next chunk, e.g. while the user answers a question"""
+        self.buffer_end = None
+
+async def run_session(http: aiohttp.ClientSession, args: argparse.Namespace, index: int) -> Dict:
+    prompt = PROMPTS[index % len(PROMPTS)]
+    result: Dict = {"index": index, "ok": False, "error": None, "gaps": [], "interactions": 0, "audio_bytes": 0}
+    start = time.perf_counter()
+    try:
+        async with http.post(
+            f"{args.url}/api/v1/text-input", json={"text": prompt}, params={"language": args.language}
+        ) as response:
+            response.raise_for_status()
+            session = await response.json()
+
+        ws_url = args.url.replace("http", "ws", 1) + session["websocket_url"]
+        async with http.ws_connect(ws_url, max_msg_size=0) as ws:
+            requested = time.perf_counter()
+            await ws.send_json({
+                "type": "transcription",
+                "text": session["transcription"],
+                "language": args.language,
+                "audio": {"codec": "pcm16", "sample_rate": args.sample_rate},
+            })
+            sample_rate = args.sample_rate
+            clock = PlaybackClock()
+            async for message in ws:
+                now = time.perf_counter()
+                if message.type == aiohttp.WSMsgType.BINARY:
+                    if "time_to_first_audio" not in result:
+                        result["time_to_first_audio"] = now - requested
+                    result["audio_bytes"] += len(message.data)
+                    clock.on_audio(now, len(message.data) / 2 / sample_rate)
+                    continue
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+
+                data = json.loads(message.data)
+                if data["type"] == "text":
+                    result.setdefault("time_to_first_text", now - requested)
+                elif data["type"] == "audio_format":
+                    sample_rate = data["sample_rate"]
+                elif data["type"] == "interaction_request":
+                    result["interactions"] += 1
+                    clock.pause()
+                    await asyncio.sleep(args.think_seconds)
+                    await ws.send_json({"type": "interaction_response", "content": random.choice(INTERACTION_REPLIES)})
+                elif data["type"] == "status" and data["status"] == "started":
+                    result["queue_wait"] = now - requested
+                elif data["type"] == "status" and data["status"] == "completed":
+                    result["completion"] = now - requested
+                    result["ok"] = True
+                    break
+                elif data["type"] == "error":
+                    result["error"] = data.get("message")
+                    break
+            result["gaps"] = [gap for gap in clock.gaps if gap >= args.min_gap_ms / 1000]
+            if not result["ok"] and result["error"] is None:
+                result["error"] = f"Connection closed ({ws.close_code})"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {str(e)}"
+    result["stall_total"] = sum(result["gaps"])
+    result["wall"] = time.perf_counter() - start
+    return result
+
+def percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(q: float) -> float:
+        return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+    return {
+        "count": len(values),
+        "p50": at(0.50),
+        "p90": at(0.90),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": values[-1],
+        "mean": sum(values) / len(values),
+    }
+
+def summarize(results: List[Dict], elapsed: float) -> Dict:
+    ok = [r for r in results if r["ok"]]
+    summary = {
+        "sessions": len(results),
+        "completed": len(ok),
+        "failed": len(results) - len(ok),
+        "elapsed_seconds": elapsed,
+        "stories_per_hour": len(ok) * 3600 / elapsed if elapsed > 0 else 0.0,
+        "errors": {},
+    }
+    for r in results:
+        if r["error"]:
+            summary["errors"][r["error"]] = summary["errors"].get(r["error"], 0) + 1
+    for metric in METRICS:
+        if metric == "audio_gap":
+            values = [gap for r in ok for gap in r["gaps"]]
+        else:
+            values = [r[metric] for r in ok if metric in r]
+        summary[metric] = percentiles(values)
+    return summary
+
+def print_report(summary: Dict) -> None:
+    print(f"\n{summary['completed']}/{summary['sessions']} stories completed in {summary['elapsed_seconds']:.1f}s "
+          f"({summary['stories_per_hour']:.0f} stories/hour)")
+    print(f"\n  {'metric (seconds)':<22} {'count':>6} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for metric in METRICS:
+        stats = summary[metric]
+        if stats is None:
+            print(f"  {metric:<22} {0:>6}")
+            continue
+        print(f"  {metric:<22} {stats['count']:>6} " + " ".join(f"{stats[k]:>8.3f}" for k in ("p50", "p90", "p95", "p99", "max")))
+    for error, count in summary["errors"].items():
+        print(f"  error x{count}: {error}")
+
+def compare(summary: Dict, baseline: Dict, max_regression: float) -> bool:
+    """Print p50/p95 changes against a baseline summary; False if any got worse by more than max_regression"""
+    print(f"\nAgainst baseline (fail above +{max_regression:.0%}):")
+    passed = True
+    for metric in METRICS:
+        current, previous = summary.get(metric), baseline.get(metric)
+        if not current or not previous:
+            continue
+        for key in ("p50", "p95"):
+            if previous[key] < 0.01:
+                continue  # Too small to compare meaningfully
+            change = current[key] / previous[key] - 1
+            regressed = change > max_regression
+            passed = passed and not regressed
+            print(f"  {metric + ' ' + key:<26} {previous[key]:>8.3f} -> {current[key]:>8.3f} ({change:+.1%}){'  REGRESSION' if regressed else ''}")
+    if summary["failed"] > baseline.get("failed", 0):
+        print(f"  failed sessions {baseline.get('failed', 0)} -> {summary['failed']}  REGRESSION")
+        passed = False
+    return passed
+
+async def main(args: argparse.Namespace) -> int:
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as http:
+        async def delayed(index: int) -> Dict:
+            await asyncio.sleep(args.ramp_seconds * index / max(1, args.clients))
+            return await run_session(http, args, index)
+
+        print(f"Starting {args.clients} clients against {args.url} over {args.ramp_seconds}s")
+        start = time.perf_counter()
+        results = await asyncio.gather(*(delayed(i) for i in range(args.clients)))
+        elapsed = time.perf_counter() - start
+
+    summary = summarize(results, elapsed)
+    print_report(summary)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "summary": summary, "sessions": results}, f, indent=2, default=str)
+        print(f"\nResults written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["summary"]
+        if not compare(summary, baseline, args.max_regression):
+            return 1
+    return 0 if summary["completed"] else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the story websocket with concurrent simulated clients")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--ramp-seconds", type=float, default=5.0, help="Spread client start times over this long")
+    parser.add_argument("--language", default="english")
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--think-seconds", type=float, default=0.5, help="Delay before answering an interaction request")
+    parser.add_argument("--min-gap-ms", type=float, default=20.0, help="Shorter playback gaps are ignored")
+    parser.add_argument("--timeout", type=float, default=900.0, help="Seconds before a session is abandoned")
+    parser.add_argument("--json", help="Write the full results to this file")
+    parser.add_argument("--baseline", help="Results file from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    sys.exit(asyncio.run(main(parser.parse_args())))
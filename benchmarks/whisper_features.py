@@ -0,0 +1,66 @@
+"""Benchmark batched torch.stft log-mel extraction against the WhisperProcessor path.
+
+Usage:
+    python -m benchmarks.whisper_features [--model openai/whisper-small] [--repeats 5]
+"""
+import argparse
+import time
+import numpy as np
+import torch
+from transformers import WhisperProcessor
+from app.services.whisper_features import LogMelFeatureExtractor
+
+BATCH_SIZES = [1, 8, 32]
+
+def make_clips(count: int, sampling_rate: int, rng: np.random.Generator) -> list[np.ndarray]:
+    """Random speech-length clips between 2 and 15 seconds."""
+    return [
+        (rng.standard_normal(int(rng.uniform(2, 15) * sampling_rate)) * 0.1).astype(np.float32)
+        for _ in range(count)
+    ]
+
+def time_call(fn, repeats: int, device: str) -> float:
+    fn()  # Warm up caches, allocator and kernels
+    if device == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    if device == "cuda":
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / repeats
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Whisper feature extraction")
+    parser.add_argument("--model", default="openai/whisper-small")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    processor = WhisperProcessor.from_pretrained(args.model)
+    sampling_rate = processor.feature_extractor.sampling_rate
+    devices = ["cpu"] + (["cuda"] if torch.cuda.is_available() else [])
+    extractors = {device: LogMelFeatureExtractor(processor.feature_extractor, device) for device in devices}
+    rng = np.random.default_rng(0)
+
+    print(f"{'clips':>6} {'processor':>12} " + " ".join(f"{'stft/' + d:>12}" for d in devices) + f" {'max diff':>10}")
+    for batch_size in BATCH_SIZES:
+        clips = make_clips(batch_size, sampling_rate, rng)
+
+        # The current service path: one processor call per clip
+        def processor_path():
+            return [
+                processor(clip, sampling_rate=sampling_rate, return_tensors="pt").input_features
+                for clip in clips
+            ]
+
+        reference = torch.cat(processor_path())
+        timings = [time_call(processor_path, args.repeats, "cpu")]
+        max_diff = 0.0
+        for device, extractor in extractors.items():
+            timings.append(time_call(lambda: extractor(clips), args.repeats, device))
+            max_diff = max(max_diff, (extractor(clips).cpu() - reference).abs().max().item())
+
+        print(f"{batch_size:>6} " + " ".join(f"{t * 1000:>10.1f}ms" for t in timings) + f" {max_diff:>10.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,20 @@
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 import argparse
+import asyncio
+import os
 from app.core.config import settings
+from app.core import metrics, tracing
 from app.api.routes import router
 from app.services.speech_to_text import speech_to_text_service
 from app.services.llm_service import LLMServiceFactory
+from app.services.tts_factory import tts_factory
+from app.services.state_backend import state_backend
+from app.services.story_archive import close_story_archive, get_story_archive
 
 def create_app(llm_type: str = None) -> FastAPI:
+    tracing.configure()
     app = FastAPI(title=settings.PROJECT_NAME, version=settings.VERSION)
     
     # Mount static files
@@ -18,14 +25,38 @@ def create_app(llm_type: str = None) -> FastAPI:
         """Serve the WebSocket test page"""
         return FileResponse("app/static/websocket_test.html")
     
+    @app.get("/metrics")
+    async def get_metrics():
+        """Pipeline latencies, queue depths and error counts in Prometheus text format"""
+        return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+    
+    loop_monitor = None
+    
     @app.on_event("startup")
     async def startup_event():
+        nonlocal loop_monitor
+        loop_monitor = asyncio.create_task(metrics.monitor_event_loop())
+        if settings.TTS_PRELOAD_ON_STARTUP:
+            # Loads in the background while Whisper initializes; /health/ready reports when done
+            tts_factory.warmup()
         speech_to_text_service.initialize()
+        get_story_archive()  # Opened here rather than at import, so importing the app creates no files
         # Override the default LLM service if specified
         if llm_type:
             global llm_service
             llm_service = LLMServiceFactory.create_service(llm_type)
     
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        if loop_monitor is not None:
+            loop_monitor.cancel()
+        # Closing the TTS services releases audio devices and flushes the phoneme cache
+        tts_factory.reset()
+        # Write stories still queued for the archive before exiting
+        await close_story_archive()
+        state_backend.close()
+        tracing.shutdown()
+    
     app.include_router(router, prefix=settings.API_V1_STR)
     return app
 
@@ -33,10 +64,25 @@ if __name__ == "__main__":
     import uvicorn
     
     parser = argparse.ArgumentParser(description='Run the Story Teller API')
-    parser.add_argument('--llm', type=str, choices=['gemini', 'local', 'openrouter'], 
+    parser.add_argument('--llm', type=str, choices=['gemini', 'local', 'openrouter', 'fake'], 
                        help='LLM service to use (overrides config setting)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of worker processes; more than one needs STATE_BACKEND=sqlite')
     args = parser.parse_args()
     
-    app = create_app(args.llm)
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    if args.workers > 1:
+        if settings.STATE_BACKEND == "memory":
+            print("Warning: with STATE_BACKEND=memory each worker keeps its own history, languages and sessions")
+        if "voice" in settings.ENABLED_INPUT_METHODS:
+            print("Warning: server-side recording uses the local microphone and only works within one worker")
+        if args.llm:
+            # Workers are fresh interpreters that build their app through create_app(), so pass the choice on
+            os.environ["LLM_SERVICE"] = args.llm
+        uvicorn.run(
+            "main:create_app", factory=True, workers=args.workers,
+            host="127.0.0.1", port=8000, ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE
+        )
+    else:
+        app = create_app(args.llm)
+        uvicorn.run(app, host="127.0.0.1", port=8000, ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE)
 
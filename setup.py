@@ -125,7 +125,7 @@ setup(
         "scipy>=1.11.0",
         "munch>=4.0.0",
         "transformers>=4.38.0",
-        "torch>=2.0.0",
+        "torch>=2.1.0",  # mmap checkpoint loading
     ],
     extras_require={
         'cuda': [
@@ -133,6 +133,12 @@ setup(
         ],
         'cpu': [
             'torch==2.5.1',
+        ],
+        'opus': [
+            'opuslib>=3.0.1',  # Opus audio output, also needs the system libopus
+        ],
+        'fast': [
+            'orjson>=3.9.0',  # Faster websocket message serialization
         ]
     },
     python_requires=">=3.10",